@@ -0,0 +1,190 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from openai import AsyncOpenAI
+from OutputModels import Response, Extraction
+from LLMBackend import LLMBackend, call_llm_async, collect_llm_calls
+from GenerateQuestion import (
+    MODEL, QUESTION_TEMPERATURE, EXTRACTION_TEMPERATURE, OPENAI_MAX_CONNECTIONS, initialize_async_openai_client,
+    get_async_llm_backend,
+    select_sections, extract_by_rules, load_cached_extraction, save_extraction, record_usage,
+    build_extraction_messages, build_question_messages, question_response_format
+)
+
+"""
+Asynchrone engine voor het genereren van quizvragen.
+
+Elke job (medicijn + kenniscategorie) doet dezelfde twee LLM calls als generate_quiz_question
+(extractie en quizvraag), maar jobs lopen gelijktijdig: maximaal MAX_CONCURRENCY tegelijk, en
+begrensd door een token bucket voor requests per minuut en tokens per minuut, zodat de rate limits
+van de provider niet worden overschreden. Elk resultaat wordt direct doorgegeven aan on_result
+(bijv. om het via DatabaseManager op te slaan), in de volgorde waarin jobs klaar zijn.
+
+De calls lopen via get_async_llm_backend(): dezelfde gedeelde retries, circuit breaker en tellers als
+de synchrone pijplijn (get_resilience_statistics()), en de retries per call komen in llm_calls. Zonder
+client gebruikt de engine de backend van set_llm_backend() (bijv. FakeLLMBackend), en anders een
+eigen AsyncOpenAI client.
+"""
+
+MAX_CONCURRENCY = 8
+REQUESTS_PER_MINUTE = 500  # Rate limits van het gebruikte model (tier 1 gpt-4o-mini)
+TOKENS_PER_MINUTE = 200_000
+BURST_SECONDS = 1.0  # Hoeveel seconden aan budget in één keer mag worden gebruikt
+# Geschatte lengte van de antwoorden, voor de schatting vooraf van het aantal tokens
+EXTRACTION_COMPLETION_TOKENS = 300
+QUESTION_COMPLETION_TOKENS = 1200
+CHARS_PER_TOKEN = 4
+
+
+class TokenBucket:
+    """Token bucket die per minuut `per_minute` eenheden bijvult, met een buffer van `burst_seconds`."""
+    def __init__(self, per_minute: float, burst_seconds: float = BURST_SECONDS):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Wacht tot `amount` beschikbaar is en neem het op; geeft de wachttijd in seconden terug."""
+        amount = min(amount, self.capacity)  # Een grotere aanvraag zou nooit passen
+        start = time.monotonic()
+        async with self._lock:  # Wachtenden worden op volgorde bediend
+            self._refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+        return time.monotonic() - start
+
+    def adjust(self, amount: float):
+        """Corrigeer een schatting achteraf: positief geeft terug, negatief neemt extra op (mag onder nul)."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Combineert een limiet op requests per minuut en op tokens per minuut."""
+    def __init__(self, requests_per_minute: float = REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = TOKENS_PER_MINUTE, burst_seconds: float = BURST_SECONDS):
+        self.requests = TokenBucket(requests_per_minute, burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds)
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        waited = await self.requests.acquire(1)
+        return waited + await self.tokens.acquire(estimated_tokens)
+
+    def record(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Verwerk het werkelijke tokengebruik uit de response."""
+        if actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+
+def estimate_tokens(messages: List[dict], completion_tokens: int) -> int:
+    """Ruwe schatting van prompt + antwoord in tokens (ongeveer CHARS_PER_TOKEN tekens per token)."""
+    return sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN + completion_tokens
+
+
+class AsyncQuestionEngine:
+    """Genereert quizvragen voor veel jobs tegelijk, binnen een concurrency limiet en rate limits."""
+    def __init__(self, client: Optional[AsyncOpenAI] = None, max_concurrency: int = MAX_CONCURRENCY,
+                 requests_per_minute: float = REQUESTS_PER_MINUTE, tokens_per_minute: float = TOKENS_PER_MINUTE,
+                 on_result: Optional[Callable[[Dict[str, Any], Any, Optional[Exception]], None]] = None,
+                 debug_mode: bool = False):
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.on_result = on_result
+        self.debug_mode = debug_mode
+        self.stats = {"requests": 0, "tokens": 0, "rate_limit_wait": 0.0, "max_in_flight": 0}
+        self._in_flight = 0
+        self._backend: Optional[LLMBackend] = None
+
+    async def _call(self, limiter: RateLimiter, stage: str, category: str, messages: List[dict], response_format,
+                    temperature: float, completion_tokens: int):
+        estimated = estimate_tokens(messages, completion_tokens)
+        self.stats["rate_limit_wait"] += await limiter.acquire(estimated)
+        # Een retry wacht in de Resilience laag (backoff of retry-after), niet opnieuw in de limiter
+        response = await call_llm_async(self._backend, stage, MODEL, messages, response_format, temperature, category)
+        record_usage(response, stage)
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        limiter.record(estimated, actual)
+        self.stats["requests"] += 1
+        self.stats["tokens"] += actual if actual is not None else estimated
+        return response.choices[0].message.parsed
+
+    async def generate(self, limiter: RateLimiter, job: Dict[str, Any]) -> Response.FinalResolution:
+        """Extractie en quizvraag voor één job (zoals generate_quiz_question, met een vaste categorie)."""
+        medicine_name, category = job["medicine_name"], job["category"]
+        sections = job.get("sections")
+        category_info = select_sections(sections, category) if sections else None
+        extraction_input = category_info or job["medicine_info"]
+
+        relevant_info = extract_by_rules(sections, category) if sections else None
+        if relevant_info is None:
+            relevant_info = load_cached_extraction(extraction_input, category, medicine_name)
+        if relevant_info is None:
+            relevant_info = await self._call(
+                limiter, "extractie", category, build_extraction_messages(extraction_input, category), Extraction,
+                EXTRACTION_TEMPERATURE, EXTRACTION_COMPLETION_TOKENS
+            )
+            save_extraction(extraction_input, category, medicine_name, relevant_info)
+
+        question = await self._call(
+            limiter, "generatie", category, build_question_messages(medicine_name, category, relevant_info),
+            question_response_format(), QUESTION_TEMPERATURE, QUESTION_COMPLETION_TOKENS
+        )
+        return question.final_resolution
+
+    async def _run_job(self, semaphore: asyncio.Semaphore, limiter: RateLimiter, job: Dict[str, Any]) -> Dict[str, Any]:
+        async with semaphore:
+            self._in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+            try:
+                with collect_llm_calls() as job["llm_calls"]:
+                    question, error = await self.generate(limiter, job), None
+            except Exception as e:
+                question, error = None, e
+                if self.debug_mode:
+                    print(f"Fout bij genereren vraag voor {job['medicine_name']}: {e}")
+            finally:
+                self._in_flight -= 1
+        if self.on_result:
+            self.on_result(job, question, error)
+        return {"job": job, "question": question, "error": error}
+
+    async def run(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Voer alle jobs uit en geef per job (in dezelfde volgorde) het resultaat terug.
+
+        Een job is een dict met ten minste 'medicine_name', 'medicine_info' en 'category'
+        (optioneel 'sections'); extra sleutels worden ongewijzigd doorgegeven aan on_result. De engine
+        voegt 'llm_calls' toe: tokens, latency en kosten van de calls van de job.
+        """
+        self._backend = get_async_llm_backend(self.client)
+        own_client = self._backend is None
+        if own_client:
+            # Genoeg verbindingen voor alle gelijktijdige jobs
+            self.client = initialize_async_openai_client(max(self.max_concurrency, OPENAI_MAX_CONNECTIONS))
+            self._backend = get_async_llm_backend(self.client)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.requests_per_minute, self.tokens_per_minute)
+        try:
+            return await asyncio.gather(*(self._run_job(semaphore, limiter, job) for job in jobs))
+        finally:
+            self._backend = None
+            if own_client:
+                await self.client.close()
+                self.client = None
+
+    def run_jobs(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Synchrone ingang voor code zonder event loop."""
+        return asyncio.run(self.run(jobs))
@@ -0,0 +1,321 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from openai import OpenAI
+from pydantic import BaseModel
+from OutputModels import Extraction
+from LLMBackend import estimate_cost
+from GenerateQuestion import (
+    MODEL, QUESTION_TEMPERATURE, EXTRACTION_TEMPERATURE, initialize_openai_client,
+    select_sections, extract_by_rules, load_cached_extraction, save_extraction,
+    build_extraction_messages, build_question_messages, question_response_format
+)
+
+"""
+Offline generatie van quizvragen via een batch API.
+
+Voor het 's nachts aanvullen van honderden vragen is de latency niet belangrijk, de prijs wel: de
+batch API van OpenAI rekent de helft van de normale prijs. Alle requests worden als JSONL bestand
+aangeboden, waarna het resultaat wordt opgehaald zodra de batch klaar is (binnen 24 uur).
+
+Een vraag heeft twee calls nodig, dus er zijn twee batches: eerst alle extracties (voor zover niet
+al in de extractiecache), daarna alle quizvragen. Het indienen en ophalen gaat via een BatchBackend:
+OpenAIBatchBackend voor de echte API, LocalBatchBackend om de hele flow offline te testen.
+"""
+
+ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+POLL_INTERVAL_SECONDS = 60
+BATCH_TIMEOUT_SECONDS = 25 * 60 * 60  # Iets ruimer dan het completion window
+FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+BATCH_PRICE_FACTOR = 0.5  # De batch API rekent de helft van de normale prijs
+
+
+def response_format_param(response_format: type) -> Dict[str, Any]:
+    """
+    Het response_format (JSON schema) van een Pydantic model, zoals client.beta.chat.completions.parse
+    het meestuurt. De SDK heeft hiervoor geen publieke functie; dit is de enige plek die de interne
+    functie gebruikt (aanwezig sinds openai 1.40, zie requirements.txt).
+    """
+    try:
+        from openai.lib._parsing._completions import type_to_response_format_param
+    except ImportError as e:
+        raise RuntimeError(
+            "openai.lib._parsing._completions.type_to_response_format_param niet gevonden: de batch API heeft "
+            "openai>=1.40 nodig (zie requirements.txt), of de interne module is in deze versie verplaatst"
+        ) from e
+    return type_to_response_format_param(response_format)
+
+
+def build_request(custom_id: str, messages: List[dict], response_format: type, temperature: float) -> Dict[str, Any]:
+    """Eén regel van het batch bestand, met dezelfde body als client.beta.chat.completions.parse stuurt."""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": ENDPOINT,
+        "body": {
+            "model": MODEL,
+            "messages": messages,
+            "temperature": temperature,
+            "response_format": response_format_param(response_format)
+        }
+    }
+
+
+def write_batch_file(path: str, requests: List[Dict[str, Any]]):
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+def read_batch_results(path: str, response_format: type
+                       ) -> Dict[str, Tuple[Optional[BaseModel], Optional[str], Optional[Dict[str, Any]]]]:
+    """
+    Lees een resultaatbestand: per custom_id het geparste antwoord of een foutmelding, met de usage
+    uit de response (None als die ontbreekt; ook een onbruikbaar antwoord kost tokens).
+    """
+    results = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            response = result.get("response") or {}
+            body = response.get("body")
+            usage = body.get("usage") if isinstance(body, dict) else None
+            if result.get("error") or response.get("status_code") != 200:
+                results[result["custom_id"]] = (None, str(result.get("error") or body), usage)
+                continue
+            try:
+                content = body["choices"][0]["message"]["content"]
+                results[result["custom_id"]] = (response_format.model_validate_json(content), None, usage)
+            except Exception as e:
+                results[result["custom_id"]] = (None, f"Ongeldig antwoord: {e}", usage)
+    return results
+
+
+def batch_llm_call(stage: str, category: Optional[str], usage: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Een rij voor llm_calls bij een batch resultaat, met de kosten tegen de batch prijs."""
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    completion_tokens = usage.get("completion_tokens") or 0
+    cached_tokens = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    cost = estimate_cost(MODEL, prompt_tokens, cached_tokens, completion_tokens)
+    return {
+        "stap": stage,
+        "model": MODEL,
+        "kenniscategorie": category,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "latency_ms": None,  # Geen latency per call: de batch als geheel duurt tot 24 uur
+        "retries": 0,
+        "kosten": cost * BATCH_PRICE_FACTOR if cost is not None else None,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+class BatchBackend:
+    """Interface voor het indienen en ophalen van batches."""
+    def submit(self, input_path: str) -> str:
+        """Dien een JSONL bestand in en geef het batch id terug."""
+        raise NotImplementedError
+
+    def status(self, batch_id: str) -> str:
+        """Status van de batch, zoals bij OpenAI: validating, in_progress, completed, failed, expired, cancelled."""
+        raise NotImplementedError
+
+    def download_results(self, batch_id: str, output_path: str):
+        """Schrijf de resultaten van een afgeronde batch als JSONL naar output_path."""
+        raise NotImplementedError
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """Batch API van OpenAI."""
+    def __init__(self, client: Optional[OpenAI] = None):
+        self.client = client or initialize_openai_client().client
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id, endpoint=ENDPOINT, completion_window=COMPLETION_WINDOW
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def download_results(self, batch_id: str, output_path: str):
+        batch = self.client.batches.retrieve(batch_id)
+        with open(output_path, "wb") as f:
+            # Mislukte requests staan in een apart bestand; beide horen bij het resultaat
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    f.write(self.client.files.content(file_id).read())
+
+
+def local_responder(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Deterministisch antwoord op een request, op basis van de naam van het response_format."""
+    schema_name = body["response_format"]["json_schema"]["name"]
+    prompt = body["messages"][-1]["content"]
+    if schema_name == "Extraction":
+        content = {"relevant_information": prompt.strip()[:500]}
+    else:
+        content = {
+            "steps": [],
+            "final_resolution": {
+                "introductie": "Een patiënt komt een herhaalrecept ophalen.",
+                "vraag": prompt,
+                "antwoordopties": ["Optie A", "Optie B", "Optie C", "Optie D"],
+                "antwoord": "Optie A",
+                "uitleg": "Lokaal gegenereerd antwoord.",
+                "verificatie": {"check_accuracy": "", "check_clarity": "", "check_fairness": "", "improvements": []}
+            }
+        }
+        if schema_name == "LeanFlagsResponse":
+            content["final_resolution"]["verificatie"] = {"accurate": True, "clear": True, "fair": True}
+    return {
+        "object": "chat.completion",
+        "model": body["model"],
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": json.dumps(content, ensure_ascii=False)}}],
+        "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": 100, "total_tokens": len(prompt) // 4 + 100}
+    }
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    Bestandsgebaseerde stand-in voor de batch API, om de hele flow offline te testen.
+
+    Een batch is klaar na `polls_until_complete` keer status() opvragen; de antwoorden komen van
+    `responder` (een exception levert een foutregel op, zoals bij de echte API).
+    """
+    def __init__(self, directory: str, responder: Callable[[Dict[str, Any]], Dict[str, Any]] = local_responder,
+                 polls_until_complete: int = 1):
+        self.directory = directory
+        self.responder = responder
+        self.polls_until_complete = polls_until_complete
+        self._polls = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def submit(self, input_path: str) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        shutil.copyfile(input_path, os.path.join(self.directory, f"{batch_id}.input.jsonl"))
+        self._polls[batch_id] = 0
+        return batch_id
+
+    def status(self, batch_id: str) -> str:
+        self._polls[batch_id] += 1
+        return "completed" if self._polls[batch_id] >= self.polls_until_complete else "in_progress"
+
+    def download_results(self, batch_id: str, output_path: str):
+        with open(os.path.join(self.directory, f"{batch_id}.input.jsonl"), "r", encoding="utf-8") as f_in, \
+                open(output_path, "w", encoding="utf-8") as f_out:
+            for line in f_in:
+                request = json.loads(line)
+                try:
+                    result = {"response": {"status_code": 200, "body": self.responder(request["body"])}, "error": None}
+                except Exception as e:
+                    result = {"response": None, "error": {"code": "local_error", "message": str(e)}}
+                result.update(id=f"batch_req_{uuid.uuid4().hex}", custom_id=request["custom_id"])
+                f_out.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+class BatchQuestionGenerator:
+    """Genereert quizvragen voor een lijst jobs via twee batches (extractie, daarna vraag)."""
+    def __init__(self, backend: BatchBackend, work_dir: str, poll_interval: float = POLL_INTERVAL_SECONDS,
+                 timeout: float = BATCH_TIMEOUT_SECONDS, debug_mode: bool = False):
+        self.backend = backend
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.debug_mode = debug_mode
+        os.makedirs(work_dir, exist_ok=True)
+
+    def run_batch(self, name: str, requests: List[Dict[str, Any]], response_format: type
+                  ) -> Dict[str, Tuple[Optional[BaseModel], Optional[str], Optional[Dict[str, Any]]]]:
+        """Schrijf, dien in, wacht en lees de resultaten van één batch."""
+        if not requests:
+            return {}
+        input_path = os.path.join(self.work_dir, f"{name}.jsonl")
+        write_batch_file(input_path, requests)
+        batch_id = self.backend.submit(input_path)
+        if self.debug_mode:
+            print(f"Batch '{name}' ingediend als {batch_id} ({len(requests)} requests)")
+
+        deadline = time.monotonic() + self.timeout
+        status = self.backend.status(batch_id)
+        while status not in FINISHED_STATUSES:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Batch {batch_id} niet klaar binnen {self.timeout} seconden")
+            time.sleep(self.poll_interval)
+            status = self.backend.status(batch_id)
+        if status != "completed":
+            raise RuntimeError(f"Batch {batch_id} is niet voltooid: {status}")
+
+        output_path = os.path.join(self.work_dir, f"{name}.results.jsonl")
+        self.backend.download_results(batch_id, output_path)
+        return read_batch_results(output_path, response_format)
+
+    def generate(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Genereer een vraag per job; geeft per job (in dezelfde volgorde) een dict met 'job', 'question' en 'error'.
+
+        Jobs hebben dezelfde vorm als bij de AsyncQuestionEngine. Zoals daar krijgt elke job 'llm_calls':
+        per ingediende extractie en vraag de tokens en de kosten tegen de batch prijs.
+        """
+        extraction_inputs, relevant_info, errors = {}, {}, {}
+        for index, job in enumerate(jobs):
+            job["llm_calls"] = []
+            sections = job.get("sections")
+            category_info = select_sections(sections, job["category"]) if sections else None
+            extraction_inputs[index] = category_info or job["medicine_info"]
+            extraction = extract_by_rules(sections, job["category"]) if sections else None
+            if extraction is None:
+                extraction = load_cached_extraction(extraction_inputs[index], job["category"], job["medicine_name"])
+            if extraction is not None:
+                relevant_info[index] = extraction
+
+        # Batch 1: extracties die niet uit de secties of de cache komen
+        extraction_requests = [
+            build_request(f"extractie-{index}", build_extraction_messages(extraction_inputs[index], job["category"]),
+                          Extraction, EXTRACTION_TEMPERATURE)
+            for index, job in enumerate(jobs) if index not in relevant_info
+        ]
+        for custom_id, (extraction, error, usage) in self.run_batch("extracties", extraction_requests, Extraction).items():
+            index = int(custom_id.split("-", 1)[1])
+            jobs[index]["llm_calls"].append(batch_llm_call("extractie", jobs[index]["category"], usage))
+            if error:
+                errors[index] = f"Extractie mislukt: {error}"
+                continue
+            relevant_info[index] = extraction
+            save_extraction(extraction_inputs[index], jobs[index]["category"], jobs[index]["medicine_name"], extraction)
+
+        # Batch 2: quizvragen voor alle jobs met geëxtraheerde informatie
+        response_format = question_response_format()
+        question_requests = [
+            build_request(f"vraag-{index}", build_question_messages(job["medicine_name"], job["category"], relevant_info[index]),
+                          response_format, QUESTION_TEMPERATURE)
+            for index, job in enumerate(jobs) if index in relevant_info
+        ]
+        questions = {}
+        for custom_id, (question, error, usage) in self.run_batch("vragen", question_requests, response_format).items():
+            index = int(custom_id.split("-", 1)[1])
+            jobs[index]["llm_calls"].append(batch_llm_call("generatie", jobs[index]["category"], usage))
+            if error:
+                errors[index] = f"Quizvraag mislukt: {error}"
+            else:
+                questions[index] = question.final_resolution
+
+        results = []
+        for index, job in enumerate(jobs):
+            question = questions.get(index)
+            error = None if question else RuntimeError(errors.get(index, "Geen resultaat in de batch"))
+            results.append({"job": job, "question": question, "error": error})
+        return results
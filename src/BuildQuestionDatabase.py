@@ -1,14 +1,25 @@
 import os
+import sys
 import sqlite3
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 from dotenv import load_dotenv
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import uuid
 
 from SelectMedication import select_medication
-from GetMedicineInfo import get_medicine_info
-from GenerateQuestion import generate_quiz_question
+from GetMedicineInfo import get_medicine_info, get_cache_statistics, load_sections_from_cache
+import GenerateQuestion
+from GenerateQuestion import (
+    generate_quiz_question, generate_quiz_questions, get_random_knowledge_category, get_usage_statistics,
+    get_resilience_statistics, prepare_relevant_info
+)
+from AsyncQuestionEngine import AsyncQuestionEngine
+from LLMBackend import collect_llm_calls, share_llm_calls
+from BatchQuestionGeneration import BatchQuestionGenerator, BatchBackend, OpenAIBatchBackend
+from StagedPipeline import Stage, StagedPipeline, QUEUE_SIZE
 
 
 # LangChain tracing activeren
@@ -24,6 +35,12 @@ NUM_CLUSTERS = 1
 NUM_MEDICINES = 1
 DB_PATH = "/Users/pattynooijen/Documents/VisualStudioCode/daily_dose_quiz/data/QuizQuestions.db"
 SCHEMA_PATH = os.path.join(os.path.dirname(__file__), "Schema.sql")
+# Hoe lang een schrijver wacht op de schrijflock van een andere verbinding
+BUSY_TIMEOUT_SECONDS = 30
+BATCH_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "batches")
+# Workers per stap van de streaming pipeline (de selectie is de bron en draait in de aanroepende thread).
+# Opslaan heeft één worker: SQLite heeft toch maar één schrijver tegelijk.
+STAGE_WORKERS = {"ophalen": 4, "extractie": 4, "generatie": 8, "opslaan": 1}
 
 # Basis componenten
 class StatisticsManager:
@@ -37,150 +54,242 @@ class StatisticsManager:
             "failed_medications": [],
             "questions_generated": 0,
             "categories_used": set(),
-            "errors": []
+            "errors": [],
+            "cache": {},
+            "prompt_cache": {},
+            "resilience": {},
+            "stages": {}
         }
+        self._lock = threading.Lock()  # De stappen van de streaming pipeline tellen vanuit meerdere threads
+
+    def _increment(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
 
     def increment_clusters_processed(self):
-        self.stats["clusters_processed"] += 1
+        self._increment("clusters_processed")
 
     def increment_total_medications(self):
-        self.stats["total_medications"] += 1
+        self._increment("total_medications")
 
     def increment_successful_medications(self):
-        self.stats["successful_medications"] += 1
+        self._increment("successful_medications")
 
     def increment_questions_generated(self):
-        self.stats["questions_generated"] += 1
+        self._increment("questions_generated")
 
     def add_failed_medication(self, name: str, cluster: str, reason: str):
-        self.stats["failed_medications"].append({
-            "name": name,
-            "cluster": cluster,
-            "reason": reason
-        })
+        with self._lock:
+            self.stats["failed_medications"].append({
+                "name": name,
+                "cluster": cluster,
+                "reason": reason
+            })
 
     def add_error(self, error: str):
-        self.stats["errors"].append(error)
+        with self._lock:
+            self.stats["errors"].append(error)
 
     def add_category(self, category: str):
-        self.stats["categories_used"].add(category)
+        with self._lock:
+            self.stats["categories_used"].add(category)
+
+    def set_cache_statistics(self, start: Dict[str, int], end: Dict[str, int]):
+        """Sla de cache tellers van deze run op (verschil tussen begin en eind)."""
+        self.stats["cache"] = {
+            key: end[key] - start.get(key, 0) if key != "size" else end[key]
+            for key in end
+        }
+
+    def set_prompt_cache_statistics(self, start: Dict[str, int], end: Dict[str, int]):
+        """Sla het tokengebruik van deze run op, met het aandeel prompt tokens dat uit de cache van de provider kwam."""
+        usage = {key: end[key] - start.get(key, 0) for key in end}
+        usage["hit_rate"] = usage["cached_tokens"] / usage["prompt_tokens"] if usage["prompt_tokens"] else 0.0
+        self.stats["prompt_cache"] = usage
+
+    def set_resilience_statistics(self, start: Dict[str, float], end: Dict[str, float]):
+        """Sla de retries, fouten, pauzes van de circuit breaker en hedges van deze run op."""
+        self.stats["resilience"] = {key: end[key] - start.get(key, 0) for key in end}
+
+    def set_stage_statistics(self, stages: Dict[str, Dict[str, float]]):
+        """Sla per stap van de streaming pipeline de tellers, bezettingsgraad en wachtrijdiepte op."""
+        self.stats["stages"] = stages
 
 class DatabaseManager:
-    """Beheert database operaties voor quiz vragen en logging."""
+    """
+    Beheert database operaties voor quiz vragen en logging.
+
+    Elke thread houdt één verbinding open (sqlite3 verbindingen zijn niet deelbaar tussen threads), in
+    WAL mode en met synchronous=NORMAL; sqlite3 hergebruikt per verbinding de voorbereide statements.
+    Schrijfacties binnen `with transaction():` worden samen in één transactie vastgelegd, bijvoorbeeld
+    alle rijen van één medicijn; daarbuiten is elke schrijfactie een eigen transactie.
+    """
     def __init__(self, db_path: str = DB_PATH, schema_path: str = SCHEMA_PATH):
         self.db_path = db_path
         self.schema_path = schema_path
+        self._local = threading.local()
         self._init_db()
 
+    def _connect(self) -> sqlite3.Connection:
+        """Geef de verbinding van deze thread terug; de eerste keer wordt die geopend."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA synchronous = NORMAL")  # Veilig in WAL mode, één fsync per checkpoint
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Eén schrijftransactie (BEGIN IMMEDIATE) voor alle schrijfacties in dit blok; genest: de buitenste telt."""
+        conn = self._connect()
+        if conn.in_transaction:
+            yield conn
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
     def _init_db(self):
         if not os.path.exists(self.schema_path):
             raise FileNotFoundError(f"schema.sql niet gevonden op: {self.schema_path}")
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode = WAL")  # Blijft bewaard in het databasebestand
         with open(self.schema_path, "r", encoding="utf-8") as f:
-            schema_sql = f.read()
-            c.executescript(schema_sql)
-        conn.commit()
-        conn.close()
+            conn.executescript(f.read())
+        # Kolommen die later aan een bestaande tabel zijn toegevoegd
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(generated_quiz_questions)")}
+        if "kenniscategorie" not in columns:
+            conn.execute("ALTER TABLE generated_quiz_questions ADD COLUMN kenniscategorie TEXT")
+
+    def close(self):
+        """Sluit de verbinding van deze thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
 
-    def save_selected_medications(self, selected_medications: Dict[str, Any]) -> None:
+    def save_selected_medications(self, selected_medications: Dict[str, Any]) -> Dict[Tuple[str, str], str]:
         """
         Sla geselecteerde medicatie op in de database.
         
         Args:
             selected_medications: Dict met geselecteerde medicatie informatie
+
+        Returns:
+            De gegenereerde UUID per (atc7, naam) van elk geselecteerd medicijn
         """
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        
+        rows = [
+            (
+                str(uuid.uuid4()),  # Genereer een nieuwe UUID
+                cluster["atc5_code"],
+                cluster["naam"],
+                cluster["gewicht"],
+                medicine["atc7"],
+                medicine["naam"],
+                medicine.get("merknaam", None),
+                medicine["gewicht"]
+            )
+            for cluster in selected_medications["selected_clusters"]
+            for medicine in cluster["geneesmiddelen"]
+        ]
         try:
-            for cluster in selected_medications["selected_clusters"]:
-                for medicine in cluster["geneesmiddelen"]:
-                    c.execute('''
-                        INSERT INTO selected_medications (
-                            uuid, atc5_code, cluster_name, cluster_weight,
-                            atc7_code, medicine_name, brand_name, medicine_weight
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        str(uuid.uuid4()),  # Genereer een nieuwe UUID
-                        cluster["atc5_code"],
-                        cluster["naam"],
-                        cluster["gewicht"],
-                        medicine["atc7"],
-                        medicine["naam"],
-                        medicine.get("merknaam", None),
-                        medicine["gewicht"]
-                    ))
-            
-            conn.commit()
-            
+            with self.transaction() as conn:
+                conn.executemany('''
+                    INSERT INTO selected_medications (
+                        uuid, atc5_code, cluster_name, cluster_weight,
+                        atc7_code, medicine_name, brand_name, medicine_weight
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
         except Exception as e:
-            conn.rollback()
             raise RuntimeError(f"Fout bij opslaan geselecteerde medicatie: {str(e)}")
-            
-        finally:
-            conn.close()
+        return {(row[4], row[5]): row[0] for row in rows}
+
+    def save_medicine_information(self, med_uuid: str, info: Dict[str, Any]) -> int:
+        """Sla de opgehaalde informatie van een geselecteerd medicijn op in medicine_information; geeft het id terug."""
+        with self.transaction() as conn:
+            return conn.execute('''
+                INSERT INTO medicine_information (
+                    quiz_question_uuid, bron_url, timestamp_opgeslagen,
+                    kenniscategorie, relevante_informatie, llm_raw_output,
+                    timestamp_gegenereerd
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                med_uuid,
+                info.get("url", ""),  # Gebruik 'url' uit dict
+                info.get("date", ""),  # Gebruik datum uit dict
+                info.get("kenniscategorie", ""),
+                info.get("relevant_information", ""),
+                json.dumps(info),
+                datetime.now().isoformat()
+            )).lastrowid
+
+    def save_quiz_question(self, **kwargs) -> str:
+        """
+        Sla een quizvraag op en geef de quiz_question_uuid terug.
 
-    def save_information_and_quiz_question(self, **kwargs):
+        information_id verwijst naar de rij in medicine_information die bij het ophalen is opgeslagen
+        (save_medicine_information); de informatie zelf wordt niet per vraag opnieuw opgeslagen.
+        """
         quiz_question_uuid = str(uuid.uuid4())
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        # Save information
-        c.execute('''
-            INSERT INTO information (
-                quiz_question_uuid, atc7_code, kenniscategorie, bron_url, timestamp_opgeslagen,
-                geëxtraheerde_informatie, llm_raw_output, timestamp_gegenereerd
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            quiz_question_uuid,
-            kwargs.get('atc7_code'),
-            kwargs.get('kenniscategorie'),
-            kwargs.get('bron_url'),
-            kwargs.get('timestamp_opgeslagen'),
-            kwargs.get('geëxtraheerde_informatie'),
-            kwargs.get('llm_info_raw_output'),
-            kwargs.get('timestamp_gegenereerd')
-        ))
-        information_id = c.lastrowid
-
-        # Save quiz question
-        antwoordopties = kwargs.get('antwoordopties', [])
+        timestamp_gegenereerd = kwargs.get('timestamp_gegenereerd') or datetime.now().isoformat()
+
+        antwoordopties = list(kwargs.get('antwoordopties', []))
         while len(antwoordopties) < 4:
             antwoordopties.append("")
 
-        c.execute('''
-            INSERT INTO generated_quiz_questions (
-                quiz_question_uuid, information_id, introductie, vraag,
-                antwoordoptie_1, antwoordoptie_2, antwoordoptie_3, antwoordoptie_4,
-                juiste_antwoord, uitleg, llm_raw_output, timestamp_gegenereerd
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
-            quiz_question_uuid,
-            information_id,
-            kwargs.get('introductie'),
-            kwargs.get('vraag'),
-            antwoordopties[0],
-            antwoordopties[1],
-            antwoordopties[2],
-            antwoordopties[3],
-            kwargs.get('juiste_antwoord'),
-            kwargs.get('uitleg'),
-            kwargs.get('llm_quiz_raw_output'),
-            kwargs.get('timestamp_gegenereerd')
-        ))
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute('''
+                INSERT INTO generated_quiz_questions (
+                    quiz_question_uuid, information_id, kenniscategorie, introductie, vraag,
+                    antwoordoptie_1, antwoordoptie_2, antwoordoptie_3, antwoordoptie_4,
+                    juiste_antwoord, uitleg, llm_raw_output, timestamp_gegenereerd
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (
+                quiz_question_uuid,
+                kwargs.get('information_id'),
+                kwargs.get('kenniscategorie'),
+                kwargs.get('introductie'),
+                kwargs.get('vraag'),
+                antwoordopties[0],
+                antwoordopties[1],
+                antwoordopties[2],
+                antwoordopties[3],
+                kwargs.get('juiste_antwoord'),
+                kwargs.get('uitleg'),
+                kwargs.get('llm_quiz_raw_output'),
+                timestamp_gegenereerd
+            ))
+        return quiz_question_uuid
+
+    def save_llm_calls(self, quiz_question_uuid: Optional[str], llm_calls: Optional[List[Dict[str, Any]]]):
+        """Sla tokens, latency en geschatte kosten van LLM calls op, gekoppeld aan de quizvraag."""
+        if not llm_calls:
+            return
+        with self.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO llm_calls (
+                    quiz_question_uuid, stap, model, kenniscategorie, prompt_tokens, completion_tokens,
+                    cached_tokens, latency_ms, retries, kosten, timestamp
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (quiz_question_uuid, call["stap"], call["model"], call["kenniscategorie"], call["prompt_tokens"],
+                 call["completion_tokens"], call["cached_tokens"], call["latency_ms"], call["retries"],
+                 call["kosten"], call["timestamp"])
+                for call in llm_calls
+            ])
 
     def log_process(self, event_type: str, medicine: str, category: str, message: str):
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO process_logs (event_type, medicine, category, message, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (event_type, medicine, category, message, datetime.now().isoformat()))
-        conn.commit()
-        conn.close()
+        with self.transaction() as conn:
+            conn.execute('''
+                INSERT INTO process_logs (event_type, medicine, category, message, timestamp)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (event_type, medicine, category, message, datetime.now().isoformat()))
 
 # Quiz generatie componenten
 class MedicationSelector:
@@ -229,19 +338,11 @@ class QuestionGenerator:
                     
             # Als het een object is met final_resolution attribuut
             if hasattr(data, 'final_resolution'):
-                q = data.final_resolution
-                return {
-                    "introductie": getattr(q, "introductie", ""),
-                    "vraag": getattr(q, "vraag", ""),
-                    "antwoordopties": getattr(q, "antwoordopties", []),
-                    "antwoord": getattr(q, "antwoord", ""),
-                    "uitleg": getattr(q, "uitleg", ""),
-                    "categorie": getattr(q, "categorie", "")
-                }
-                
-            # Als het een object is met directe attributen
+                data = data.final_resolution
+
+            # Als het een object is met directe attributen (Response, LeanResponse of LeanFlagsResponse)
             if hasattr(data, 'introductie'):
-                return {
+                question_data = {
                     "introductie": getattr(data, "introductie", ""),
                     "vraag": getattr(data, "vraag", ""),
                     "antwoordopties": getattr(data, "antwoordopties", []),
@@ -249,6 +350,11 @@ class QuestionGenerator:
                     "uitleg": getattr(data, "uitleg", ""),
                     "categorie": getattr(data, "categorie", "")
                 }
+                # Alleen de ja/nee vlaggen van het lean schema; de zelfcontrole in vrije tekst wordt niet bewaard
+                verification = getattr(data, "verificatie", None)
+                if isinstance(getattr(verification, "accurate", None), bool):
+                    question_data["verificatie"] = verification.model_dump()
+                return question_data
                 
             if self.debug_mode:
                 print(f"Onbekend data type: {type(data)}")
@@ -259,16 +365,55 @@ class QuestionGenerator:
                 print(f"Fout bij valideren vraag data: {str(e)}")
             return None
 
-    def generate_question(self, medicine_name: str, medicine_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
-        """Genereer een quiz vraag voor een medicijn."""
+    def generate_question(self, medicine_name: str, medicine_info: Dict[str, Any],
+                          sections: Optional[List] = None, category: Optional[str] = None,
+                          relevant_info: Optional[Any] = None) -> Optional[Dict[str, Any]]:
+        """Genereer een quiz vraag voor een medicijn (met category en relevant_info: zonder extractie)."""
         try:
             # Genereer de vraag
             question = generate_quiz_question(
                 medicine_name=medicine_name,
                 medicine_info=medicine_info,
-                debug_mode=self.debug_mode  # Geef debug_mode door aan generate_quiz_question
+                debug_mode=self.debug_mode,  # Geef debug_mode door aan generate_quiz_question
+                sections=sections,
+                category=category,
+                relevant_info=relevant_info
             )
             
+            return self.process_question(medicine_name, question, category)
+            
+        except Exception as e:
+            error_msg = f"Fout bij genereren vraag voor {medicine_name}: {str(e)}"
+            if self.debug_mode:
+                print(error_msg)
+            self.stats_manager.add_error(error_msg)
+            return None
+
+    def generate_questions(self, medicine_name: str, medicine_info: Dict[str, Any], num_questions: int,
+                           sections: Optional[List] = None) -> List[Dict[str, Any]]:
+        """Genereer meerdere quiz vragen in één LLM call; elke vraag wordt apart gevalideerd."""
+        try:
+            questions = generate_quiz_questions(
+                medicine_name=medicine_name,
+                medicine_info=medicine_info,
+                num_questions=num_questions,
+                debug_mode=self.debug_mode,
+                sections=sections
+            )
+        except Exception as e:
+            error_msg = f"Fout bij genereren vragen voor {medicine_name}: {str(e)}"
+            if self.debug_mode:
+                print(error_msg)
+            self.stats_manager.add_error(error_msg)
+            return []
+
+        validated = [self.process_question(medicine_name, question, category) for category, question in questions]
+        return [question_data for question_data in validated if question_data]
+
+    def process_question(self, medicine_name: str, question: Any,
+                         category: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Valideer een gegenereerde vraag en werk de statistieken bij."""
+        try:
             if not question:
                 if self.debug_mode:
                     print("Geen vraag gegenereerd")
@@ -293,6 +438,18 @@ class QuestionGenerator:
                 self.stats_manager.add_error(f"Ontbrekende velden in vraag voor {medicine_name}: {missing_fields}")
                 return None
 
+            # Lean schema met vlaggen: het model keurt zijn eigen vraag af
+            failed_checks = [check for check, passed in (question_data.get("verificatie") or {}).items()
+                             if isinstance(passed, bool) and not passed]
+            if failed_checks:
+                if self.debug_mode:
+                    print(f"Zelfcontrole niet geslaagd: {failed_checks}")
+                self.stats_manager.add_error(f"Zelfcontrole niet geslaagd voor {medicine_name}: {failed_checks}")
+                return None
+
+            if category and not question_data.get("categorie"):
+                question_data["categorie"] = category
+
             # Update statistieken
             self.stats_manager.add_category(question_data.get("categorie", "onbekend"))
             self.stats_manager.increment_questions_generated()
@@ -300,7 +457,7 @@ class QuestionGenerator:
             return question_data
             
         except Exception as e:
-            error_msg = f"Fout bij genereren vraag voor {medicine_name}: {str(e)}"
+            error_msg = f"Fout bij verwerken vraag voor {medicine_name}: {str(e)}"
             if self.debug_mode:
                 print(error_msg)
             self.stats_manager.add_error(error_msg)
@@ -308,33 +465,114 @@ class QuestionGenerator:
 
 # Hoofdpipeline
 class QuizGenerationPipeline:
-    """Coördineert het hele proces van quiz generatie."""
-    def __init__(self, debug_mode: bool = True):
+    """Coördineert het hele proces van quiz generatie.
+
+    In batch mode wordt nooit om invoer gevraagd: medicijnen zonder werkende URL worden
+    overgeslagen en in de URL-wachtrij gezet (afwerken met tools/ResolveUrlQueue.py).
+    Standaard loopt elk medicijn los door een streaming pipeline: selectie → ophalen → extractie →
+    generatie → opslaan, met een begrensde wachtrij en eigen workers per stap (stage_workers, standaard
+    STAGE_WORKERS). Zo overlapt het ophalen van het volgende medicijn met de LLM calls voor het vorige.
+    Met streaming=False wordt eerst alle informatie opgehaald en worden daarna de vragen één voor één
+    gegenereerd.
+    Met max_concurrency worden de vragen gelijktijdig gegenereerd door de AsyncQuestionEngine.
+    Met een batch_backend gaan alle requests als JSONL batch naar de (goedkopere) batch API.
+    Die twee hebben alle jobs vooraf nodig en halen dus eerst alle informatie op.
+    Met questions_per_call > 1 levert één LLM call meerdere vragen per medicijn op (elk een eigen rij).
+    """
+    def __init__(self, debug_mode: bool = True, batch_mode: bool = False, max_concurrency: Optional[int] = None,
+                 batch_backend: Optional[BatchBackend] = None, questions_per_call: int = 1, streaming: bool = True,
+                 stage_workers: Optional[Dict[str, int]] = None, queue_size: int = QUEUE_SIZE):
         load_dotenv()
         self.debug_mode = debug_mode
+        self.batch_mode = batch_mode
+        self.max_concurrency = max_concurrency  # None: vragen één voor één genereren
+        self.batch_backend = batch_backend
+        self.questions_per_call = questions_per_call
+        self.streaming = streaming
+        self.stage_workers = dict(STAGE_WORKERS, **(stage_workers or {}))
+        self.queue_size = queue_size  # Maximaal aantal wachtende jobs per stap
         self.db_manager = DatabaseManager()
         self.question_generator = QuestionGenerator(debug_mode)
         self.medication_selector = MedicationSelector()
 
     def generate_quiz(self, atc_cluster: Optional[str] = None) -> List[Dict[str, Any]]:
+        cache_stats_start = get_cache_statistics()
+        usage_stats_start = get_usage_statistics()
+        resilience_stats_start = get_resilience_statistics()
         try:
             # Select medications
             selected_meds = self.medication_selector.select_medications(atc_cluster)
             
-            # Save selected medications to database
-            self.db_manager.save_selected_medications(selected_meds)
+            # Save selected medications to database; de UUIDs gaan direct mee naar de volgende stap
+            selection_uuids = self.db_manager.save_selected_medications(selected_meds)
+
+            if self.streaming and not (self.batch_backend or self.max_concurrency):
+                return self._generate_questions_streaming(selected_meds, selection_uuids)
 
             # Get medicine information
-            medicine_info = self._get_medicine_information(selected_meds)
+            medicine_info = self._get_medicine_information(selected_meds, selection_uuids)
 
             # Generate questions
-            questions = self._generate_questions(medicine_info)
+            if self.batch_backend:
+                questions = self._generate_questions_batch(medicine_info)
+            elif self.max_concurrency:
+                questions = self._generate_questions_async(medicine_info)
+            else:
+                questions = self._generate_questions(medicine_info)
             return questions
         except Exception as e:
             self.db_manager.log_process("error", '', '', f"Fout tijdens quiz generatie: {str(e)}")
             return []
-
-    def _get_medicine_information(self, medication: Dict[str, Any]) -> Dict[str, Any]:
+        finally:
+            self.question_generator.stats_manager.set_cache_statistics(cache_stats_start, get_cache_statistics())
+            self._report_prompt_cache(usage_stats_start)
+            self._report_resilience(resilience_stats_start)
+
+    def _report_prompt_cache(self, usage_stats_start: Dict[str, int]):
+        """Leg vast welk deel van de prompt tokens deze run uit de prompt cache van de provider kwam."""
+        stats_manager = self.question_generator.stats_manager
+        stats_manager.set_prompt_cache_statistics(usage_stats_start, get_usage_statistics())
+        usage = stats_manager.stats["prompt_cache"]
+        if not usage["calls"]:
+            return
+        # Alleen de calls met de vaste prefix; de extractie heeft geen vaste prefix en zou de hit rate drukken
+        message = (f"Prompt cache: {usage['cached_tokens']} van {usage['prompt_tokens']} prompt tokens uit de cache "
+                   f"({usage['hit_rate']:.0%}), {usage['cache_hits']} van {usage['calls']} calls met cache hit")
+        self.db_manager.log_process("info", '', '', message)
+        if self.question_generator.debug_mode:
+            print(message)
+
+    def _report_resilience(self, resilience_stats_start: Dict[str, float]):
+        """Leg vast hoeveel calls opnieuw moesten en hoe lang de pipeline pauzeerde voor de provider."""
+        stats_manager = self.question_generator.stats_manager
+        stats_manager.set_resilience_statistics(resilience_stats_start, get_resilience_statistics())
+        stats = stats_manager.stats["resilience"]
+        if not (stats["retries"] or stats["fatal_errors"] or stats["hedges"]):
+            return
+        message = (f"LLM calls: {stats['retries']} retries ({stats['rate_limited']} rate limits, "
+                   f"{stats['transient_errors']} tijdelijke fouten), {stats['gave_up']} opgegeven, "
+                   f"{stats['fatal_errors']} niet herhaalbare fouten, circuit breaker {stats['circuit_opened']}x open "
+                   f"({stats['paused_seconds']:.0f} s gepauzeerd), {stats['hedges']} hedges "
+                   f"waarvan {stats['hedges_won']} sneller")
+        self.db_manager.log_process("warning" if stats["gave_up"] else "info", '', '', message)
+        if self.question_generator.debug_mode:
+            print(message)
+
+    def _report_stages(self, pipeline: StagedPipeline):
+        """Leg per stap vast hoeveel jobs er doorheen gingen, hoe bezet de workers waren en hoe vol de wachtrij stond."""
+        stages = pipeline.get_statistics()
+        self.question_generator.stats_manager.set_stage_statistics(stages)
+        message = f"Streaming pipeline ({pipeline.elapsed_seconds:.1f} s): " + "; ".join(
+            f"{name} {stats['items']} in, {stats['out']} uit, {stats['errors']} fouten, {stats['workers']} workers "
+            f"{stats['utilisation']:.0%} bezet, wachtrij gem {stats['queue_avg']:.1f} max {stats['queue_max']}"
+            for name, stats in stages.items()
+        )
+        self.db_manager.log_process("info", '', '', message)
+        if self.question_generator.debug_mode:
+            print(message)
+
+    def _get_medicine_information(self, medication: Dict[str, Any],
+                                  selection_uuids: Dict[Tuple[str, str], str]) -> Dict[str, Any]:
         all_info = {}
         for cluster in medication["selected_clusters"]:
             self.question_generator.stats_manager.increment_clusters_processed()
@@ -344,84 +582,11 @@ class QuizGenerationPipeline:
             }
             
             for med in cluster["geneesmiddelen"]:
-                self.question_generator.stats_manager.increment_total_medications()
-                med_name = med["naam"].lower()
-                brand_name = med.get("merknaam", None)
-                
-                try:
-                    # Haal eerst de UUID op uit de database
-                    conn = sqlite3.connect(self.db_manager.db_path)
-                    c = conn.cursor()
-                    c.execute('''
-                        SELECT uuid FROM selected_medications 
-                        WHERE medicine_name = ? AND atc7_code = ?
-                    ''', (med["naam"], med["atc7"]))
-                    result = c.fetchone()
-                    
-                    if not result:
-                        raise RuntimeError(f"Geen UUID gevonden voor {med_name}")
-                    med_uuid = result[0]
-                    
-                    info = get_medicine_info(med_name, cluster["naam"], brand_name, debug_mode=self.debug_mode)
-                    
-                    # Converteer string naar dictionary indien nodig
-                    if isinstance(info, str):
-                        try:
-                            # Probeer eerst als JSON te parsen
-                            info = json.loads(info)
-                        except json.JSONDecodeError:
-                            # Als dat niet lukt, maak een basis dictionary
-                            info = {
-                                "url": "",
-                                "date": datetime.now().isoformat(),
-                                "kenniscategorie": "",
-                                "relevant_information": info,
-                                "llm_raw_output": info
-                            }
-                    
-                    if not info or "Geen informatie beschikbaar" in str(info):
-                        self.db_manager.log_process("warning", med_name, '', "Geen informatie gevonden, medicijn overgeslagen")
-                        self.question_generator.stats_manager.add_failed_medication(
-                            med_name, 
-                            cluster["naam"], 
-                            "Geen informatie beschikbaar"
-                        )
-                        continue
-
-                    # Sla de informatie op in de medicine_information tabel
-                    c.execute('''
-                        INSERT INTO medicine_information (
-                            quiz_question_uuid, bron_url, timestamp_opgeslagen,
-                            kenniscategorie, relevante_informatie, llm_raw_output,
-                            timestamp_gegenereerd
-                        ) VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (
-                        med_uuid,  # Gebruik de opgehaalde UUID
-                        info.get("url", ""),  # Gebruik 'url' uit dict
-                        info.get("date", ""),  # Gebruik datum uit dict
-                        info.get("kenniscategorie", ""),
-                        info.get("relevant_information", ""),
-                        json.dumps(info),
-                        datetime.now().isoformat()
-                    ))
-                    conn.commit()
-                    conn.close()
-                        
-                    cluster_info["medications"][med_name] = {
-                        "info": info,
-                        "atc7": med["atc7"],
-                        "brand": med.get("merknaam", "")
-                    }
-                    self.question_generator.stats_manager.increment_successful_medications()
-                    
-                except Exception as med_error:
-                    self.db_manager.log_process("error", med_name, '', f"Fout bij ophalen info: {str(med_error)}")
-                    self.question_generator.stats_manager.add_failed_medication(
-                        med_name, 
-                        cluster["naam"], 
-                        str(med_error)
-                    )
-                    continue
+                med_info = self._fetch_medicine_information(
+                    cluster["naam"], med, selection_uuids.get((med["atc7"], med["naam"]))
+                )
+                if med_info:
+                    cluster_info["medications"][med["naam"].lower()] = med_info
                     
             if cluster_info["medications"]:
                 all_info[cluster["atc5_code"]] = cluster_info
@@ -432,54 +597,305 @@ class QuizGenerationPipeline:
             
         return all_info
 
+    def _fetch_medicine_information(self, cluster_name: str, med: Dict[str, Any],
+                                    med_uuid: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Haal de informatie van één medicijn op en sla die op; None als het medicijn wordt overgeslagen."""
+        self.question_generator.stats_manager.increment_total_medications()
+        med_name = med["naam"].lower()
+        brand_name = med.get("merknaam", None)
+        
+        try:
+            # De UUID van deze selectie (uit save_selected_medications)
+            if not med_uuid:
+                raise RuntimeError(f"Geen UUID gevonden voor {med_name}")
+            
+            info = get_medicine_info(
+                med_name, cluster_name, brand_name,
+                debug_mode=self.debug_mode, interactive=not self.batch_mode
+            )
+            
+            # Converteer string naar dictionary indien nodig
+            if isinstance(info, str):
+                try:
+                    # Probeer eerst als JSON te parsen
+                    info = json.loads(info)
+                except json.JSONDecodeError:
+                    # Als dat niet lukt, maak een basis dictionary
+                    info = {
+                        "url": "",
+                        "date": datetime.now().isoformat(),
+                        "kenniscategorie": "",
+                        "relevant_information": info,
+                        "llm_raw_output": info
+                    }
+            
+            if not info or "Geen informatie beschikbaar" in str(info):
+                reason = "Geen informatie beschikbaar"
+                if self.batch_mode:
+                    reason += " (in URL-wachtrij gezet)"
+                self.db_manager.log_process("warning", med_name, '', f"{reason}, medicijn overgeslagen")
+                self.question_generator.stats_manager.add_failed_medication(
+                    med_name, 
+                    cluster_name, 
+                    reason
+                )
+                return None
+
+            # Sla de informatie op in de medicine_information tabel; de vragen verwijzen naar deze rij
+            information_id = self.db_manager.save_medicine_information(med_uuid, info)
+            self.question_generator.stats_manager.increment_successful_medications()
+                
+            return {
+                "information_id": information_id,
+                "info": info,
+                "sections": load_sections_from_cache(med_name),
+                "atc7": med["atc7"],
+                "brand": med.get("merknaam", "")
+            }
+            
+        except Exception as med_error:
+            self.db_manager.log_process("error", med_name, '', f"Fout bij ophalen info: {str(med_error)}")
+            self.question_generator.stats_manager.add_failed_medication(
+                med_name, 
+                cluster_name, 
+                str(med_error)
+            )
+            return None
+
+    def _generate_questions_streaming(self, medication: Dict[str, Any],
+                                      selection_uuids: Dict[Tuple[str, str], str]) -> List[Dict[str, Any]]:
+        """
+        Laat elk medicijn los door de stappen ophalen, extractie, generatie en opslaan lopen (StagedPipeline).
+
+        Een job (dict) gaat van stap naar stap en krijgt onderweg de informatie, de kenniscategorie, de
+        extractie, de gegenereerde vragen en de LLM calls erbij. Elke vraag wordt opgeslagen zodra die klaar is.
+        """
+        # In interactieve mode kan het ophalen om een URL vragen; dan één medicijn tegelijk
+        fetch_workers = self.stage_workers["ophalen"] if self.batch_mode else 1
+        pipeline = StagedPipeline([
+            Stage("ophalen", self._fetch_stage, fetch_workers, self.queue_size),
+            Stage("extractie", self._extract_stage, self.stage_workers["extractie"], self.queue_size),
+            Stage("generatie", self._generate_stage, self.stage_workers["generatie"], self.queue_size),
+            Stage("opslaan", self._persist_stage, self.stage_workers["opslaan"], self.queue_size),
+        ], source_name="selectie", on_error=self._log_stage_error, on_worker_exit=self.db_manager.close)
+        try:
+            questions = pipeline.run(self._iter_medications(medication, selection_uuids))
+        finally:
+            self._report_stages(pipeline)
+
+        if not pipeline.get_statistics()["ophalen"]["out"]:
+            self.db_manager.log_process("error", '', '', "Geen informatie gevonden voor alle geselecteerde medicijnen")
+            raise RuntimeError("Geen informatie gevonden voor alle geselecteerde medicijnen")
+        return questions
+
+    def _iter_medications(self, medication: Dict[str, Any], selection_uuids: Dict[Tuple[str, str], str]):
+        """Bron van de streaming pipeline: één job per geselecteerd medicijn."""
+        for cluster in medication["selected_clusters"]:
+            self.question_generator.stats_manager.increment_clusters_processed()
+            for med in cluster["geneesmiddelen"]:
+                yield {
+                    "atc5": cluster["atc5_code"],
+                    "cluster_info": {"cluster_name": cluster["naam"]},
+                    "medicine_name": med["naam"].lower(),
+                    "med": med,
+                    "med_uuid": selection_uuids.get((med["atc7"], med["naam"])),
+                    "llm_calls": []
+                }
+
+    def _fetch_stage(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        med_info = self._fetch_medicine_information(job["cluster_info"]["cluster_name"], job["med"], job["med_uuid"])
+        if not med_info:
+            return []
+        job["med_info"] = med_info
+        return [job]
+
+    def _extract_stage(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Kies de kenniscategorie en bepaal de relevante informatie (regels, extractiecache of LLM call)."""
+        if self.questions_per_call > 1 or GenerateQuestion.FUSED_MODE:
+            return [job]  # Deze calls doen de extractie zelf
+        med_info = job["med_info"]
+        job["category"] = get_random_knowledge_category()
+        with collect_llm_calls() as llm_calls:
+            try:
+                job["relevant_info"] = prepare_relevant_info(
+                    job["medicine_name"], med_info["info"], job["category"], med_info.get("sections")
+                )
+            finally:
+                job["llm_calls"] += llm_calls
+        return [job]
+
+    def _generate_stage(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        med_info = job["med_info"]
+        with collect_llm_calls() as llm_calls:
+            try:
+                if self.questions_per_call > 1:
+                    job["generated"] = self.question_generator.generate_questions(
+                        job["medicine_name"], med_info["info"], self.questions_per_call, sections=med_info.get("sections")
+                    )
+                else:
+                    question_data = self.question_generator.generate_question(
+                        job["medicine_name"], med_info["info"], sections=med_info.get("sections"),
+                        category=job.get("category"), relevant_info=job.get("relevant_info")
+                    )
+                    job["generated"] = [question_data] if question_data else []
+            finally:
+                job["llm_calls"] += llm_calls
+        return [job]
+
+    def _persist_stage(self, job: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Sla de vragen van één medicijn in één transactie op; zonder vraag alleen de LLM calls."""
+        generated = job["generated"]
+        if not generated:
+            self.db_manager.save_llm_calls(None, job["llm_calls"])
+            return []
+        questions = []
+        # Elke vraag een eigen rij, met een evenredig deel van de gedeelde calls
+        with self.db_manager.transaction():
+            for index, question_data in enumerate(generated):
+                shared_calls = share_llm_calls(job["llm_calls"], len(generated), question_data.get("categorie"), index)
+                questions.append(self._save_question(job["atc5"], job["cluster_info"], job["medicine_name"],
+                                                     job["med_info"], question_data, shared_calls))
+        return questions
+
+    def _log_stage_error(self, stage: str, job: Dict[str, Any], error: Exception):
+        """
+        Fout in een stap van de streaming pipeline: bewaar de LLM calls tot dan toe en log de fout. Na een
+        fout bij het opslaan is de transactie teruggedraaid, dus ook dan worden de calls (zonder vraag) bewaard.
+        """
+        self.db_manager.save_llm_calls(None, job.get("llm_calls"))
+        self._log_question_error(job["cluster_info"], job["medicine_name"], error)
+
     def _generate_questions(self, medicine_info: Dict[str, Any]) -> List[Dict[str, Any]]:
         questions = []
         for atc5, cluster_info in medicine_info.items():
             for med_name, med_info in cluster_info["medications"].items():
                 try:
-                    question_data = self.question_generator.generate_question(med_name, med_info["info"])
-                    if not question_data:
+                    with collect_llm_calls() as llm_calls:
+                        if self.questions_per_call > 1:
+                            generated = self.question_generator.generate_questions(
+                                med_name, med_info["info"], self.questions_per_call, sections=med_info.get("sections")
+                            )
+                        else:
+                            question_data = self.question_generator.generate_question(
+                                med_name, med_info["info"], sections=med_info.get("sections")
+                            )
+                            generated = [question_data] if question_data else []
+                    if generated:
+                        # Elke vraag een eigen rij, met een evenredig deel van de gedeelde calls; samen één transactie
+                        saved = []
+                        with self.db_manager.transaction():
+                            for index, question_data in enumerate(generated):
+                                shared_calls = share_llm_calls(llm_calls, len(generated),
+                                                               question_data.get("categorie"), index)
+                                saved.append(self._save_question(atc5, cluster_info, med_name, med_info,
+                                                                 question_data, shared_calls))
+                        questions.extend(saved)
                         continue
-                    
-                    # Save to database
-                    self.db_manager.save_information_and_quiz_question(
-                        atc7_code=med_info["atc7"],
-                        kenniscategorie=question_data["categorie"],
-                        bron_url=med_info["info"].get("url", ""),
-                        timestamp_opgeslagen=datetime.now().isoformat(),
-                        geëxtraheerde_informatie=med_info["info"].get("relevant_information", ""),
-                        llm_info_raw_output=json.dumps(med_info),
-                        introductie=question_data["introductie"],
-                        vraag=question_data["vraag"],
-                        antwoordopties=question_data["antwoordopties"],
-                        juiste_antwoord=question_data["antwoord"],
-                        uitleg=question_data["uitleg"],
-                        llm_quiz_raw_output=json.dumps(question_data)
-                    )
-
-                    questions.append({
-                        "question": question_data,
-                        "metadata": {
-                            "medicine_name": med_name,
-                            "atc7": med_info["atc7"],
-                            "atc5": atc5,
-                            "cluster_name": cluster_info["cluster_name"]
-                        }
-                    })
                 except Exception as e:
-                    self.db_manager.log_process("error", med_name, '', f"Fout bij genereren vraag: {str(e)}")
-                    self.question_generator.stats_manager.add_failed_medication(
-                        med_name, 
-                        cluster_info["cluster_name"], 
-                        str(e)
-                    )
+                    self._log_question_error(cluster_info, med_name, e)
+                # Geen vraag, of de transactie is teruggedraaid: bewaar de LLM calls zonder vraag
+                self.db_manager.save_llm_calls(None, llm_calls)
         return questions
 
+    def _build_jobs(self, medicine_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Eén job per medicijn, met een vooraf gekozen kenniscategorie."""
+        return [
+            {
+                "medicine_name": med_name,
+                "medicine_info": med_info["info"],
+                "sections": med_info.get("sections"),
+                "category": get_random_knowledge_category(),
+                "atc5": atc5,
+                "cluster_info": cluster_info,
+                "med_info": med_info
+            }
+            for atc5, cluster_info in medicine_info.items()
+            for med_name, med_info in cluster_info["medications"].items()
+        ]
+
+    def _handle_result(self, questions: List[Dict[str, Any]], job: Dict[str, Any], question: Any,
+                       error: Optional[Exception]):
+        """Valideer en sla het resultaat van een job op."""
+        try:
+            if error:
+                raise error
+            question_data = self.question_generator.process_question(job["medicine_name"], question, job["category"])
+            if question_data:
+                questions.append(self._save_question(
+                    job["atc5"], job["cluster_info"], job["medicine_name"], job["med_info"], question_data,
+                    job.get("llm_calls")
+                ))
+                return
+        except Exception as e:
+            self._log_question_error(job["cluster_info"], job["medicine_name"], e)
+        # Geen vraag, of de transactie is teruggedraaid: bewaar de LLM calls zonder vraag
+        self.db_manager.save_llm_calls(None, job.get("llm_calls"))
+
+    def _generate_questions_async(self, medicine_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Genereer alle vragen gelijktijdig; elk resultaat wordt opgeslagen zodra het klaar is."""
+        questions = []
+        engine = AsyncQuestionEngine(
+            max_concurrency=self.max_concurrency,
+            on_result=lambda job, question, error: self._handle_result(questions, job, question, error),
+            debug_mode=self.debug_mode
+        )
+        engine.run_jobs(self._build_jobs(medicine_info))
+        return questions
+
+    def _generate_questions_batch(self, medicine_info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Genereer alle vragen via de batch API en sla de resultaten op zodra de batches klaar zijn."""
+        work_dir = os.path.join(BATCH_DIR, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        generator = BatchQuestionGenerator(self.batch_backend, work_dir, debug_mode=self.debug_mode)
+        questions = []
+        for result in generator.generate(self._build_jobs(medicine_info)):
+            self._handle_result(questions, result["job"], result["question"], result["error"])
+        return questions
+
+    def _save_question(self, atc5: str, cluster_info: Dict[str, Any], med_name: str, med_info: Dict[str, Any],
+                       question_data: Dict[str, Any],
+                       llm_calls: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        # Save to database: vraag en LLM calls in één transactie
+        with self.db_manager.transaction():
+            quiz_question_uuid = self.db_manager.save_quiz_question(
+                information_id=med_info.get("information_id"),
+                kenniscategorie=question_data["categorie"],
+                introductie=question_data["introductie"],
+                vraag=question_data["vraag"],
+                antwoordopties=question_data["antwoordopties"],
+                juiste_antwoord=question_data["antwoord"],
+                uitleg=question_data["uitleg"],
+                llm_quiz_raw_output=json.dumps(question_data)
+            )
+            self.db_manager.save_llm_calls(quiz_question_uuid, llm_calls)
+
+        return {
+            "question": question_data,
+            "metadata": {
+                "quiz_question_uuid": quiz_question_uuid,
+                "medicine_name": med_name,
+                "atc7": med_info["atc7"],
+                "atc5": atc5,
+                "cluster_name": cluster_info["cluster_name"]
+            }
+        }
+
+    def _log_question_error(self, cluster_info: Dict[str, Any], med_name: str, error: Exception):
+        self.db_manager.log_process("error", med_name, '', f"Fout bij genereren vraag: {str(error)}")
+        self.question_generator.stats_manager.add_failed_medication(
+            med_name, 
+            cluster_info["cluster_name"], 
+            str(error)
+        )
+
 def main():
     try:
         # Debug mode instellen voor het hele proces
         debug_mode = True  # Zet op False om debug output uit te schakelen
-        pipeline = QuizGenerationPipeline(debug_mode=debug_mode)
+        if "--batch-api" in sys.argv:
+            # Nachtelijke run: geen invoer vragen, vragen via de batch API
+            pipeline = QuizGenerationPipeline(debug_mode=debug_mode, batch_mode=True, batch_backend=OpenAIBatchBackend())
+        else:
+            pipeline = QuizGenerationPipeline(debug_mode=debug_mode)
         pipeline.generate_quiz()
     except Exception as e:
         db_manager = DatabaseManager()
@@ -1,22 +1,20 @@
-from langchain.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from typing import Dict, Any, Tuple
-from OutputModels import Response, Evaluation
-import json
+from typing import Dict, Any, Optional, Tuple
+from OutputModels import Response
+from LLMBackend import LLMBackend, call_llm
+from GenerateQuestion import get_llm_backend
 
 #nog niet in gebruik, dit is een voorbeeld van de opzet.
 #AI gegenereerd, functies nog beoordelen en aanpassen.
 
 
 class QuestionEvaluator:
-    def __init__(self, model_name: str = "gpt-4o-mini"):
-        self.llm = ChatOpenAI(
-            model_name=model_name,
-            temperature=0.2
-        )
+    def __init__(self, model_name: str = "gpt-4o-mini", backend: Optional[LLMBackend] = None):
+        self.model_name = model_name
+        self.temperature = 0.2
+        self.backend = backend or get_llm_backend()  # Zelfde backend als GenerateQuestion
         self._setup_prompts()
 
-    def _setup_prompts()-> None:
+    def _setup_prompts(self) -> None:
         """Setup the evaluation prompts."""
         self.human_evaluation_prompt = """
         Evalueer deze quizvraag en geef feedback:
@@ -100,33 +98,33 @@ class QuestionEvaluator:
         antwoordopties = "\n".join([f"{chr(65+i)}) {opt}" for i, opt in enumerate(question.final_resolution.antwoordopties)])
         
         # Create the adjustment prompt
-        prompt = PromptTemplate(
-            input_variables=["introductie", "vraag", "antwoordopties", "antwoord", "uitleg", "feedback"],
-            template=self.ai_adjustment_prompt
-        )
-        
-        # Get AI response
-        response = self.llm.invoke(prompt.format(
+        prompt = self.ai_adjustment_prompt.format(
             introductie=question.final_resolution.introductie,
             vraag=question.final_resolution.vraag,
             antwoordopties=antwoordopties,
             antwoord=question.final_resolution.antwoord,
             uitleg=question.final_resolution.uitleg,
             feedback=feedback
-        ))
+        )
         
-        # Parse the response back into a Response object
-        # Note: This assumes the AI returns the response in the correct format
+        # Get AI response, parsed into the same format as the original question
         try:
-            adjusted = json.loads(response.content)
+            response = call_llm(
+                self.backend, "evaluatie",
+                model=self.model_name,
+                response_format=Response.FinalResolution,
+                temperature=self.temperature,
+                messages=[{"role": "user", "content": prompt}]
+            )
+            adjusted = response.choices[0].message.parsed
             return Response(
                 steps=question.steps,  # Keep the original steps
                 final_resolution={
-                    "introductie": adjusted["introductie"],
-                    "vraag": adjusted["vraag"],
-                    "antwoordopties": adjusted["antwoordopties"],
-                    "antwoord": adjusted["antwoord"],
-                    "uitleg": adjusted["uitleg"],
+                    "introductie": adjusted.introductie,
+                    "vraag": adjusted.vraag,
+                    "antwoordopties": adjusted.antwoordopties,
+                    "antwoord": adjusted.antwoord,
+                    "uitleg": adjusted.uitleg,
                     "verificatie": question.final_resolution.verificatie  # Keep the original verification
                 }
             )
@@ -1,15 +1,20 @@
 # %%
 from dotenv import load_dotenv
 import os
+import hashlib
+import threading
+import httpx
 import instructor
 import random
 import openai
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 from enum import Enum
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 from PromptQuizQuestion import QuizPrompts
-from GetMedicineInfo import get_medicine_info 
-from OutputModels import Response, Extraction
+from GetMedicineInfo import get_medicine_info, get_cache
+from OutputModels import Response, Extraction, FusedResponse, MultiResponse, LeanResponse, LeanFlagsResponse
+from LLMBackend import LLMBackend, OpenAIBackend, AsyncOpenAIBackend, call_llm
+from ResilientBackend import Resilience, ResilientBackend
 
 
 # get_medicine_info is verwijderd uit dit bestand. check of het afzonderlijke bestand goed gebruikt wordt.
@@ -26,6 +31,48 @@ max_retries wordt niet ondersteund in  response= client.beta.chat.completions.pa
 """
 
 MODEL = "gpt-4o-mini"  
+QUESTION_TEMPERATURE = 0.6  # Adjust the temperature for creativity
+EXTRACTION_TEMPERATURE = 0.3  # Lager voor minder creatieve, meer feitelijke antwoorden
+
+# Instellingen van de gedeelde OpenAI client
+OPENAI_TIMEOUT = 60  # Seconden voor het volledige antwoord
+OPENAI_CONNECT_TIMEOUT = 10  # Seconden voor het opzetten van de verbinding
+OPENAI_MAX_CONNECTIONS = 8  # Maximaal aantal gelijktijdige verbindingen (pool size)
+OPENAI_KEEPALIVE_EXPIRY = 60  # Seconden dat een ongebruikte verbinding open blijft
+
+# Extractie en quizvraag in één call (FusedResponse) in plaats van twee opeenvolgende calls
+FUSED_MODE = False
+
+# Schema van de quizvraag in de twee-staps generatie: "full" (Response: stappen en zelfcontrole in vrije
+# tekst), "lean" (alleen de vraagvelden) of "lean_flags" (vraagvelden plus drie ja/nee vlaggen).
+# Stappen en zelfcontrole worden niet opgeslagen, maar zijn het grootste deel van de completion tokens.
+OUTPUT_SCHEMA = "full"
+OUTPUT_SCHEMAS = {"full": Response, "lean": LeanResponse, "lean_flags": LeanFlagsResponse}
+
+# Stappen waarvan de prompt begint met static_prefix_messages(); alleen daarover gaat de prompt cache hit rate
+PREFIX_STAGES = ("generatie", "fused", "multi")
+
+# Aantal vragen per call in generate_quiz_questions (de vaste systeemprompt wordt maar één keer verstuurd)
+QUESTIONS_PER_CALL = 3
+
+# Sla extracties op in de cache database, zodat dezelfde tekst en categorie maar één keer worden geëxtraheerd
+USE_EXTRACTION_CACHE = True
+
+# Gebruik voor categorieën die één-op-één bij een sectie horen de sectie zelf als extractie, zonder LLM call
+USE_RULE_BASED_EXTRACTION = True
+
+_client: Optional[instructor.Instructor] = None
+_client_lock = threading.Lock()
+# Backend voor alle LLM calls; None: de OpenAI API via de gedeelde client
+_backend: Optional[LLMBackend] = None
+# Retries, backoff, circuit breaker en hedging rond elke call; gedeeld, zodat alle threads samen pauzeren
+_resilience = Resilience()
+# Tokengebruik van alle calls, inclusief het deel van de prompt dat de provider uit zijn cache haalde.
+# calls, prompt_tokens, cached_tokens en cache_hits tellen alleen de calls met de vaste prefix (PREFIX_STAGES),
+# zodat de hit rate over die calls gaat; de extractie heeft geen vaste prefix en telt apart mee.
+_usage_statistics = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_hits": 0,
+                     "unprefixed_calls": 0, "unprefixed_prompt_tokens": 0, "unprefixed_cached_tokens": 0}
+_usage_lock = threading.Lock()
 
 KNOWLEDGE_CATEGORIES = {
     "indicaties": 4,
@@ -41,54 +88,95 @@ KNOWLEDGE_CATEGORIES = {
     "bijzondere populaties (bijv. ouderen, obesen, kinderen, zwangeren, borstvoeding)": 1,
 }
 
+# Koppen van apotheek.nl secties die bij een kenniscategorie horen (kleine letters, deel van de kop).
+# Categorieën zonder koppeling krijgen de volledige pagina.
+CATEGORY_SECTION_KEYWORDS = {
+    "indicaties": ["waarbij gebruik ik het"],
+    "werkingsmechanisme": ["belangrijk om te weten", "waarbij gebruik ik het"],
+    "dosering": ["hoe gebruik ik", "dosis ben vergeten"],
+    "toediening": ["hoe gebruik ik", "dosis ben vergeten"],
+    "interacties": ["met andere medicijnen", "alcohol drinken"],
+    "bijwerkingen": ["bijwerkingen"],
+    "rijvaardigheid": ["autorijden"],
+    "stoppen met gebruik": ["stoppen"],
+    "bijzondere populaties (bijv. ouderen, obesen, kinderen, zwangeren, borstvoeding)": [
+        "zwanger", "nieren of lever", "overgewicht"
+    ],
+}
+
+# Categorieën waarvan de secties zelf al de relevante informatie zijn. Bij dosering en toediening
+# (dezelfde sectie) en werkingsmechanisme (een deel van een algemene sectie) moet het LLM kiezen.
+RULE_BASED_CATEGORIES = {
+    "indicaties",
+    "interacties",
+    "bijwerkingen",
+    "rijvaardigheid",
+    "stoppen met gebruik",
+    "bijzondere populaties (bijv. ouderen, obesen, kinderen, zwangeren, borstvoeding)",
+}
+# Langere secties worden wel door het LLM samengevat
+RULE_BASED_MAX_CHARS = 4000
+
 # Function to handle the complete question generation process
-def generate_quiz_question(medicine_name: str, medicine_info: str, debug_mode: bool = False) -> Response:
+def generate_quiz_question(medicine_name: str, medicine_info: str, debug_mode: bool = False,
+                           sections: Optional[List[Tuple[Optional[str], Optional[str]]]] = None,
+                           fused: Optional[bool] = None, schema: Optional[str] = None,
+                           category: Optional[str] = None, relevant_info: Optional[Extraction] = None) -> Response:
     """
     Handles the complete process of generating a quiz question:
-    1. Gets a random category
-    2. Extracts relevant information
-    3. Generates the quiz question
+    1. Gets a random category (unless given)
+    2. Extracts relevant information (unless given, see prepare_relevant_info)
+    3. Generates the quiz question (2 and 3 in one call in fused mode)
     
     Args:
         medicine_name: Name of the medicine
         medicine_info: Complete medicine information
         debug_mode: Whether to print debug information
+        sections: Optional (heading, content) sections of the page; when given, only the
+            sections that belong to the chosen category are sent to the extraction call
+        fused: Extract and generate in one call (default: FUSED_MODE)
+        schema: Output schema of the question call, see OUTPUT_SCHEMAS (default: OUTPUT_SCHEMA);
+            fused mode always uses the full schema
+        category: Knowledge category to use instead of a random one
+        relevant_info: Information extracted beforehand for this category; skips the extraction
+            (ignored in fused mode)
         
     Returns:
         Response: The generated question with all its components
     """
     try:
-        # Initialize client
-        client = initialize_openai_client()
+        # Shared backend; by default one OpenAI client, so the connection is reused between questions
+        backend = get_llm_backend()
         
         # Get random category
-        random_category = get_random_knowledge_category()
+        random_category = category or get_random_knowledge_category()
         if debug_mode:
             print(f"\nGekozen kenniscategorie: {random_category}")
             
-        # Extract relevant information
-        relevant_info = extract_relevant_info(client, medicine_info, random_category)
-        if debug_mode:
-            print("\nRelevante informatie:")
-            print(relevant_info)
-            
-        # Generate query
-        query = f"De vraag moet gaan over {medicine_name} en betrekking hebben op de categorie: {random_category}"
-        if debug_mode:
-            print(f"\nQuery: {query}")
-            
-        # Generate question using the same client
-        response = client.beta.chat.completions.parse(
-            model=MODEL, 
-            response_format=Response,
-            temperature=0.6,  # Adjust the temperature for creativity
-            messages=[
-                {"role": "system", "content": QuizPrompts.STYLE},
-                {"role": "system", "content": f"{QuizPrompts.ROLE}\nGebruik uitsluitend de volgende informatie: {relevant_info}."},
-                {"role": "system", "content": QuizPrompts.INSTRUCTIONS},
-                {"role": "user", "content": query}
-            ],  
-        )                  
+        # Use only the sections of the page that belong to the category, if known
+        category_info = select_sections(sections, random_category) if sections else None
+        if debug_mode and category_info:
+            print(f"\nSecties voor '{random_category}': {len(category_info)} van {len(str(medicine_info))} tekens")
+
+        if FUSED_MODE if fused is None else fused:
+            # One call: the model selects the relevant information and writes the question
+            response = call_llm(
+                backend, "fused", category=random_category,
+                model=MODEL,
+                response_format=FusedResponse,
+                temperature=QUESTION_TEMPERATURE,
+                messages=build_fused_messages(medicine_name, random_category, category_info or medicine_info),
+            )
+            record_usage(response, "fused")
+            if debug_mode:
+                print("\nRelevante informatie:")
+                print(response.choices[0].message.parsed.relevant_information)
+        else:
+            if relevant_info is None and sections:
+                relevant_info = extract_by_rules(sections, random_category)
+            response = generate_question_two_step(backend, medicine_name, random_category,
+                                                  category_info or medicine_info, debug_mode, relevant_info,
+                                                  question_response_format(schema))
 
         if debug_mode:
             parsed = response.choices[0].message.parsed.final_resolution
@@ -113,8 +201,105 @@ def generate_quiz_question(medicine_name: str, medicine_info: str, debug_mode: b
         raise RuntimeError(f"Failed to generate complete quiz question: {e}")
 
 
+def generate_quiz_questions(medicine_name: str, medicine_info: str, num_questions: int = QUESTIONS_PER_CALL,
+                            categories: Optional[List[str]] = None, debug_mode: bool = False,
+                            sections: Optional[List[Tuple[Optional[str], Optional[str]]]] = None
+                            ) -> List[Tuple[str, Response.FinalResolution]]:
+    """
+    Generate several quiz questions in a single call, so the large static prompt is sent once.
+
+    Args:
+        medicine_name: Name of the medicine
+        medicine_info: Complete medicine information
+        num_questions: Number of questions, each for a different random category
+        categories: Categories to use instead (repeat a category for several variants)
+        debug_mode: Whether to print debug information
+        sections: Optional (heading, content) sections of the page; when every category has
+            matching sections, only those are sent
+
+    Returns:
+        (category, question) pairs in the requested order; questions the model left out are missing
+    """
+    try:
+        backend = get_llm_backend()
+        categories = categories or get_random_knowledge_categories(num_questions)
+        if debug_mode:
+            print(f"\nGekozen kenniscategorieën: {', '.join(categories)}")
+
+        response = call_llm(
+            backend, "multi", category="; ".join(dict.fromkeys(categories)),
+            model=MODEL,
+            response_format=MultiResponse,
+            temperature=QUESTION_TEMPERATURE,
+            messages=build_multi_question_messages(medicine_name, categories,
+                                                   combine_sections(sections, categories) or medicine_info),
+        )
+        record_usage(response, "multi")
+        questions = response.choices[0].message.parsed.questions
+        if debug_mode:
+            print(f"\n{len(questions)} van {len(categories)} vragen gegenereerd")
+        # De volgorde bepaalt de categorie; extra vragen worden genegeerd
+        return [(category, question.final_resolution) for category, question in zip(categories, questions)]
+
+    except Exception as e:
+        if debug_mode:
+            print(f"\nError details: {type(e)}: {e}")
+        raise RuntimeError(f"Failed to generate quiz questions: {e}")
+
+
+def generate_question_two_step(backend: LLMBackend, medicine_name: str, category: str,
+                               medicine_info: str, debug_mode: bool = False,
+                               relevant_info: Optional[Extraction] = None, response_format: type = Response):
+    """Extract the relevant information first (unless given), then generate the question from it."""
+    # Extract relevant information
+    if relevant_info is None:
+        relevant_info = extract_relevant_info(backend, medicine_info, category, medicine_name)
+    if debug_mode:
+        print("\nRelevante informatie:")
+        print(relevant_info)
+        
+    # Generate query
+    messages = build_question_messages(medicine_name, category, relevant_info)
+    if debug_mode:
+        print(f"\nQuery: {messages[-1]['content']}")
+        
+    # Generate question using the same backend
+    response = call_llm(
+        backend, "generatie", category=category,
+        model=MODEL, 
+        response_format=response_format,
+        temperature=QUESTION_TEMPERATURE,
+        messages=messages,
+    )
+    record_usage(response, "generatie")
+    return response
+
+
+def prepare_relevant_info(medicine_name: str, medicine_info: str, category: str,
+                          sections: Optional[List[Tuple[Optional[str], Optional[str]]]] = None) -> Extraction:
+    """
+    Step 2 of generate_quiz_question on its own: the relevant information for the category, from
+    the page sections (rule-based), the extraction cache or an extraction call, in that order.
+    Pass the result to generate_quiz_question as relevant_info.
+    """
+    relevant_info = extract_by_rules(sections, category) if sections else None
+    if relevant_info is None:
+        category_info = select_sections(sections, category) if sections else None
+        relevant_info = extract_relevant_info(get_llm_backend(), category_info or medicine_info, category, medicine_name)
+    return relevant_info
+
+
+def question_response_format(schema: Optional[str] = None) -> type:
+    """Het response_format voor de quizvraag bij `schema` (standaard OUTPUT_SCHEMA)."""
+    schema = schema or OUTPUT_SCHEMA
+    if schema not in OUTPUT_SCHEMAS:
+        raise ValueError(f"Onbekend output schema '{schema}', kies uit {', '.join(OUTPUT_SCHEMAS)}")
+    return OUTPUT_SCHEMAS[schema]
+
+
 # Define the initialize_openai_client function
 def initialize_openai_client() -> instructor.Instructor:
+    """Build a new client with its own connection pool. Use get_openai_client() to share one client."""
     # Load environment variables from the .env file
     load_dotenv()
 
@@ -124,7 +309,115 @@ def initialize_openai_client() -> instructor.Instructor:
     if not openai_api_key:
         raise ValueError("OpenAI API key not found. Please set it in the .env file.")
 
-    return instructor.from_openai(OpenAI())
+    http_client = httpx.Client(
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+        )
+    )
+    # Geen retries in de SDK: die doet de Resilience laag van get_llm_backend()
+    return instructor.from_openai(OpenAI(http_client=http_client, max_retries=0))
+
+
+def record_usage(response: Any, stage: str):
+    """Tel het tokengebruik van een response van stap `stage`, inclusief prompt_tokens_details.cached_tokens."""
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    if not isinstance(prompt_tokens, int):  # Geen usage in de response
+        return
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    cached = cached if isinstance(cached, int) else 0
+    with _usage_lock:
+        if stage not in PREFIX_STAGES:
+            _usage_statistics["unprefixed_calls"] += 1
+            _usage_statistics["unprefixed_prompt_tokens"] += prompt_tokens
+            _usage_statistics["unprefixed_cached_tokens"] += cached
+            return
+        _usage_statistics["calls"] += 1
+        _usage_statistics["prompt_tokens"] += prompt_tokens
+        _usage_statistics["cached_tokens"] += cached
+        _usage_statistics["cache_hits"] += 1 if cached else 0
+
+
+def get_usage_statistics() -> Dict[str, int]:
+    """Tellers van het tokengebruik (calls, prompt_tokens, cached_tokens, cache_hits en unprefixed_*)."""
+    with _usage_lock:
+        return dict(_usage_statistics)
+
+
+def get_openai_client() -> instructor.Instructor:
+    """Return the shared client (created on first use); safe to use from multiple threads."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = initialize_openai_client()
+        return _client
+
+
+def set_llm_backend(backend: Optional[LLMBackend]):
+    """Gebruik een andere backend voor alle LLM calls (bijv. FakeLLMBackend); None: terug naar de OpenAI API."""
+    global _backend
+    _backend = backend
+
+
+def get_llm_backend() -> LLMBackend:
+    """De ingestelde backend, of de OpenAI API via de gedeelde client, met retries en circuit breaker."""
+    backend = _backend or OpenAIBackend(get_openai_client())
+    if isinstance(backend, ResilientBackend):
+        return backend
+    return ResilientBackend(backend, _resilience)
+
+
+def get_async_llm_backend(client: Optional[AsyncOpenAI] = None) -> Optional[LLMBackend]:
+    """
+    Backend voor de AsyncQuestionEngine, met dezelfde gedeelde retries, circuit breaker en tellers:
+    een AsyncOpenAIBackend rond client, anders de ingestelde backend; None als er geen van beide is.
+    """
+    backend = AsyncOpenAIBackend(client) if client is not None else _backend
+    if backend is None or isinstance(backend, ResilientBackend):
+        return backend
+    return ResilientBackend(backend, _resilience)
+
+
+def set_resilience(resilience: Optional[Resilience] = None):
+    """Vervang het retry-beleid, de circuit breaker en de tellers; None: de standaardinstellingen."""
+    global _resilience
+    _resilience.close()
+    _resilience = resilience or Resilience()
+
+
+def get_resilience_statistics() -> Dict[str, float]:
+    """Tellers van retries, rate limits, fouten, de circuit breaker en hedging."""
+    return _resilience.get_statistics()
+
+
+def initialize_async_openai_client(max_connections: int = OPENAI_MAX_CONNECTIONS) -> AsyncOpenAI:
+    """Build an async client with the same keep-alive and timeouts, for use within one event loop."""
+    load_dotenv()
+    if not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("OpenAI API key not found. Please set it in the .env file.")
+
+    http_client = httpx.AsyncClient(
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+        )
+    )
+    # Geen retries in de SDK: die doet de Resilience laag van get_async_llm_backend()
+    return AsyncOpenAI(http_client=http_client, max_retries=0)
+
+
+def close_openai_client():
+    """Close the shared client and its connections; the next call to get_openai_client() builds a new one."""
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.client.close()
+            _client = None
 
 
 # Function to get a random knowledge category
@@ -134,25 +427,181 @@ def get_random_knowledge_category() -> str:
     return random.choices(categories, weights=weights, k=1)[0]
 
 
-# Functie om relevante informatie te extraheren met een LLM
-def extract_relevant_info(client: openai, medicine_info: str, random_category: str) -> str:
+def get_random_knowledge_categories(count: int) -> List[str]:
+    """Kies `count` verschillende categorieën, gewogen zoals get_random_knowledge_category."""
+    available = dict(KNOWLEDGE_CATEGORIES)
+    chosen = []
+    for _ in range(min(count, len(available))):
+        category = random.choices(list(available), weights=list(available.values()), k=1)[0]
+        chosen.append(category)
+        del available[category]
+    return chosen
+
+
+def group_sections(sections: List[Tuple[Optional[str], Optional[str]]]) -> List[Tuple[str, List[Tuple[Optional[str], Optional[str]]]]]:
+    """
+    Groepeer secties onder hun hoofdkop.
+
+    Hoofdkoppen op apotheek.nl zijn vragen ('Wat zijn mogelijke bijwerkingen?') of beginnen met
+    'Belangrijk om te weten'; tussenkoppen zoals 'Hoge bloeddruk' of 'Uitleg frequenties' horen bij
+    de hoofdkop erboven.
+    """
+    groups = []
+    for heading, content in sections:
+        is_main_heading = heading is not None and (heading.endswith("?") or heading.startswith("Belangrijk om te weten"))
+        if is_main_heading or not groups:
+            groups.append((heading or "", []))
+        groups[-1][1].append((heading, content))
+    return groups
+
+
+def select_sections(sections: List[Tuple[Optional[str], Optional[str]]], category: str) -> Optional[str]:
+    """
+    Geef de tekst van de secties die bij een kenniscategorie horen.
+
+    Returns:
+        De samengevoegde secties, of None als de categorie geen koppeling heeft of niets matcht
+    """
+    keywords = CATEGORY_SECTION_KEYWORDS.get(category)
+    if not keywords:
+        return None
+    selected = [
+        part
+        for main_heading, group in group_sections(sections)
+        if any(keyword in main_heading.lower() for keyword in keywords)
+        for section in group
+        for part in section if part is not None
+    ]
+    return "\n\n".join(selected) or None
+
+
+def combine_sections(sections: Optional[List[Tuple[Optional[str], Optional[str]]]],
+                     categories: List[str]) -> Optional[str]:
+    """De secties van alle categorieën samen, of None als een categorie geen passende secties heeft."""
+    if not sections:
+        return None
+    selected = [select_sections(sections, category) for category in dict.fromkeys(categories)]
+    if not all(selected):
+        return None
+    return "\n\n".join(dict.fromkeys(selected))
+
+
+def extract_by_rules(sections: List[Tuple[Optional[str], Optional[str]]], category: str) -> Optional[Extraction]:
+    """
+    Extractie zonder LLM: de secties van de categorie, als die één-op-één bij de categorie horen.
+
+    Returns:
+        De secties als Extraction, of None als het LLM moet extraheren (geen vaste koppeling,
+        geen passende secties of meer dan RULE_BASED_MAX_CHARS tekens)
+    """
+    if not USE_RULE_BASED_EXTRACTION or category not in RULE_BASED_CATEGORIES:
+        return None
+    selected = select_sections(sections, category)
+    if not selected or len(selected) > RULE_BASED_MAX_CHARS:
+        return None
+    return Extraction(relevant_information=selected)
+
+
+def extraction_source_text(medicine_info: Any) -> str:
+    """
+    De paginatekst waar een extractie van afhangt. De pipeline geeft een dict door die bij elk ophalen
+    opnieuw wordt gemaakt (met de ophaaldatum); alleen relevant_information daaruit is de pagina.
+    """
+    if isinstance(medicine_info, dict) and "relevant_information" in medicine_info:
+        return str(medicine_info["relevant_information"])
+    return str(medicine_info)
+
+
+def extraction_cache_key(medicine_info: Any, category: str) -> str:
+    """Sleutel van een extractie: hash van paginatekst, categorie, versie van de extractieprompt en model."""
+    key = "\n".join([extraction_source_text(medicine_info), category, str(QuizPrompts.EXTRACTION_PROMPT_VERSION), MODEL])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def load_cached_extraction(medicine_info: str, category: str, medicine_name: Optional[str]) -> Optional[Extraction]:
+    """Eerder geëxtraheerde informatie voor dezelfde tekst en categorie, of None."""
+    if not USE_EXTRACTION_CACHE or medicine_name is None:
+        return None
+    cached = get_cache().get_extraction(extraction_cache_key(medicine_info, category))
+    return Extraction(relevant_information=cached) if cached is not None else None
+
+
+def save_extraction(medicine_info: str, category: str, medicine_name: Optional[str], extraction: Extraction):
+    """Sla een extractie op; zonder medicijnnaam kan de extractie niet worden ongeldig gemaakt en wordt ze niet bewaard."""
+    if not USE_EXTRACTION_CACHE or medicine_name is None:
+        return
+    get_cache().put_extraction(extraction_cache_key(medicine_info, category), medicine_name, category,
+                               QuizPrompts.EXTRACTION_PROMPT_VERSION, MODEL, extraction.relevant_information)
+
+
+def build_extraction_messages(medicine_info: str, category: str) -> List[dict]:
     # Use the extraction prompt from QuizPrompts
-    prompt = QuizPrompts.get_extraction_prompt(medicine_info, random_category)
-    
+    return [{"role": "user", "content": QuizPrompts.get_extraction_prompt(medicine_info, category)}]
+
+
+def static_prefix_messages() -> List[dict]:
+    """
+    De vaste systeemberichten, voor elke vraag byte-identiek en altijd vooraan.
+
+    De provider cachet het begin van een prompt (vanaf 1024 tokens); zolang alle variabele
+    informatie erna komt, wordt dit deel bij elke volgende vraag uit de cache gehaald.
+    """
+    return [
+        {"role": "system", "content": QuizPrompts.STYLE},
+        {"role": "system", "content": QuizPrompts.ROLE},
+        {"role": "system", "content": QuizPrompts.INSTRUCTIONS},
+    ]
+
+
+def build_question_messages(medicine_name: str, category: str, relevant_info: Extraction) -> List[dict]:
+    query = f"De vraag moet gaan over {medicine_name} en betrekking hebben op de categorie: {category}"
+    return static_prefix_messages() + [
+        {"role": "system", "content": f"Gebruik uitsluitend de volgende informatie: {relevant_info}."},
+        {"role": "user", "content": query}
+    ]
+
+
+def build_multi_question_messages(medicine_name: str, categories: List[str], medicine_info: str) -> List[dict]:
+    return static_prefix_messages() + [
+        {"role": "system", "content": f"Gebruik uitsluitend de volgende informatie: {medicine_info}."},
+        {"role": "user", "content": QuizPrompts.get_multi_question_query(medicine_name, categories)}
+    ]
+
+
+def build_fused_messages(medicine_name: str, category: str, medicine_info: str) -> List[dict]:
+    query = f"De vraag moet gaan over {medicine_name} en betrekking hebben op de categorie: {category}"
+    return static_prefix_messages() + [
+        {"role": "system", "content": QuizPrompts.get_fused_prompt(medicine_info, category)},
+        {"role": "user", "content": query}
+    ]
+
+
+# Functie om relevante informatie te extraheren met een LLM
+def extract_relevant_info(backend: LLMBackend, medicine_info: str, random_category: str,
+                          medicine_name: Optional[str] = None) -> Extraction:
+    # Eerder geëxtraheerd voor dezelfde tekst en categorie: geen LLM call nodig
+    cached = load_cached_extraction(medicine_info, random_category, medicine_name)
+    if cached is not None:
+        return cached
+
     # Maak een chat completion request
-    response = client.beta.chat.completions.parse(
+    response = call_llm(
+        backend, "extractie", category=random_category,
         model=MODEL,
         response_format=Extraction,
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.3  # Pas de temperatuur naar beneden aan voor minder creatieve, meer feitelijke antwoorden
+        messages=build_extraction_messages(medicine_info, random_category),
+        temperature=EXTRACTION_TEMPERATURE
     )
+    record_usage(response, "extractie")
     
     # Controleer of de respons een 'choices'-attribuut bevat
     if not hasattr(response, "choices"):
         raise RuntimeError("De respons bevat geen 'choices'-attribuut. Controleer de API-aanroep.")
     
     # Retourneer de inhoud van de eerste keuze
-    return response.choices[0].message.parsed
+    extraction = response.choices[0].message.parsed
+    save_extraction(medicine_info, random_category, medicine_name, extraction)
+    return extraction
 
 # Main-functie
 if __name__ == "__main__":
@@ -1,11 +1,17 @@
 import json
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import requests
-from bs4 import BeautifulSoup
-from typing import Optional, Dict, Any
+from requests.adapters import HTTPAdapter
+from bs4 import BeautifulSoup, SoupStrainer
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 import re
 from urllib.parse import urlparse, unquote
+from MedicineCache import MedicineCache, LRUCache
 
 # script aanpassen naar eerdere versie:         elif user_choice == "ja":
 # nu ontstaat er een oneindige loop als niet de juiste url wordt ingevoerd.
@@ -16,18 +22,131 @@ This code fetches medication information from a website and caches it for future
 
 Set the CACHE_EXPIRATION_DAYS variable to determine when the cached information is still recent enough. 
 
+The cache is stored in a SQLite database (CACHE_DB). The old JSON cache (CACHE_FILE) is migrated once on first use.
+
 """
 
 # Constants
+BASE_URL = "https://www.apotheek.nl/medicijnen/"
 CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "MedicineInformation.json")
+CACHE_DB = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "MedicineInformation.db")
 CACHE_EXPIRATION_DAYS = 30
+STALE_WHILE_REVALIDATE = False   # Geef verlopen informatie direct terug en ververs op de achtergrond
+MAX_STALENESS_DAYS = 60          # Ouder dan dit wordt altijd eerst (blokkerend) ververst
+LIST_ITEM_CLASS = "listItemContent_container__25F5W"
+CONTENT_CLASS = "listItemContent_content__w3Hqp"
+MEMORY_CACHE_SIZE = 256           # Maximaal aantal medicijnen in het geheugen
+MEMORY_CACHE_TTL_SECONDS = 300    # Maximale leeftijd van een entry in het geheugen
+REQUEST_TIMEOUT = 15             # Timeout per request in seconden
+MAX_CONNECTIONS_PER_HOST = 4     # Maximaal aantal gelijktijdige requests per host
+MIN_REQUEST_INTERVAL = 0.25      # Minimale tijd tussen twee requests naar dezelfde host (seconden)
 DEBUG_MODE = False  # Set to True to enable debug prints
 
-# Ensure data directory and cache file exist
-os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
-if not os.path.exists(CACHE_FILE):
-    with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-        json.dump({}, f)
+_cache: Optional[MedicineCache] = None
+_memory_cache = LRUCache(MEMORY_CACHE_SIZE, MEMORY_CACHE_TTL_SECONDS)
+
+def get_cache() -> MedicineCache:
+    """Geef de cache terug; de database wordt bij het eerste gebruik aangemaakt."""
+    global _cache
+    if _cache is None:
+        _cache = MedicineCache(CACHE_DB, CACHE_FILE)
+    return _cache
+
+def set_cache_path(db_path: str, json_path: Optional[str] = None):
+    """Gebruik een andere cache database (bijvoorbeeld in tests of benchmarks)."""
+    global _cache
+    if _cache is not None:
+        _cache.close()
+    _cache = MedicineCache(db_path, json_path)
+    _memory_cache.clear()
+    _memory_cache.set_source_mtime(None)
+
+def get_cache_statistics() -> Dict[str, int]:
+    """Tellers van de in-memory cache (hits, misses, evictions, invalidations, size)."""
+    return _memory_cache.get_statistics()
+
+class HostRateLimiter:
+    """Begrenst het aantal gelijktijdige requests en het tempo van requests per host."""
+    def __init__(self, max_concurrent: int = MAX_CONNECTIONS_PER_HOST, min_interval: float = MIN_REQUEST_INTERVAL):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self._semaphores = {}
+        self._next_request_time = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, url: str):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.max_concurrent))
+        with semaphore:
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_request_time.get(host, now))
+                self._next_request_time[host] = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+_rate_limiter = HostRateLimiter()
+
+def get_session() -> requests.Session:
+    """Geef de gedeelde HTTP sessie terug, zodat TCP/TLS verbindingen worden hergebruikt."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_CONNECTIONS_PER_HOST, pool_maxsize=MAX_CONNECTIONS_PER_HOST)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def fetch_page(url: str, headers: Optional[Dict[str, str]] = None) -> requests.Response:
+    """Haal een pagina op via de gedeelde sessie, met timeout en rate limiting per host."""
+    with _rate_limiter.limit(url):
+        return get_session().get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+
+def conditional_headers(cached_data: Dict[str, Any]) -> Dict[str, str]:
+    """Headers om een cache entry te revalideren (If-None-Match / If-Modified-Since)."""
+    headers = {}
+    if cached_data.get("etag"):
+        headers["If-None-Match"] = cached_data["etag"]
+    if cached_data.get("last_modified"):
+        headers["If-Modified-Since"] = cached_data["last_modified"]
+    return headers
+
+def cache_validators(response: requests.Response) -> Dict[str, Optional[str]]:
+    """ETag en Last-Modified van een response, om op te slaan bij de cache entry."""
+    return {"etag": response.headers.get("ETag"), "last_modified": response.headers.get("Last-Modified")}
+
+_refresh_executor: Optional[ThreadPoolExecutor] = None
+_refresh_futures = {}  # medicine_name -> Future van een lopende achtergrond-verversing
+_refresh_lock = threading.Lock()
+
+def schedule_background_refresh(medicine_name: str, cached_data: Dict[str, Any], atc_cluster: str):
+    """Ververs een verlopen cache entry op een worker thread (maximaal één verversing per medicijn)."""
+    global _refresh_executor
+    with _refresh_lock:
+        if medicine_name in _refresh_futures:
+            return
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-refresh")
+        future = _refresh_executor.submit(revalidate_cached_entry, medicine_name, cached_data, atc_cluster)
+        _refresh_futures[medicine_name] = future
+    future.add_done_callback(lambda _: _finish_background_refresh(medicine_name))
+
+def _finish_background_refresh(medicine_name: str):
+    with _refresh_lock:
+        _refresh_futures.pop(medicine_name, None)
+
+def wait_for_background_refreshes(timeout: Optional[float] = None):
+    """Wacht tot alle lopende achtergrond-verversingen klaar zijn."""
+    with _refresh_lock:
+        futures = list(_refresh_futures.values())
+    for future in futures:
+        future.result(timeout=timeout)
 
 def debug_print(*args, **kwargs):
     """Print alleen als debug mode aan staat."""
@@ -35,12 +154,26 @@ def debug_print(*args, **kwargs):
         print(*args, **kwargs)
 
 #Hoofdfunctie
-def get_medicine_info(medicine_name: str, atc_cluster: str, brand_name: str = None, debug_mode: bool = None) -> str:
-    """Haal informatie op over een medicijn van apotheek.nl."""
+def get_medicine_info(medicine_name: str, atc_cluster: str, brand_name: str = None, debug_mode: bool = None,
+                      interactive: bool = True, stale_while_revalidate: bool = None) -> str:
+    """
+    Haal informatie op over een medicijn van apotheek.nl.
+
+    Met interactive=False (batch mode) wordt niet om een alternatieve URL gevraagd als de cache-URL
+    en de standaard URL niet werken; het medicijn wordt dan in de URL-wachtrij gezet en overgeslagen.
+    De wachtrij wordt later afgehandeld met tools/ResolveUrlQueue.py.
+
+    Met stale_while_revalidate=True (standaard: STALE_WHILE_REVALIDATE) wordt verlopen informatie
+    die niet ouder is dan MAX_STALENESS_DAYS direct teruggegeven, en op de achtergrond ververst.
+    """
     global DEBUG_MODE
     if debug_mode is not None:
         DEBUG_MODE = debug_mode
+    if stale_while_revalidate is None:
+        stale_while_revalidate = STALE_WHILE_REVALIDATE
     
+    cached_data = None
+    attempted_urls = []
     cache_checked = False 
     cache_url_attempted = False  
     base_url_attempted = False  
@@ -57,9 +190,13 @@ def get_medicine_info(medicine_name: str, atc_cluster: str, brand_name: str = No
                 if cached_data:
                     # Controleer de leeftijd van de cache
                     cache_date = datetime.strptime(cached_data["date"], "%Y-%m-%d %H:%M:%S")
-                    if datetime.now() - cache_date > timedelta(days=CACHE_EXPIRATION_DAYS):
+                    cache_age = datetime.now() - cache_date
+                    if cache_age > timedelta(days=CACHE_EXPIRATION_DAYS):
+                        if stale_while_revalidate and cache_age <= timedelta(days=MAX_STALENESS_DAYS):
+                            debug_print(f"De opgeslagen informatie over '{medicine_name}' is verlopen en wordt op de achtergrond ververst.")
+                            schedule_background_refresh(medicine_name, cached_data, atc_cluster)
+                            return cached_data["info"]
                         debug_print(f"De opgeslagen informatie over '{medicine_name}' is ouder dan {CACHE_EXPIRATION_DAYS} dagen. Nieuwe informatie wordt opgehaald.")
-                        cached_data = None  # Forceer nieuwe informatie
                     else:
                         # Gebruik de cache als deze actueel is
                         url = cached_data["url"].strip()
@@ -71,41 +208,39 @@ def get_medicine_info(medicine_name: str, atc_cluster: str, brand_name: str = No
 
             # Als we hier komen, moeten we nieuwe informatie ophalen
             if not cache_url_attempted:
-                # Probeer eerst de URL uit de cache
-                cached_data = load_from_cache(medicine_name)
+                # Probeer eerst de URL uit de (verlopen) cache entry
                 if cached_data:
-                    url = cached_data["url"].strip()
-                    debug_print(f"\nProberen informatie op te halen van: {url}")
-                    response = requests.get(url)
-                    if response.status_code == 200 and "Belangrijk om te weten" in response.text:
-                        medicine_info = parse_medicine_page(response.text)
-                        save_to_cache(medicine_name, url, medicine_info, atc_cluster)
+                    attempted_urls.append(cached_data["url"].strip())
+                    medicine_info = revalidate_cached_entry(medicine_name, cached_data, atc_cluster)
+                    if medicine_info:
                         return medicine_info
-                    else:
-                        print(f"\nDe URL uit de cache werkt niet meer of bevat niet de juiste informatie voor '{medicine_name}'.")
+                    print(f"\nDe URL uit de cache werkt niet meer of bevat niet de juiste informatie voor '{medicine_name}'.")
                 cache_url_attempted = True
 
             # Als de cache-URL niet werkt, probeer de standaard URL
             if not base_url_attempted:
-                base_url = f"https://www.apotheek.nl/medicijnen/{medicine_name.lower()}"
+                base_url = f"{BASE_URL}{medicine_name.lower()}"
                 debug_print(f"\nProberen informatie op te halen van: {base_url}")
-                response = requests.get(base_url)
+                attempted_urls.append(base_url)
+                response = fetch_page(base_url)
                 if response.status_code == 200 and "Belangrijk om te weten" in response.text:
-                    medicine_info = parse_medicine_page(response.text)
-                    save_to_cache(medicine_name, base_url, medicine_info, atc_cluster)
+                    medicine_info = store_page(medicine_name, base_url, response, atc_cluster)
                     return medicine_info
                 else:
                     print("\nDe standaard URL werkt niet of bevat niet de juiste informatie.")
                 base_url_attempted = True
 
             # Als beide URLs niet werken, vraag om een alternatieve URL
+            if not interactive:
+                debug_print(f"\nGeen werkende URL voor '{medicine_name}', medicijn in de URL-wachtrij gezet en overgeslagen.")
+                get_cache().enqueue_resolution(medicine_name, brand_name, atc_cluster, attempted_urls)
+                return "Geen informatie beschikbaar"
             new_url = ask_for_alternative_url(medicine_name, atc_cluster, brand_name)
             if not new_url:
                 return "Geen informatie beschikbaar"
-            response = requests.get(new_url)
+            response = fetch_page(new_url)
             if response.status_code == 200 and "Belangrijk om te weten" in response.text:
-                medicine_info = parse_medicine_page(response.text)
-                save_to_cache(medicine_name, new_url, medicine_info, atc_cluster)
+                medicine_info = store_page(medicine_name, new_url, response, atc_cluster)
                 return medicine_info
             else:
                 print(f"\nDe opgegeven URL werkt niet of bevat niet de juiste informatie voor '{medicine_name}'.")
@@ -113,13 +248,69 @@ def get_medicine_info(medicine_name: str, atc_cluster: str, brand_name: str = No
 
         except Exception as e:
             debug_print(f"Fout bij ophalen informatie: {str(e)}")
+            if not interactive:
+                try:
+                    get_cache().enqueue_resolution(medicine_name, brand_name, atc_cluster, attempted_urls)
+                except Exception as queue_error:
+                    debug_print(f"Fout bij opslaan in URL-wachtrij: {str(queue_error)}")
             return "Geen informatie beschikbaar"
 
+def get_medicine_info_many(medicines: List[Tuple[str, str, Optional[str]]],
+                           max_workers: int = MAX_CONNECTIONS_PER_HOST) -> Iterator[Tuple[str, str]]:
+    """
+    Haal informatie op voor meerdere medicijnen tegelijk.
+
+    Args:
+        medicines: Lijst van (medicine_name, atc_cluster, brand_name)
+        max_workers: Aantal gelijktijdige workers
+
+    Yields:
+        (medicine_name, info) zodra de informatie van een medicijn binnen is
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(get_medicine_info, name, cluster, brand, interactive=False): name
+            for name, cluster, brand in medicines
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
 #Helperfuncties     
+def revalidate_cached_entry(medicine_name: str, cached_data: Dict[str, Any], atc_cluster: str) -> Optional[str]:
+    """
+    Haal de URL uit een (verlopen) cache entry opnieuw op, met een conditional request.
+
+    Returns:
+        De actuele informatie, of None als de URL niet (meer) werkt
+    """
+    url = cached_data["url"].strip()
+    debug_print(f"\nProberen informatie op te halen van: {url}")
+    try:
+        response = fetch_page(url, headers=conditional_headers(cached_data))
+    except requests.RequestException as e:
+        debug_print(f"Fout bij ophalen van {url}: {str(e)}")
+        return None
+    if response.status_code == 304:
+        # Pagina is niet gewijzigd: alleen de datum bijwerken, niet opnieuw parsen
+        debug_print(f"De pagina over '{medicine_name}' is niet gewijzigd, de cache is gerevalideerd.")
+        refresh_cache_date(medicine_name)
+        return cached_data["info"]
+    if response.status_code == 200 and "Belangrijk om te weten" in response.text:
+        medicine_info = store_page(medicine_name, url, response, atc_cluster)
+        return medicine_info
+    return None
+
+
+def store_page(medicine_name: str, url: str, response: requests.Response, atc_cluster: str) -> str:
+    """Parse een opgehaalde pagina, sla tekst, secties en HTTP validators op in de cache en geef de tekst terug."""
+    sections = parse_medicine_sections(response.text)
+    medicine_info = sections_to_text(sections)
+    save_to_cache(medicine_name, url, medicine_info, atc_cluster, sections=sections, **cache_validators(response))
+    return medicine_info
+
 def process_response(response: requests.Response, medicine_name: str, url: str, atc_cluster: str) -> Optional[str]:
     if response.status_code == 200 and "Belangrijk om te weten" in response.text:
-        medicine_info = parse_medicine_page(response.text)
-        save_to_cache(medicine_name, url, medicine_info, atc_cluster)
+        medicine_info = store_page(medicine_name, url, response, atc_cluster)
         return medicine_info
     else:
         debug_print("\n\nEr is een fout opgetreden: De tekst op de pagina begint niet met 'Belangrijk om te weten' of de URL werkt niet.")
@@ -143,7 +334,7 @@ def ask_for_alternative_url(medicine_name: str, atc_cluster: str, brand_name: st
             
             # Controleer of de URL geldig is
             try:
-                response = requests.get(url)
+                response = fetch_page(url)
                 if response.status_code == 200 and "Belangrijk om te weten" in response.text:
                     return url
                 else:
@@ -155,60 +346,114 @@ def ask_for_alternative_url(medicine_name: str, atc_cluster: str, brand_name: st
         else:
             print("Ongeldige invoer. Typ 'ja' of 'nee'.")
 
-def parse_medicine_page(html: str) -> str:
-    """Parse de HTML van de medicijnpagina en extraheer de relevante informatie."""
-    soup = BeautifulSoup(html, "html.parser")
-    list_items = soup.find_all("li", class_="listItemContent_container__25F5W")
+def _has_list_item_class(value) -> bool:
+    """Controleer de class van een <li>; tijdens het parsen kan die nog een ongesplitste string zijn."""
+    if not value:
+        return False
+    classes = value.split() if isinstance(value, str) else value
+    return LIST_ITEM_CLASS in classes
+
+# Alleen de <li> elementen met medicijninformatie worden in de boom opgenomen
+_LIST_ITEM_STRAINER = SoupStrainer("li", attrs={"class": _has_list_item_class})
+
+def parse_medicine_sections(html: str) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Parse de HTML van de medicijnpagina naar een lijst van (kop, inhoud) per <li> element.
+
+    Kop of inhoud is None als het element geen <h2> of inhoud-div heeft.
+    """
+    soup = BeautifulSoup(html, "html.parser", parse_only=_LIST_ITEM_STRAINER)
+    list_items = soup.find_all("li", class_=LIST_ITEM_CLASS)
 
     if not list_items:
         raise ValueError("De pagina bevat niet de juiste informatiestructuur.")
 
-    medicine_info = []
+    sections = []
     for item in list_items:
         title = item.find("h2")
-        if title:
-            medicine_info.append(title.get_text(strip=True))
-        content = item.find("div", class_="listItemContent_content__w3Hqp")
-        if content:
-            medicine_info.append(content.get_text(separator=" ", strip=True))
+        content = item.find("div", class_=CONTENT_CLASS)
+        sections.append((
+            title.get_text(strip=True) if title else None,
+            content.get_text(separator=" ", strip=True) if content else None
+        ))
+    return sections
+
+def sections_to_text(sections: List[Tuple[Optional[str], Optional[str]]]) -> str:
+    """Voeg de secties samen tot de tekst zoals die in de cache staat."""
+    return "\n\n".join(part for section in sections for part in section if part is not None)
 
-    return "\n\n".join(medicine_info)
+def parse_medicine_page(html: str) -> str:
+    """Parse de HTML van de medicijnpagina en extraheer de relevante informatie."""
+    return sections_to_text(parse_medicine_sections(html))
 
 def load_from_cache(medicine_name: str) -> Optional[Dict[str, Any]]:
-    """Laad informatie uit de cache."""
+    """Laad informatie uit de cache; eerst uit het geheugen, daarna uit de database."""
     try:
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                cache = json.load(f)
-                return cache.get(medicine_name)
+        cache = get_cache()
+        _memory_cache.check_source(cache.mtime())
+        cached_data = _memory_cache.get(medicine_name)
+        if cached_data is None:
+            cached_data = cache.get(medicine_name)
+            if cached_data is not None:
+                _memory_cache.put(medicine_name, cached_data)
+        return cached_data
     except Exception as e:
         debug_print(f"Fout bij laden uit cache: {str(e)}")
     return None
 
-def save_to_cache(medicine_name: str, url: str, info: str, atc_cluster: str):
-    """Sla de informatie op in de cache."""
+def save_to_cache(medicine_name: str, url: str, info: str, atc_cluster: str,
+                  etag: Optional[str] = None, last_modified: Optional[str] = None,
+                  sections: Optional[List[Tuple[Optional[str], Optional[str]]]] = None):
+    """Sla de informatie op in de cache, met de secties en HTTP validators van de pagina."""
     try:
-        if os.path.exists(CACHE_FILE):
-            with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-                cache = json.load(f)
-        else:
-            cache = {}
-
-        cache[medicine_name] = {
-            "url": url,
-            "info": info,
-            "date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "atc_cluster": atc_cluster
-        }
-
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
+        cache = get_cache()
+        entry = cache.put(medicine_name, url, info, atc_cluster, etag=etag, last_modified=last_modified,
+                          sections=sections)
+        # Andere namen van dezelfde pagina zijn ook bijgewerkt
+        for alias in cache.aliases(medicine_name):
+            _memory_cache.invalidate(alias)
+        _memory_cache.set_source_mtime(cache.mtime())
     except Exception as e:
         debug_print(f"Fout bij opslaan in cache: {str(e)}")
+        return
 
     debug_print(f"\n\nInformatie over '{medicine_name}' uit ATC-cluster '{atc_cluster}' is opgezocht en opgeslagen in de cache.")
     debug_print(f"De informatie komt van: {url}")
-    debug_print(f"De informatie is opgeslagen op: {cache[medicine_name]['date']}\n\n")
+    debug_print(f"De informatie is opgeslagen op: {entry['date']}\n\n")
+
+def resolve_from_url(medicine_name: str, url: str, atc_cluster: str) -> Optional[str]:
+    """
+    Haal een handmatig gevonden URL op, sla de informatie op in de cache en haal het medicijn uit de URL-wachtrij.
+
+    Returns:
+        De informatie, of None als de URL niet werkt of niet de juiste informatie bevat
+    """
+    response = fetch_page(url)
+    if response.status_code != 200 or "Belangrijk om te weten" not in response.text:
+        return None
+    medicine_info = store_page(medicine_name, url, response, atc_cluster)
+    get_cache().mark_resolved(medicine_name, url)
+    return medicine_info
+
+def load_sections_from_cache(medicine_name: str) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Laad de (kop, inhoud) secties van een medicijn uit de cache; een lege lijst als het medicijn onbekend is."""
+    try:
+        return get_cache().get_sections(medicine_name)
+    except Exception as e:
+        debug_print(f"Fout bij laden secties uit cache: {str(e)}")
+    return []
+
+def refresh_cache_date(medicine_name: str):
+    """Markeer een cache entry als actueel zonder de informatie te wijzigen."""
+    try:
+        cache = get_cache()
+        date = cache.touch(medicine_name)
+        for alias in cache.aliases(medicine_name):
+            _memory_cache.invalidate(alias)
+        _memory_cache.set_source_mtime(cache.mtime())
+        debug_print(f"De informatie over '{medicine_name}' is gerevalideerd op: {date}")
+    except Exception as e:
+        debug_print(f"Fout bij bijwerken cache datum: {str(e)}")
 
 if __name__ == "__main__":
     # Debug mode instellen
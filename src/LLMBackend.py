@@ -0,0 +1,325 @@
+import asyncio
+import hashlib
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel
+from OutputModels import Response, Extraction, FusedResponse, MultiResponse, LeanResponse, LeanFlagsResponse
+
+"""
+Uitwisselbare LLM backend voor GenerateQuestion en EvaluateQuestion.
+
+Een backend doet één gestructureerde chat completion en geeft een response terug in de vorm van
+client.beta.chat.completions.parse (choices[0].message.parsed en usage). OpenAIBackend gebruikt de
+echte API; FakeLLMBackend geeft deterministische, geldige antwoorden zonder API calls, met een
+instelbare latency en een instelbaar deel mislukte calls. Daarmee is de hele pipeline (selectie,
+cache, parsing, database) te meten en te testen zonder te betalen voor OpenAI.
+
+call_llm registreert van elke call het model, de tokens, de latency en de geschatte kosten bij de
+lijst van collect_llm_calls(), zodat de pipeline ze per quizvraag in de database kan opslaan.
+call_llm_async doet hetzelfde met backend.parse_async, voor de AsyncQuestionEngine: AsyncOpenAIBackend
+voor de echte API, en FakeLLMBackend wacht daar zonder de event loop te blokkeren.
+"""
+
+CHARS_PER_TOKEN = 4
+
+# Prijzen in dollar per miljoen tokens: (input, gecachte input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o-2024-08-06": (2.50, 1.25, 10.00),
+    "gpt-4.1": (2.00, 0.50, 8.00),
+    "gpt-4.1-mini": (0.40, 0.10, 1.60),
+    "gpt-4.1-nano": (0.10, 0.025, 0.40),
+}
+
+# Lijst waar call_llm de calls aan toevoegt; per thread en per asyncio taak een eigen waarde
+_current_calls: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("llm_calls", default=None)
+# Aantal retries van de laatste call in deze thread of taak; gezet door ResilientBackend
+_call_retries: ContextVar[int] = ContextVar("llm_call_retries", default=0)
+
+
+class LLMBackend:
+    """Interface voor het LLM."""
+    def parse(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        """Voer de chat completion uit en parse het antwoord naar response_format."""
+        raise NotImplementedError
+
+    async def parse_async(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        """Als parse, vanuit een event loop; standaard draait parse in een thread."""
+        return await asyncio.to_thread(self.parse, model=model, messages=messages, response_format=response_format,
+                                       temperature=temperature)
+
+
+class OpenAIBackend(LLMBackend):
+    """OpenAI API via een (instructor) client met beta.chat.completions.parse."""
+    def __init__(self, client: Any):
+        self.client = client
+
+    def parse(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        return self.client.beta.chat.completions.parse(
+            model=model,
+            response_format=response_format,
+            temperature=temperature,
+            messages=messages,
+        )
+
+
+class AsyncOpenAIBackend(LLMBackend):
+    """OpenAI API via een AsyncOpenAI client; alleen voor gebruik vanuit een event loop."""
+    def __init__(self, client: Any):
+        self.client = client
+
+    def parse(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        raise NotImplementedError("AsyncOpenAIBackend ondersteunt alleen parse_async")
+
+    async def parse_async(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        return await self.client.beta.chat.completions.parse(
+            model=model,
+            response_format=response_format,
+            temperature=temperature,
+            messages=messages,
+        )
+
+
+class FakeLLMError(RuntimeError):
+    """Gesimuleerde fout van de FakeLLMBackend, met een HTTP status en headers zoals een API fout."""
+    def __init__(self, message: str, status_code: int = 500, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+def prompt_digest(messages: List[dict], seed: int = 0) -> int:
+    """Deterministisch getal op basis van de prompt (en seed)."""
+    text = f"{seed}:" + json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def fake_final_resolution(query: str, digest: int) -> Dict[str, Any]:
+    """Een geldige quizvraag over de query; de positie van het juiste antwoord volgt uit de digest."""
+    options = ["Optie A", "Optie B", "Optie C", "Optie D"]
+    return {
+        "introductie": "Een patiënt komt een herhaalrecept ophalen.",
+        "vraag": query,
+        "antwoordopties": options,
+        "antwoord": options[digest % len(options)],
+        "uitleg": "Antwoord van de FakeLLMBackend.",
+        "verificatie": {"check_accuracy": "ok", "check_clarity": "ok", "check_fairness": "ok", "improvements": []}
+    }
+
+
+def fake_content(messages: List[dict], response_format: type, digest: int) -> Dict[str, Any]:
+    """Antwoord als dict voor de bekende response formats."""
+    query = messages[-1]["content"]
+    extraction = {"relevant_information": query.strip()[:500]}
+    question = {
+        "steps": [{"description": "Informatie gelezen", "action": "Vraag opgesteld", "result": "Quizvraag"}],
+        "final_resolution": fake_final_resolution(query, digest)
+    }
+    if response_format is Extraction:
+        return extraction
+    if response_format is Response:
+        return question
+    if response_format is FusedResponse:
+        return dict(extraction, **question)
+    if response_format is Response.FinalResolution:
+        return question["final_resolution"]
+    if response_format is LeanResponse:
+        lean = dict(question["final_resolution"])
+        del lean["verificatie"]
+        return {"final_resolution": lean}
+    if response_format is LeanFlagsResponse:
+        return {"final_resolution": dict(question["final_resolution"],
+                                         verificatie={"accurate": True, "clear": True, "fair": True})}
+    if response_format is MultiResponse:
+        # Eén vraag per genummerde categorie in de query
+        categories = re.findall(r"^\s*\d+\. (.+)$", query, flags=re.MULTILINE)
+        return {"questions": [
+            dict(question, categorie=category, final_resolution=fake_final_resolution(f"{category}: {query}", digest + index))
+            for index, category in enumerate(categories)
+        ]}
+    raise ValueError(f"FakeLLMBackend heeft geen antwoord voor {response_format.__name__}")
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministische stand-in voor het LLM.
+
+    Elke call wacht `latency` seconden. Een deel `failure_rate` van de prompts geeft een FakeLLMError;
+    welke prompts dat zijn volgt uit een hash van de prompt en `seed`, dus dezelfde prompt geeft altijd
+    hetzelfde resultaat, ongeacht de volgorde of het aantal threads.
+
+    Met `failures_per_prompt` faalt zo'n prompt alleen de eerste keren (een tijdelijke fout, die een
+    retry oplost); `error_status` en `retry_after` bepalen de status en de retry-after header van de
+    fout. Een deel `tail_rate` van de prompts duurt bij de eerste poging `tail_latency` seconden langer.
+    """
+    def __init__(self, latency: float = 0.0, failure_rate: float = 0.0, seed: int = 0,
+                 failures_per_prompt: Optional[int] = None, error_status: int = 500,
+                 retry_after: Optional[float] = None, tail_rate: float = 0.0, tail_latency: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.seed = seed
+        self.failures_per_prompt = failures_per_prompt
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.stats = {"calls": 0, "failures": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        self._attempts: Dict[int, int] = {}
+        self._lock = threading.Lock()
+
+    def parse(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        digest, attempt, delay = self._start(messages)
+        if delay:
+            time.sleep(delay)
+        return self._respond(model, messages, response_format, digest, attempt)
+
+    async def parse_async(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        digest, attempt, delay = self._start(messages)
+        if delay:
+            await asyncio.sleep(delay)
+        return self._respond(model, messages, response_format, digest, attempt)
+
+    def _start(self, messages: List[dict]) -> Tuple[int, int, float]:
+        """Digest van de prompt, de hoeveelste poging dit is en de latency van deze call."""
+        digest = prompt_digest(messages, self.seed)
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        # Een tweede, onafhankelijke hash voor de trage prompts
+        slow = attempt == 0 and prompt_digest(messages, self.seed + 1) / 0xFFFFFFFF < self.tail_rate
+        return digest, attempt, self.latency + (self.tail_latency if slow else 0.0)
+
+    def _respond(self, model: str, messages: List[dict], response_format: type, digest: int, attempt: int) -> Any:
+        with self._lock:
+            self.stats["calls"] += 1
+            if digest / 0xFFFFFFFF < self.failure_rate and (self.failures_per_prompt is None
+                                                             or attempt < self.failures_per_prompt):
+                self.stats["failures"] += 1
+                headers = {"retry-after": str(self.retry_after)} if self.retry_after is not None else None
+                raise FakeLLMError(f"Gesimuleerde fout voor {response_format.__name__}", self.error_status, headers)
+
+        parsed: BaseModel = response_format.model_validate(fake_content(messages, response_format, digest))
+        prompt_tokens = sum(len(message["content"]) for message in messages) // CHARS_PER_TOKEN
+        completion_tokens = len(parsed.model_dump_json()) // CHARS_PER_TOKEN
+        with self._lock:
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+        return SimpleNamespace(
+            model=model,
+            choices=[SimpleNamespace(index=0, finish_reason="stop", message=SimpleNamespace(parsed=parsed))],
+            usage=SimpleNamespace(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+                prompt_tokens_details=SimpleNamespace(cached_tokens=0)
+            )
+        )
+
+
+def estimate_cost(model: str, prompt_tokens: int, cached_tokens: int, completion_tokens: int) -> Optional[float]:
+    """Geschatte kosten in dollar, of None voor een model zonder bekende prijs."""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    input_price, cached_price, output_price = prices
+    return ((prompt_tokens - cached_tokens) * input_price + cached_tokens * cached_price
+            + completion_tokens * output_price) / 1_000_000
+
+
+def usage_tokens(response: Any) -> Tuple[int, int, int]:
+    """(prompt, completion, cached) tokens uit de usage van een response; 0 waar die ontbreken."""
+    usage = getattr(response, "usage", None)
+    values = (
+        getattr(usage, "prompt_tokens", None),
+        getattr(usage, "completion_tokens", None),
+        getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    )
+    return tuple(value if isinstance(value, int) else 0 for value in values)
+
+
+@contextmanager
+def collect_llm_calls():
+    """Verzamel alle LLM calls binnen dit blok (in deze thread of asyncio taak) in de teruggegeven lijst."""
+    calls = []
+    token = _current_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _current_calls.reset(token)
+
+
+def record_llm_call(stage: str, model: str, response: Any, seconds: float, category: Optional[str] = None,
+                    retries: int = 0):
+    """Voeg een afgeronde call toe aan de lijst van collect_llm_calls(), als die er is."""
+    calls = _current_calls.get()
+    if calls is None:
+        return
+    prompt_tokens, completion_tokens, cached_tokens = usage_tokens(response)
+    calls.append({
+        "stap": stage,
+        "model": model,
+        "kenniscategorie": category,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "cached_tokens": cached_tokens,
+        "latency_ms": seconds * 1000,
+        "retries": retries,
+        "kosten": estimate_cost(model, prompt_tokens, cached_tokens, completion_tokens),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+def share_llm_calls(calls: List[Dict[str, Any]], count: int, category: Optional[str] = None,
+                    index: int = 0) -> List[Dict[str, Any]]:
+    """
+    Het aandeel van vraag `index` in calls die `count` vragen tegelijk opleverden. Tokens blijven gehele
+    getallen (INTEGER kolommen): elke vraag krijgt tokens // count en de eerste vraag ook de rest, zodat de
+    som over de vragen gelijk is aan de call. Alleen de kosten worden exact gedeeld; de latency blijft gelijk
+    (elke vraag heeft zo lang gewacht).
+    """
+    if count == 1:
+        return calls
+    shared = []
+    for call in calls:
+        call = dict(call, kenniscategorie=category or call["kenniscategorie"])
+        for key in ("prompt_tokens", "completion_tokens", "cached_tokens"):
+            if call[key] is not None:
+                call[key] = call[key] // count + (call[key] % count if index == 0 else 0)
+        if call["kosten"] is not None:
+            call["kosten"] = call["kosten"] / count
+        shared.append(call)
+    return shared
+
+
+def set_call_retries(retries: int):
+    """Geef door hoeveel retries de huidige call nodig had (voor record_llm_call in call_llm)."""
+    _call_retries.set(retries)
+
+
+def call_llm(backend: LLMBackend, stage: str, model: str, messages: List[dict], response_format: type,
+             temperature: float, category: Optional[str] = None) -> Any:
+    """backend.parse, waarbij tokens, latency, kosten en retries worden geregistreerd onder `stage`."""
+    start = time.perf_counter()
+    _call_retries.set(0)
+    response = backend.parse(model=model, messages=messages, response_format=response_format, temperature=temperature)
+    record_llm_call(stage, model, response, time.perf_counter() - start, category, retries=_call_retries.get())
+    return response
+
+
+async def call_llm_async(backend: LLMBackend, stage: str, model: str, messages: List[dict], response_format: type,
+                         temperature: float, category: Optional[str] = None) -> Any:
+    """Als call_llm, met backend.parse_async."""
+    start = time.perf_counter()
+    _call_retries.set(0)
+    response = await backend.parse_async(model=model, messages=messages, response_format=response_format,
+                                         temperature=temperature)
+    record_llm_call(stage, model, response, time.perf_counter() - start, category, retries=_call_retries.get())
+    return response
@@ -0,0 +1,484 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+
+"""
+SQLite opslag voor de medicatie-informatie cache.
+
+De tekst van een pagina wordt één keer opgeslagen in 'medicine_pages', met een hash van URL en inhoud
+als sleutel. 'medicine_aliases' koppelt elke medicijnnaam (ook merknamen zoals 'lisil') aan een pagina.
+'page_sections' bevat per pagina de (kop, inhoud) secties, zodat alleen de relevante secties gebruikt kunnen worden.
+'url_resolution_queue' bevat medicijnen waarvoor in batch mode geen werkende URL is gevonden.
+'extractions' bevat de door het LLM geëxtraheerde informatie per tekst en kenniscategorie.
+Opzoeken en opslaan kost daardoor één query, in plaats van het inlezen en herschrijven van het
+volledige JSON bestand. De oude JSON cache wordt bij het eerste gebruik eenmalig overgezet.
+
+Meerdere processen (bijv. twee BuildQuestionDatabase.py workers) kunnen tegelijk schrijven: de database
+draait in WAL mode, lezers worden niet geblokkeerd en elke schrijfactie is één BEGIN IMMEDIATE transactie,
+zodat een lees-wijzig-schrijf actie niet kan worden onderbroken door een ander proces.
+"""
+
+# Versie van het cache schema, opgeslagen in PRAGMA user_version
+SCHEMA_VERSION = 4
+# Hoe lang een schrijver wacht op de schrijflock van een ander proces
+BUSY_TIMEOUT_SECONDS = 30
+
+Section = Tuple[Optional[str], Optional[str]]  # (kop, inhoud)
+
+
+def page_hash(url: str, info: str) -> str:
+    """Sleutel van een pagina: hash van URL en inhoud."""
+    return hashlib.sha256(f"{url}\n{info}".encode("utf-8")).hexdigest()
+
+
+def split_info_sections(info: str) -> List[Section]:
+    """
+    Reconstrueer de secties uit de samengevoegde tekst, voor pagina's die zonder secties zijn opgeslagen.
+
+    De tekst wisselt kop en inhoud af, gescheiden door een lege regel. Lukt dat niet (oneven aantal
+    delen), dan wordt de hele tekst één sectie zonder kop.
+    """
+    parts = info.split("\n\n")
+    if len(parts) % 2:
+        return [(None, info)]
+    return [(parts[i], parts[i + 1]) for i in range(0, len(parts), 2)]
+
+
+class MedicineCache:
+    """Cache voor medicatie-informatie in een SQLite database, met de medicijnnaam als sleutel."""
+    def __init__(self, db_path: str, json_path: Optional[str] = None):
+        self.db_path = db_path
+        self.json_path = json_path
+        self._local = threading.local()
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Geef de verbinding van deze thread terug (sqlite3 verbindingen zijn niet deelbaar tussen threads)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_SECONDS)
+            conn.execute("PRAGMA synchronous = NORMAL")  # Veilig in WAL mode, één fsync per checkpoint
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """
+        Schrijftransactie die direct de schrijflock neemt (BEGIN IMMEDIATE).
+
+        Met een gewone transactie kunnen twee processen allebei eerst lezen en daarna niet meer
+        schrijven; nu wacht het tweede proces (maximaal BUSY_TIMEOUT_SECONDS) tot het eerste klaar is.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+    def _init_db(self):
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode = WAL")  # Blijft bewaard in het databasebestand
+        with self._transaction():
+            # Binnen de schrijflock lezen, zodat maar één proces de migratie uitvoert
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS medicine_pages (
+                    page_hash TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    info TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_medicine_pages_url ON medicine_pages(url)")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS medicine_aliases (
+                    medicine_name TEXT PRIMARY KEY,
+                    page_hash TEXT NOT NULL REFERENCES medicine_pages(page_hash),
+                    atc_cluster TEXT
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_medicine_aliases_page ON medicine_aliases(page_hash)")
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS page_sections (
+                    page_hash TEXT NOT NULL REFERENCES medicine_pages(page_hash),
+                    position INTEGER NOT NULL,
+                    heading TEXT,
+                    content TEXT,
+                    PRIMARY KEY (page_hash, position)
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS url_resolution_queue (
+                    medicine_name TEXT PRIMARY KEY,
+                    brand_name TEXT,
+                    atc_cluster TEXT,
+                    attempted_urls TEXT,            -- JSON lijst van geprobeerde URLs
+                    added_date TEXT NOT NULL,
+                    resolved_url TEXT,              -- Ingevuld zodra een werkende URL is gevonden
+                    resolved_date TEXT
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS extractions (
+                    cache_key TEXT PRIMARY KEY,     -- Hash van tekst, categorie, promptversie en model
+                    medicine_name TEXT NOT NULL,
+                    category TEXT NOT NULL,
+                    prompt_version INTEGER NOT NULL,
+                    model TEXT NOT NULL,
+                    relevant_information TEXT NOT NULL,
+                    date TEXT NOT NULL
+                )
+            ''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_extractions_medicine ON extractions(medicine_name)")
+            if version < 1:
+                self._migrate_from_json(conn)
+            elif version < 3:
+                self._migrate_from_medicine_cache(conn, version)
+            elif version < 4:
+                # Versie 3 had nog geen secties: reconstrueer ze uit de opgeslagen tekst
+                for page_hash_, info in conn.execute("SELECT page_hash, info FROM medicine_pages").fetchall():
+                    self._put_sections(conn, page_hash_, split_info_sections(info))
+            if version < SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _migrate_from_json(self, conn: sqlite3.Connection):
+        """Zet de entries uit de oude JSON cache eenmalig over naar de database."""
+        if not self.json_path or not os.path.exists(self.json_path):
+            return
+        try:
+            with open(self.json_path, 'r', encoding='utf-8') as f:
+                legacy_cache = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Oude cache kon niet worden gelezen, migratie overgeslagen: {e}")
+            return
+
+        entries = [
+            (name, entry) for name, entry in legacy_cache.items()
+            if entry.get("url") and entry.get("info") and entry.get("date")
+        ]
+        # Oudste eerst, zodat de nieuwste versie van een pagina voor alle aliassen overblijft
+        for name, entry in sorted(entries, key=lambda item: item[1]["date"]):
+            self._put(conn, name, entry["url"], entry["info"], entry.get("atc_cluster"), entry["date"])
+
+    def _migrate_from_medicine_cache(self, conn: sqlite3.Connection, version: int):
+        """Zet de tabel 'medicine_cache' (schema versie 1 en 2, één rij per medicijn) om naar pagina's en aliassen."""
+        validators = "etag, last_modified" if version >= 2 else "NULL, NULL"
+        rows = conn.execute(f'''
+            SELECT medicine_name, url, info, atc_cluster, date, {validators} FROM medicine_cache ORDER BY date
+        ''').fetchall()
+        for name, url, info, atc_cluster, date, etag, last_modified in rows:
+            self._put(conn, name, url, info, atc_cluster, date, etag, last_modified)
+        conn.execute("DROP TABLE medicine_cache")
+
+    def _put_sections(self, conn: sqlite3.Connection, page_hash_: str, sections: List[Section]):
+        conn.execute("DELETE FROM page_sections WHERE page_hash = ?", (page_hash_,))
+        conn.executemany(
+            "INSERT INTO page_sections (page_hash, position, heading, content) VALUES (?, ?, ?, ?)",
+            [(page_hash_, position, heading, content) for position, (heading, content) in enumerate(sections)]
+        )
+
+    def _put(self, conn: sqlite3.Connection, medicine_name: str, url: str, info: str, atc_cluster: str,
+             date: str, etag: Optional[str] = None, last_modified: Optional[str] = None,
+             sections: Optional[List[Section]] = None) -> str:
+        """Sla een pagina en alias op binnen de lopende transactie en geef de hash van de pagina terug."""
+        new_hash = page_hash(url, info)
+        is_new_page = not conn.execute(
+            "SELECT 1 FROM medicine_pages WHERE page_hash = ?", (new_hash,)
+        ).fetchone()
+        conn.execute('''
+            INSERT OR REPLACE INTO medicine_pages (page_hash, url, date, info, etag, last_modified)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (new_hash, url, date, info, etag, last_modified))
+        if sections is not None:
+            self._put_sections(conn, new_hash, sections)
+        elif not conn.execute("SELECT 1 FROM page_sections WHERE page_hash = ? LIMIT 1", (new_hash,)).fetchone():
+            self._put_sections(conn, new_hash, split_info_sections(info))
+
+        # Oude versies van deze pagina: alle aliassen van dezelfde URL gaan mee naar de nieuwe versie
+        same_url = [row[0] for row in conn.execute(
+            "SELECT page_hash FROM medicine_pages WHERE url = ? AND page_hash != ?", (url, new_hash)
+        )]
+        conn.executemany(
+            "UPDATE medicine_aliases SET page_hash = ? WHERE page_hash = ?",
+            [(new_hash, old_hash) for old_hash in same_url]
+        )
+
+        previous = conn.execute(
+            "SELECT page_hash FROM medicine_aliases WHERE medicine_name = ?", (medicine_name,)
+        ).fetchone()
+        conn.execute('''
+            INSERT OR REPLACE INTO medicine_aliases (medicine_name, page_hash, atc_cluster)
+            VALUES (?, ?, ?)
+        ''', (medicine_name, new_hash, atc_cluster))
+
+        # Nieuwe paginatekst: extracties van de oude tekst zijn niet meer bruikbaar
+        if is_new_page:
+            conn.execute('''
+                DELETE FROM extractions
+                WHERE medicine_name IN (SELECT medicine_name FROM medicine_aliases WHERE page_hash = ?)
+            ''', (new_hash,))
+
+        # Verwijder pagina's (en hun secties) waar geen alias meer naar wijst
+        replaced = same_url + ([previous[0]] if previous and previous[0] != new_hash else [])
+        orphaned = [
+            old_hash for old_hash in replaced
+            if not conn.execute("SELECT 1 FROM medicine_aliases WHERE page_hash = ? LIMIT 1", (old_hash,)).fetchone()
+        ]
+        conn.executemany("DELETE FROM page_sections WHERE page_hash = ?", [(old_hash,) for old_hash in orphaned])
+        conn.executemany("DELETE FROM medicine_pages WHERE page_hash = ?", [(old_hash,) for old_hash in orphaned])
+        return new_hash
+
+    def get(self, medicine_name: str) -> Optional[Dict[str, Any]]:
+        """Haal de cache entry van een medicijn op, of None als het medicijn niet in de cache staat."""
+        row = self._connect().execute('''
+            SELECT p.url, p.date, a.atc_cluster, p.info, p.etag, p.last_modified, p.page_hash
+            FROM medicine_aliases a JOIN medicine_pages p ON p.page_hash = a.page_hash
+            WHERE a.medicine_name = ?
+        ''', (medicine_name,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "url": row[0], "date": row[1], "atc_cluster": row[2], "info": row[3],
+            "etag": row[4], "last_modified": row[5], "page_hash": row[6]
+        }
+
+    def get_sections(self, medicine_name: str) -> List[Section]:
+        """Haal de (kop, inhoud) secties van de pagina van een medicijn op, in volgorde van de pagina."""
+        return [(heading, content) for heading, content in self._connect().execute('''
+            SELECT s.heading, s.content
+            FROM medicine_aliases a JOIN page_sections s ON s.page_hash = a.page_hash
+            WHERE a.medicine_name = ?
+            ORDER BY s.position
+        ''', (medicine_name,))]
+
+    def put(self, medicine_name: str, url: str, info: str, atc_cluster: str, date: Optional[str] = None,
+            etag: Optional[str] = None, last_modified: Optional[str] = None,
+            sections: Optional[List[Section]] = None) -> Dict[str, Any]:
+        """
+        Sla de informatie van een medicijn op (of overschrijf de bestaande entry).
+
+        Andere medicijnnamen met dezelfde URL gaan mee naar de nieuwe versie van de pagina.
+        Zonder secties worden ze gereconstrueerd uit de tekst.
+        """
+        entry = {
+            "url": url,
+            "info": info,
+            "date": date or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "atc_cluster": atc_cluster,
+            "etag": etag,
+            "last_modified": last_modified
+        }
+        with self._transaction() as conn:
+            entry["page_hash"] = self._put(
+                conn, medicine_name, url, info, atc_cluster, entry["date"], etag, last_modified, sections
+            )
+        return entry
+
+    def touch(self, medicine_name: str, date: Optional[str] = None) -> Optional[str]:
+        """
+        Zet de opslagdatum van een entry op nu, zonder de informatie te wijzigen (bijv. na een HTTP 304).
+
+        De datum hoort bij de pagina, dus alle aliassen van de pagina worden bijgewerkt.
+        """
+        date = date or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._transaction() as conn:
+            updated = conn.execute('''
+                UPDATE medicine_pages SET date = ?
+                WHERE page_hash = (SELECT page_hash FROM medicine_aliases WHERE medicine_name = ?)
+            ''', (date, medicine_name)).rowcount
+        return date if updated else None
+
+    def aliases(self, medicine_name: str) -> List[str]:
+        """Alle medicijnnamen die naar dezelfde pagina wijzen (inclusief de naam zelf)."""
+        return [row[0] for row in self._connect().execute('''
+            SELECT medicine_name FROM medicine_aliases
+            WHERE page_hash = (SELECT page_hash FROM medicine_aliases WHERE medicine_name = ?)
+            ORDER BY medicine_name
+        ''', (medicine_name,))]
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """Laad de hele cache; aliassen van dezelfde pagina delen de tekst in het geheugen."""
+        conn = self._connect()
+        pages = {}
+        for page_hash_, url, date, info, etag, last_modified in conn.execute(
+            "SELECT page_hash, url, date, info, etag, last_modified FROM medicine_pages"
+        ):
+            pages[page_hash_] = {"url": url, "date": date, "info": info, "etag": etag,
+                                 "last_modified": last_modified, "page_hash": page_hash_}
+        return {
+            name: dict(pages[page_hash_], atc_cluster=atc_cluster)
+            for name, page_hash_, atc_cluster in conn.execute(
+                "SELECT medicine_name, page_hash, atc_cluster FROM medicine_aliases"
+            )
+        }
+
+    def enqueue_resolution(self, medicine_name: str, brand_name: Optional[str], atc_cluster: str,
+                           attempted_urls: List[str]):
+        """Zet een medicijn zonder werkende URL in de wachtrij (of voeg nieuwe geprobeerde URLs toe)."""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempted_urls FROM url_resolution_queue WHERE medicine_name = ?", (medicine_name,)
+            ).fetchone()
+            urls = json.loads(row[0]) if row and row[0] else []
+            urls += [url for url in attempted_urls if url not in urls]
+            conn.execute('''
+                INSERT INTO url_resolution_queue (medicine_name, brand_name, atc_cluster, attempted_urls, added_date)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(medicine_name) DO UPDATE SET
+                    brand_name = excluded.brand_name,
+                    atc_cluster = excluded.atc_cluster,
+                    attempted_urls = excluded.attempted_urls,
+                    resolved_url = NULL,
+                    resolved_date = NULL
+            ''', (medicine_name, brand_name, atc_cluster, json.dumps(urls),
+                  datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def pending_resolutions(self) -> List[Dict[str, Any]]:
+        """Medicijnen in de wachtrij die nog geen werkende URL hebben, oudste eerst."""
+        return [
+            {"medicine_name": name, "brand_name": brand, "atc_cluster": cluster,
+             "attempted_urls": json.loads(urls) if urls else [], "added_date": added}
+            for name, brand, cluster, urls, added in self._connect().execute('''
+                SELECT medicine_name, brand_name, atc_cluster, attempted_urls, added_date
+                FROM url_resolution_queue WHERE resolved_url IS NULL ORDER BY added_date, medicine_name
+            ''')
+        ]
+
+    def mark_resolved(self, medicine_name: str, url: str):
+        """Registreer de gevonden URL van een medicijn in de wachtrij."""
+        with self._transaction() as conn:
+            conn.execute('''
+                UPDATE url_resolution_queue SET resolved_url = ?, resolved_date = ? WHERE medicine_name = ?
+            ''', (url, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), medicine_name))
+
+    def get_extraction(self, cache_key: str) -> Optional[str]:
+        """Haal een eerder geëxtraheerde tekst op, of None."""
+        row = self._connect().execute(
+            "SELECT relevant_information FROM extractions WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put_extraction(self, cache_key: str, medicine_name: str, category: str, prompt_version: int,
+                       model: str, relevant_information: str):
+        """
+        Sla een extractie op. De extractie wordt verwijderd zodra de pagina van het medicijn
+        (of een alias ervan) een nieuwe tekst krijgt.
+        """
+        with self._transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO extractions
+                    (cache_key, medicine_name, category, prompt_version, model, relevant_information, date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (cache_key, medicine_name, category, prompt_version, model, relevant_information,
+                  datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+
+    def count_extractions(self) -> int:
+        """Aantal opgeslagen extracties."""
+        return self._connect().execute("SELECT COUNT(*) FROM extractions").fetchone()[0]
+
+    def mtime(self) -> float:
+        """
+        Laatste wijzigingstijd van de database (ook bij schrijven door andere processen).
+
+        In WAL mode komen nieuwe transacties eerst in het -wal bestand terecht, dus beide bestanden tellen mee.
+        """
+        mtimes = [0.0]
+        for path in (self.db_path, f"{self.db_path}-wal"):
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except OSError:
+                pass
+        return max(mtimes)
+
+    def count(self) -> int:
+        """Aantal medicijnnamen in de cache."""
+        return self._connect().execute("SELECT COUNT(*) FROM medicine_aliases").fetchone()[0]
+
+    def count_pages(self) -> int:
+        """Aantal unieke pagina's in de cache."""
+        return self._connect().execute("SELECT COUNT(*) FROM medicine_pages").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class LRUCache:
+    """
+    In-memory LRU cache, begrensd in aantal entries en in leeftijd (TTL).
+
+    Houdt tellers bij voor hits, misses, evictions en invalidaties.
+    """
+    def __init__(self, max_size: int = 256, ttl_seconds: float = 300):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (opslagtijd, waarde)
+        self._source_mtime = None
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.stats["misses"] += 1
+                return None
+            stored_at, value = item
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.stats["evictions"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self.stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def check_source(self, mtime: float):
+        """Leeg de cache als het onderliggende bestand is gewijzigd sinds de vorige controle."""
+        if self._source_mtime is not None and mtime != self._source_mtime:
+            self.clear()
+        self._source_mtime = mtime
+
+    def set_source_mtime(self, mtime: float):
+        """Registreer een wijziging van het bestand die al in de cache is verwerkt (eigen schrijfactie)."""
+        self._source_mtime = mtime
+
+    def get_statistics(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats, size=len(self._entries))
@@ -30,4 +30,44 @@ class Response(BaseModel):
     class Config:
         json_schema_extra = {
             "required": ["steps", "final_resolution"]
-        } 
\ No newline at end of file
+        } 
+
+class LeanResponse(BaseModel):
+    """Alleen de vraagvelden die worden opgeslagen: geen stappen en geen zelfcontrole in vrije tekst."""
+    class FinalResolution(BaseModel):
+        introductie: str = Field(description="The introduction text for the quiz question.")
+        vraag: str = Field(description="The quiz question.")
+        antwoordopties: List[str] = Field(description="The answer options for the quiz question, without any prefixes.")
+        antwoord: str = Field(description="The correct answer to the quiz question.")
+        uitleg: str = Field(description="The explanation for the correct answer.")
+
+    final_resolution: FinalResolution
+
+
+class LeanFlagsResponse(BaseModel):
+    """Als LeanResponse, met de zelfcontrole als drie ja/nee vlaggen."""
+    class VerificationFlags(BaseModel):
+        accurate: bool = Field(description="All medical/pharmaceutical information is correct")
+        clear: bool = Field(description="The question and options are clear and unambiguous")
+        fair: bool = Field(description="The question tests knowledge fairly")
+
+    class FinalResolution(LeanResponse.FinalResolution):
+        verificatie: "LeanFlagsResponse.VerificationFlags" = Field(description="Self-verification results")
+
+    final_resolution: FinalResolution
+
+
+class FusedResponse(BaseModel):
+    """Extractie en quizvraag in één call: eerst de gebruikte informatie, daarna de vraag."""
+    relevant_information: str = Field(description="The information from the source text that the question is based on.")
+    steps: List[Response.Step]
+    final_resolution: Response.FinalResolution
+
+
+class MultiResponse(BaseModel):
+    """Meerdere quizvragen in één call, in de gevraagde volgorde van de categorieën."""
+    class Question(BaseModel):
+        categorie: str = Field(description="The knowledge category this question is about.")
+        steps: List[Response.Step]
+        final_resolution: Response.FinalResolution
+    questions: List[Question]
@@ -1,4 +1,7 @@
 class QuizPrompts:
+    # Verhoog bij elke wijziging van get_extraction_prompt, zodat opgeslagen extracties niet meer worden gebruikt
+    EXTRACTION_PROMPT_VERSION = 1
+
     STYLE = """
     - je schrijft in het Nederlands, de je-vorm en zonder namen te noemen
     - richt je impliciet tot de apothekersassistent (noem het woord apothekersassistent niet).
@@ -94,6 +97,23 @@ class QuizPrompts:
         - kom terug op de informatie in de introductie, om de relevantie uit te leggen.
     """
 
+    @staticmethod
+    def get_fused_prompt(medicine_info: str, category: str) -> str:
+        return f"""
+        Hier is informatie over een medicijn: {medicine_info}
+        Neem eerst in relevant_information letterlijk de informatie over die specifiek betrekking heeft op de categorie '{category}'.
+        Gebruik daarna uitsluitend die informatie voor de quizvraag.
+        """
+
+    @staticmethod
+    def get_multi_question_query(medicine_name: str, categories: list) -> str:
+        lines = "\n".join(f"{number}. {category}" for number, category in enumerate(categories, start=1))
+        return f"""
+        Maak {len(categories)} verschillende quizvragen over {medicine_name}, één vraag per categorie hieronder en in dezelfde volgorde.
+        Vul bij elke vraag de categorie in. Een categorie die vaker voorkomt krijgt steeds een vraag over een ander onderwerp.
+        {lines}
+        """
+
     @staticmethod
     def get_extraction_prompt(medicine_info: str, category: str) -> str:
         return f"""
@@ -0,0 +1,381 @@
+import asyncio
+import email.utils
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import openai
+from LLMBackend import LLMBackend, set_call_retries
+
+"""
+Retries, backoff, circuit breaker en hedging rond de LLM calls.
+
+ResilientBackend wikkelt een andere backend. Elke fout wordt ingedeeld met classify_error:
+- rate_limit (429): opnieuw proberen na de tijd uit de headers (retry-after-ms, retry-after of
+  x-ratelimit-reset-*); alle threads wachten tot dat moment, zodat ze de limiet niet blijven raken.
+- transient (time-out, verbinding, 408, 409, 5xx): opnieuw proberen met exponentiële backoff met
+  jitter, en meetellen voor de circuit breaker.
+- fatal (overige 4xx, ongeldige output, quota op): direct doorgeven; opnieuw proberen helpt niet.
+
+De circuit breaker gaat open na CIRCUIT_FAILURE_THRESHOLD opeenvolgende transient fouten. Zolang hij
+open is wachten alle calls (de pipeline pauzeert); na CIRCUIT_RESET_SECONDS mag één call het proberen.
+Lukt die, dan gaat de breaker weer dicht.
+Krijgt de proefcall een rate limit, of eindigt hij zonder uitkomst, dan gaat de breaker terug naar open. Wie langer dan CIRCUIT_MAX_WAIT_SECONDS moet wachten krijgt
+een CircuitOpenError.
+
+Met hedge_after wordt een call die na zoveel seconden nog niet klaar is nog een keer verstuurd; het
+eerste antwoord wint. Dat kort de staart van de latency af, maar de verloren call kost ook tokens.
+
+Resilience.call_async en ResilientBackend.parse_async doen hetzelfde voor de AsyncQuestionEngine,
+met dezelfde (gedeelde) breaker en tellers, maar wachten zonder de event loop te blokkeren.
+
+Alle tellers staan in Resilience.get_statistics().
+"""
+
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+CIRCUIT_FAILURE_THRESHOLD = 5  # Opeenvolgende transient fouten
+CIRCUIT_RESET_SECONDS = 30.0  # Pauze voordat één call het opnieuw probeert
+CIRCUIT_MAX_WAIT_SECONDS = 600.0  # Langer pauzeren geeft een CircuitOpenError
+HEDGE_AFTER_SECONDS: Optional[float] = None  # None: geen hedging
+HEDGE_MAX_WORKERS = 16
+
+RATE_LIMIT_RESET_HEADERS = ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")
+
+
+class CircuitOpenError(RuntimeError):
+    """De provider faalt al te lang; de call is niet verstuurd."""
+
+
+def classify_error(error: Exception) -> str:
+    """'rate_limit', 'transient' of 'fatal'."""
+    status = getattr(error, "status_code", None)
+    if status == 429:
+        # Een lege tegoed (insufficient_quota) komt ook als 429, maar wordt niet beter door te wachten
+        return "fatal" if getattr(error, "code", None) == "insufficient_quota" else "rate_limit"
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return "transient"
+    if isinstance(status, int) and (status in (408, 409) or status >= 500):
+        return "transient"
+    return "fatal"
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Duur in seconden uit '1.5', '20ms', '1s' of '6m0s' (formaat van x-ratelimit-reset-*)."""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts or "".join(number + unit for number, unit in parts) != value.strip():
+        return None
+    factors = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * factors[unit] for number, unit in parts)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Wachttijd die de provider in de headers van de fout meegeeft, of None."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    if not headers:
+        return None
+    headers = {key.lower(): value for key, value in headers.items()}
+    if "retry-after-ms" in headers:
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if "retry-after" in headers:
+        value = headers["retry-after"]
+        try:
+            return float(value)
+        except ValueError:
+            try:  # HTTP datum
+                return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    resets = [parse_duration(headers[key]) for key in RATE_LIMIT_RESET_HEADERS if key in headers]
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float], rng: random.Random,
+                  base: float = BACKOFF_BASE_SECONDS, maximum: float = BACKOFF_MAX_SECONDS) -> float:
+    """
+    Wachttijd voor poging attempt + 1: 'full jitter' tussen 0 en base * 2^attempt (hoogstens maximum),
+    of de wachttijd van de provider plus wat jitter, zodat de threads niet tegelijk terugkomen.
+    """
+    if retry_after is not None:
+        return retry_after + rng.uniform(0, base)
+    return rng.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Gedeelde breaker: closed (normaal), open (alle calls wachten) en half_open (één proefcall)."""
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_seconds: float = CIRCUIT_RESET_SECONDS,
+                 max_wait_seconds: float = CIRCUIT_MAX_WAIT_SECONDS, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep,
+                 async_sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.max_wait_seconds = max_wait_seconds
+        self.clock = clock
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.state = "closed"
+        self.stats = {"circuit_opened": 0, "paused_seconds": 0.0}
+        self._failures = 0
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def _wait_seconds(self, waited: float) -> Tuple[float, bool]:
+        """
+        (0, proefcall) als er een call verstuurd mag worden, anders (hoelang er eerst gewacht moet worden, False).
+        """
+        with self._lock:
+            now = self.clock()
+            if now >= self._resume_at:
+                if self.state == "closed":
+                    return 0.0, False
+                if self.state == "open":
+                    self.state = "half_open"  # Deze call is de proefcall
+                    return 0.0, True
+                wait_seconds = max(self.reset_seconds / 10, 0.001)  # Wacht op de uitkomst van de proefcall
+            else:
+                wait_seconds = self._resume_at - now
+            if waited + wait_seconds > self.max_wait_seconds:
+                raise CircuitOpenError(f"Geen LLM calls meer na {waited:.0f} s wachten op de provider")
+            self.stats["paused_seconds"] += wait_seconds
+        return wait_seconds, False
+
+    def before_call(self) -> bool:
+        """
+        Wacht tot er weer een call verstuurd mag worden (pauzeert de aanroepende thread). Geeft True als
+        dit de proefcall is; die moet daarna altijd release_probe() aanroepen.
+        """
+        waited = 0.0
+        while True:
+            wait_seconds, probe = self._wait_seconds(waited)
+            if not wait_seconds:
+                return probe
+            self.sleep(wait_seconds)
+            waited += wait_seconds
+
+    async def before_call_async(self) -> bool:
+        """Als before_call, maar pauzeert alleen de aanroepende taak."""
+        waited = 0.0
+        while True:
+            wait_seconds, probe = self._wait_seconds(waited)
+            if not wait_seconds:
+                return probe
+            await self.async_sleep(wait_seconds)
+            waited += wait_seconds
+
+    def release_probe(self):
+        """
+        Einde van de proefcall. Zonder uitkomst (opgegeven, geannuleerd, onverwachte fout) staat de breaker
+        nog op half_open; dan weer open, zodat de volgende call de proef doet in plaats van te blijven wachten.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._failures = 0
+                self._resume_at = max(self._resume_at, self.clock() + self.reset_seconds)
+                self.stats["circuit_opened"] += 1
+
+    def record_rate_limit(self, seconds: Optional[float]):
+        """
+        Rate limit: laat alle calls `seconds` wachten, zonder de breaker te openen. Kreeg de proefcall de rate
+        limit, dan gaat de breaker terug naar open en doet de eerste call na het wachten een nieuwe proef.
+        """
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+            if seconds is not None:
+                self._resume_at = max(self._resume_at, self.clock() + seconds)
+
+
+class Resilience:
+    """Retry-beleid, circuit breaker, hedging en tellers; één instantie gedeeld door alle threads."""
+    def __init__(self, max_retries: int = MAX_RETRIES, backoff_base_seconds: float = BACKOFF_BASE_SECONDS,
+                 backoff_max_seconds: float = BACKOFF_MAX_SECONDS, hedge_after: Optional[float] = HEDGE_AFTER_SECONDS,
+                 breaker: Optional[CircuitBreaker] = None, sleep: Callable[[float], None] = time.sleep, seed: Optional[int] = None,
+                 async_sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker(sleep=sleep, async_sleep=async_sleep)
+        self.sleep = sleep
+        self.async_sleep = async_sleep
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "rate_limited": 0, "transient_errors": 0,
+                      "fatal_errors": 0, "gave_up": 0, "hedges": 0, "hedges_won": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_statistics(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self.stats, **self.breaker.stats)
+
+    def call(self, func: Callable[[], Any]) -> Tuple[Any, int]:
+        """Voer func uit met retries; geeft (resultaat, aantal retries) terug of de laatste fout."""
+        self._count("calls")
+        attempt = 0
+        while True:
+            probe = self.breaker.before_call()
+            self._count("attempts")
+            try:
+                result = self._attempt(func)
+                self.breaker.record_success()
+            except Exception as error:
+                delay = self._retry_delay(error, attempt)
+                if delay is None:
+                    raise
+            else:
+                return result, attempt
+            finally:
+                if probe:
+                    self.breaker.release_probe()  # Ook bij BaseException (bijv. KeyboardInterrupt)
+            self.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, func: Callable[[], Awaitable[Any]]) -> Tuple[Any, int]:
+        """Als call, voor een coroutine functie; het wachten blokkeert de event loop niet."""
+        self._count("calls")
+        attempt = 0
+        while True:
+            probe = await self.breaker.before_call_async()
+            self._count("attempts")
+            try:
+                result = await self._attempt_async(func)
+                self.breaker.record_success()
+            except Exception as error:
+                delay = self._retry_delay(error, attempt)
+                if delay is None:
+                    raise
+            else:
+                return result, attempt
+            finally:
+                if probe:
+                    self.breaker.release_probe()  # Ook bij annuleren (CancelledError is een BaseException)
+            await self.async_sleep(delay)
+            attempt += 1
+
+    def _retry_delay(self, error: Exception, attempt: int) -> Optional[float]:
+        """Verwerk een mislukte poging: de wachttijd voor de volgende, of None als de fout door moet."""
+        kind = classify_error(error)
+        if kind == "fatal":
+            self.breaker.record_success()  # De provider heeft wel geantwoord
+            self._count("fatal_errors")
+            return None
+        retry_after = retry_after_seconds(error)
+        if kind == "rate_limit":
+            self._count("rate_limited")
+            self.breaker.record_rate_limit(retry_after)
+        else:
+            self._count("transient_errors")
+            self.breaker.record_failure()
+        if attempt >= self.max_retries:
+            self._count("gave_up")
+            return None
+        with self._lock:
+            self.stats["retries"] += 1
+            return backoff_delay(attempt, retry_after, self._rng, self.backoff_base_seconds, self.backoff_max_seconds)
+
+    def _attempt(self, func: Callable[[], Any]) -> Any:
+        """Eén poging; met hedge_after een tweede gelijke call als de eerste te lang duurt."""
+        if self.hedge_after is None:
+            return func()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=HEDGE_MAX_WORKERS, thread_name_prefix="llm-hedge")
+            executor = self._executor
+        primary = executor.submit(func)
+        try:
+            return primary.result(timeout=self.hedge_after)
+        except FuturesTimeoutError:
+            pass
+        self._count("hedges")
+        hedge = executor.submit(func)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count("hedges_won")
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    async def _attempt_async(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Als _attempt, met taken in de event loop; de verliezer van een hedge wordt geannuleerd."""
+        if self.hedge_after is None:
+            return await func()
+        primary = asyncio.ensure_future(func())
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        self._count("hedges")
+        hedge = asyncio.ensure_future(func())
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    if task is hedge:
+                        self._count("hedges_won")
+                    return task.result()
+                error = error or task.exception()
+        raise error
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+class ResilientBackend(LLMBackend):
+    """Backend die elke call van `backend` door een (gedeelde) Resilience laat lopen."""
+    def __init__(self, backend: LLMBackend, resilience: Optional[Resilience] = None):
+        self.backend = backend
+        self.resilience = resilience or Resilience()
+
+    def parse(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        response, retries = self.resilience.call(lambda: self.backend.parse(
+            model=model, messages=messages, response_format=response_format, temperature=temperature
+        ))
+        set_call_retries(retries)
+        return response
+
+    async def parse_async(self, model: str, messages: List[dict], response_format: type, temperature: float) -> Any:
+        response, retries = await self.resilience.call_async(lambda: self.backend.parse_async(
+            model=model, messages=messages, response_format=response_format, temperature=temperature
+        ))
+        set_call_retries(retries)
+        return response
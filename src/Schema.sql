@@ -35,8 +35,9 @@ CREATE TABLE IF NOT EXISTS medicine_information (
 -- Stap 3: Gegenereerde quizvraag
 CREATE TABLE IF NOT EXISTS generated_quiz_questions (
    id INTEGER PRIMARY KEY,
-   quiz_question_uuid TEXT,
-   information_id INTEGER,
+   quiz_question_uuid TEXT,                 -- Eigen identifier van de vraag
+   information_id INTEGER,                  -- De opgehaalde informatie (één rij per geselecteerd medicijn)
+   kenniscategorie TEXT,                    -- Kenniscategorie van de vraag
    introductie TEXT,
    vraag TEXT,
    antwoordoptie_1 TEXT,
@@ -47,8 +48,7 @@ CREATE TABLE IF NOT EXISTS generated_quiz_questions (
    uitleg TEXT,
    llm_raw_output TEXT,
    timestamp_gegenereerd TEXT,
-   FOREIGN KEY(information_id) REFERENCES information(id),
-   FOREIGN KEY(quiz_question_uuid) REFERENCES information(quiz_question_uuid)
+   FOREIGN KEY(information_id) REFERENCES medicine_information(id)
 );
 
 -- Stap 3: Evaluatie
@@ -68,7 +68,7 @@ CREATE TABLE IF NOT EXISTS evaluations (
    aangepaste_uitleg TEXT,
    timestamp TEXT,
    FOREIGN KEY(quiz_question_id) REFERENCES generated_quiz_questions(id),
-   FOREIGN KEY(quiz_question_uuid) REFERENCES information(quiz_question_uuid)
+   FOREIGN KEY(quiz_question_uuid) REFERENCES generated_quiz_questions(quiz_question_uuid)
 );
 
 -- Goedgekeurde quizvraag
@@ -88,7 +88,7 @@ CREATE TABLE IF NOT EXISTS approved_questions (
    timestamp_goedgekeurd TEXT,
    FOREIGN KEY(quiz_question_id) REFERENCES generated_quiz_questions(id),
    FOREIGN KEY(evaluation_id) REFERENCES evaluations(id),
-   FOREIGN KEY(quiz_question_uuid) REFERENCES information(quiz_question_uuid)
+   FOREIGN KEY(quiz_question_uuid) REFERENCES generated_quiz_questions(quiz_question_uuid)
 );
 
 -- Gebruik van de vraag
@@ -104,7 +104,7 @@ CREATE TABLE IF NOT EXISTS question_usage (
    gegeven_antwoorden_4 INTEGER,
    percentage_juist REAL,
    FOREIGN KEY(approved_question_id) REFERENCES approved_questions(id),
-   FOREIGN KEY(quiz_question_uuid) REFERENCES information(quiz_question_uuid)
+   FOREIGN KEY(quiz_question_uuid) REFERENCES generated_quiz_questions(quiz_question_uuid)
 );
 
 CREATE TABLE IF NOT EXISTS quiz_questions (
@@ -122,6 +122,23 @@ CREATE TABLE IF NOT EXISTS quiz_questions (
     timestamp TEXT
 );
 
+-- Tokens, latency en geschatte kosten per LLM call
+CREATE TABLE IF NOT EXISTS llm_calls (
+   id INTEGER PRIMARY KEY,
+   quiz_question_uuid TEXT,                 -- NULL als er geen vraag is opgeslagen
+   stap TEXT,                               -- extractie, generatie, fused of evaluatie
+   model TEXT,
+   kenniscategorie TEXT,
+   prompt_tokens INTEGER,
+   completion_tokens INTEGER,
+   cached_tokens INTEGER,                   -- Deel van prompt_tokens uit de prompt cache
+   latency_ms REAL,                         -- Wandkloktijd van de call
+   retries INTEGER,
+   kosten REAL,                             -- Geschatte kosten in dollar
+   timestamp TEXT,
+   FOREIGN KEY(quiz_question_uuid) REFERENCES generated_quiz_questions(quiz_question_uuid)
+);
+
 CREATE TABLE IF NOT EXISTS process_logs (
     id INTEGER PRIMARY KEY,
     event_type TEXT,
@@ -129,4 +146,15 @@ CREATE TABLE IF NOT EXISTS process_logs (
     category TEXT,
     message TEXT,
     timestamp TEXT
-);
\ No newline at end of file
+);
+-- Indexen voor de kolommen waarop wordt gezocht en gekoppeld
+-- (selected_medications.uuid en medicine_information.quiz_question_uuid hebben al een index via UNIQUE)
+CREATE INDEX IF NOT EXISTS idx_selected_medications_atc7 ON selected_medications(atc7_code, medicine_name);
+-- UNIQUE: de foreign keys naar generated_quiz_questions(quiz_question_uuid) hebben een unieke sleutel nodig
+DROP INDEX IF EXISTS idx_generated_quiz_questions_uuid;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_generated_quiz_questions_uuid_unique ON generated_quiz_questions(quiz_question_uuid);
+CREATE INDEX IF NOT EXISTS idx_generated_quiz_questions_information ON generated_quiz_questions(information_id);
+CREATE INDEX IF NOT EXISTS idx_evaluations_uuid ON evaluations(quiz_question_uuid);
+CREATE INDEX IF NOT EXISTS idx_approved_questions_uuid ON approved_questions(quiz_question_uuid);
+CREATE INDEX IF NOT EXISTS idx_question_usage_uuid ON question_usage(quiz_question_uuid);
+CREATE INDEX IF NOT EXISTS idx_llm_calls_uuid ON llm_calls(quiz_question_uuid);
@@ -0,0 +1,184 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+"""
+Pipeline van stappen die via begrensde wachtrijen aan elkaar vastzitten (producer/consumer).
+
+Elke Stage heeft een eigen aantal workers (threads) en een eigen invoerwachtrij van hoogstens
+queue_size items. Een worker pakt een item uit zijn wachtrij, roept de functie van de stap aan en zet
+wat die teruggeeft (nul, één of meer items) in de wachtrij van de volgende stap. Is die wachtrij vol,
+dan wacht de worker (backpressure): een snelle stap loopt hoogstens queue_size items voor op de
+volgende, en alle stappen werken tegelijk aan verschillende items. De uitvoer van de laatste stap
+geeft run() terug, in de volgorde waarin items klaar zijn.
+
+Een fout in de functie stopt de pipeline niet: het item valt af en on_error krijgt (stap, item, fout).
+on_worker_exit wordt in elke worker thread aangeroepen voordat die stopt (bijv. om de database
+verbinding van die thread te sluiten).
+
+get_statistics() geeft per stap: workers, items in en uit, fouten, bezettingsgraad (tijd bezig /
+(workers x looptijd)), tijd wachtend op een volle volgende wachtrij en de gemiddelde en maximale
+diepte van de invoerwachtrij (gemeten telkens als een worker een item pakt). De stap met een
+bezettingsgraad bij 100% en een volle wachtrij ervoor is de bottleneck; meer workers daar helpt.
+"""
+
+QUEUE_SIZE = 16
+
+_DONE = object()  # Einde van de invoer; één per worker van de stap
+
+
+class Stage:
+    """Eén stap: func(item) geeft een iterable met de items voor de volgende stap terug."""
+    def __init__(self, name: str, func: Callable[[Any], Optional[Iterable[Any]]], workers: int = 1,
+                 queue_size: int = QUEUE_SIZE):
+        if workers < 1:
+            raise ValueError(f"Stap '{name}' heeft minstens één worker nodig")
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue_size = queue_size
+
+
+class StagedPipeline:
+    """Voert de stappen met hun eigen workers gelijktijdig uit, verbonden door begrensde wachtrijen."""
+    def __init__(self, stages: List[Stage], source_name: str = "bron",
+                 on_error: Optional[Callable[[str, Any, Exception], None]] = None,
+                 on_worker_exit: Optional[Callable[[], None]] = None):
+        if not stages:
+            raise ValueError("Een pipeline heeft minstens één stap nodig")
+        self.stages = stages
+        self.source_name = source_name
+        self.on_error = on_error
+        self.on_worker_exit = on_worker_exit
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in stages]
+        self._stats = {name: {"items": 0, "out": 0, "errors": 0, "busy_seconds": 0.0, "blocked_seconds": 0.0,
+                              "depth_total": 0, "depth_samples": 0, "queue_max": 0}
+                       for name in [source_name] + [stage.name for stage in stages]}
+        self._live = [stage.workers for stage in stages]
+        self._results: List[Any] = []
+        self._lock = threading.Lock()
+        self._started: Optional[float] = None
+        self._finished: Optional[float] = None
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """Voer alle items door de stappen; geeft de uitvoer van de laatste stap terug."""
+        self._started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._work, args=(index,), name=f"pipeline-{stage.name}-{worker}", daemon=True)
+            for index, stage in enumerate(self.stages) for worker in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            # De bron draait in deze thread en wacht als de eerste stap achterloopt
+            iterator = iter(items)
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                busy_seconds = time.perf_counter() - start
+                self._count(self.source_name, items=1, out=1, busy_seconds=busy_seconds,
+                            blocked_seconds=self._put(0, item))
+        finally:
+            # Ook bij een fout in de bron: workers maken hun werk af en stoppen
+            for _ in range(self.stages[0].workers):
+                self._queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+            self._finished = time.perf_counter()
+        return self._results
+
+    def _put(self, index: int, item: Any) -> float:
+        """Zet item in de wachtrij van stap `index`; geeft de tijd terug dat de wachtrij vol was."""
+        start = time.perf_counter()
+        self._queues[index].put(item)
+        return time.perf_counter() - start
+
+    def _count(self, name: str, **amounts):
+        with self._lock:
+            stats = self._stats[name]
+            for key, amount in amounts.items():
+                stats[key] += amount
+
+    def _work(self, index: int):
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        try:
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    break
+                depth = inbox.qsize()
+                with self._lock:
+                    stats = self._stats[stage.name]
+                    stats["depth_total"] += depth
+                    stats["depth_samples"] += 1
+                    stats["queue_max"] = max(stats["queue_max"], depth + 1)  # Inclusief dit item
+                start = time.perf_counter()
+                try:
+                    outputs = list(stage.func(item) or [])
+                    errors = 0
+                except Exception as error:
+                    outputs, errors = [], 1
+                    self._report_error(stage.name, item, error)
+                busy_seconds = time.perf_counter() - start
+                blocked_seconds = 0.0
+                if index + 1 < len(self.stages):
+                    for output in outputs:
+                        blocked_seconds += self._put(index + 1, output)
+                else:
+                    with self._lock:
+                        self._results.extend(outputs)
+                self._count(stage.name, items=1, out=len(outputs), errors=errors, busy_seconds=busy_seconds,
+                            blocked_seconds=blocked_seconds)
+        finally:
+            try:
+                if self.on_worker_exit:
+                    self.on_worker_exit()
+            finally:
+                with self._lock:
+                    self._live[index] -= 1
+                    last = self._live[index] == 0
+                # De laatste worker van deze stap sluit de volgende stap af
+                if last and index + 1 < len(self.stages):
+                    for _ in range(self.stages[index + 1].workers):
+                        self._queues[index + 1].put(_DONE)
+
+    def _report_error(self, stage_name: str, item: Any, error: Exception):
+        if self.on_error is None:
+            return
+        try:
+            self.on_error(stage_name, item, error)
+        except Exception:
+            pass  # Een fout bij het melden mag de worker niet stoppen, anders loopt de pipeline vast
+
+    @property
+    def elapsed_seconds(self) -> float:
+        """Looptijd van run() tot nu toe."""
+        if self._started is None:
+            return 0.0
+        return (self._finished or time.perf_counter()) - self._started
+
+    def get_statistics(self) -> Dict[str, Dict[str, float]]:
+        """Tellers, bezettingsgraad en wachtrijdiepte per stap (de bron eerst)."""
+        elapsed = self.elapsed_seconds
+        workers = {self.source_name: 1, **{stage.name: stage.workers for stage in self.stages}}
+        result = {}
+        with self._lock:
+            for name, stats in self._stats.items():
+                samples = stats["depth_samples"]
+                result[name] = {
+                    "workers": workers[name],
+                    "items": stats["items"],
+                    "out": stats["out"],
+                    "errors": stats["errors"],
+                    "busy_seconds": stats["busy_seconds"],
+                    "blocked_seconds": stats["blocked_seconds"],
+                    "utilisation": stats["busy_seconds"] / (workers[name] * elapsed) if elapsed else 0.0,
+                    "queue_avg": stats["depth_total"] / samples if samples else 0.0,
+                    "queue_max": stats["queue_max"],
+                }
+        return result
@@ -0,0 +1,193 @@
+import sys
+import os
+
+# Add the project root and src directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import unittest
+import asyncio
+import sqlite3
+import tempfile
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+import AsyncQuestionEngine
+import GenerateQuestion
+from AsyncQuestionEngine import AsyncQuestionEngine as Engine, TokenBucket, RateLimiter
+from BuildQuestionDatabase import DatabaseManager, QuestionGenerator
+from LLMBackend import FakeLLMBackend
+from ResilientBackend import Resilience
+from OutputModels import Response, Extraction
+
+
+def fake_question(medicine_name: str) -> Response:
+    return Response(steps=[], final_resolution=Response.FinalResolution(
+        introductie=f"Introductie over {medicine_name}",
+        vraag="Vraag",
+        antwoordopties=["A", "B", "C", "D"],
+        antwoord="A",
+        uitleg="Uitleg",
+        verificatie=Response.SelfVerification(check_accuracy="", check_clarity="", check_fairness="", improvements=[])
+    ))
+
+
+class FakeAsyncClient:
+    """Stand-in for AsyncOpenAI: every call takes `latency` seconds and reports `tokens` tokens."""
+    def __init__(self, latency: float = 0.05, tokens: int = 100):
+        self.latency = latency
+        self.tokens = tokens
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(parse=self.parse)))
+
+    async def parse(self, model, response_format, temperature, messages):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        if response_format is Extraction:
+            parsed = Extraction(relevant_information="Informatie")
+        else:
+            parsed = fake_question(messages[-1]["content"].split()[5])
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(parsed=parsed))],
+            usage=SimpleNamespace(total_tokens=self.tokens)
+        )
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_waits_for_refill(self):
+        """
+        Test that acquiring beyond the burst waits for the refill rate.
+        """
+        async def acquire_all():
+            bucket = TokenBucket(per_minute=600, burst_seconds=0.5)  # 10 per seconde, buffer van 5
+            start = time.monotonic()
+            for _ in range(10):
+                await bucket.acquire(1)
+            return time.monotonic() - start
+
+        self.assertAlmostEqual(asyncio.run(acquire_all()), 0.5, delta=0.15)
+
+    def test_record_actual_tokens(self):
+        """
+        Test that the token estimate is corrected with the actual usage.
+        """
+        async def run():
+            limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=6000, burst_seconds=1)
+            await limiter.acquire(50)
+            limiter.record(50, 80)
+            return limiter.tokens.tokens
+
+        self.assertAlmostEqual(asyncio.run(run()), 100 - 80, delta=1)
+
+
+class TestAsyncQuestionEngine(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        patcher = patch.object(AsyncQuestionEngine, "load_cached_extraction", return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(AsyncQuestionEngine, "save_extraction")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.jobs = [
+            {"medicine_name": f"medicijn_{i}", "medicine_info": "Informatie", "category": "bijwerkingen"}
+            for i in range(8)
+        ]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_concurrency_limit(self):
+        """
+        Test that jobs run concurrently, but never more than max_concurrency at once.
+        """
+        client = FakeAsyncClient(latency=0.05)
+        engine = Engine(client=client, max_concurrency=4, requests_per_minute=60_000, tokens_per_minute=10_000_000)
+        start = time.monotonic()
+        results = engine.run_jobs(self.jobs)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(client.max_in_flight, 4)
+        self.assertLess(elapsed, 8 * 2 * 0.05 / 2)  # Serieel zou 0.8 s duren
+        self.assertEqual([r["question"].introductie for r in results],
+                         [f"Introductie over {job['medicine_name']}" for job in self.jobs])
+        self.assertEqual(engine.stats["requests"], 16)
+        self.assertEqual(engine.stats["tokens"], 1600)
+
+    def test_requests_per_minute_limit(self):
+        """
+        Test that the request rate stays within requests_per_minute, whatever the concurrency.
+        """
+        client = FakeAsyncClient(latency=0)
+        engine = Engine(client=client, max_concurrency=8, requests_per_minute=1200, tokens_per_minute=10_000_000)
+        start = time.monotonic()
+        engine.run_jobs(self.jobs)
+        # 16 requests met 20 per seconde en een buffer van 20: de eerste 16 passen in de buffer
+        self.assertLess(time.monotonic() - start, 0.3)
+
+        engine = Engine(client=client, max_concurrency=8, requests_per_minute=600, tokens_per_minute=10_000_000)
+        start = time.monotonic()
+        engine.run_jobs(self.jobs)
+        # 10 per seconde met een buffer van 10: 6 requests moeten wachten
+        self.assertGreaterEqual(time.monotonic() - start, 0.5)
+
+    def test_fake_backend_through_shared_resilience(self):
+        """
+        Test that without a client the engine uses the configured backend, with the shared retries and counters.
+        """
+        fake = FakeLLMBackend(latency=0.01, failure_rate=1.0, failures_per_prompt=1)
+        GenerateQuestion.set_llm_backend(fake)
+        GenerateQuestion.set_resilience(Resilience(backoff_base_seconds=0.001))
+        self.addCleanup(GenerateQuestion.set_llm_backend, None)
+        self.addCleanup(GenerateQuestion.set_resilience, None)
+        for job in self.jobs:
+            job["medicine_info"] = f"Informatie over {job['medicine_name']}"  # Een eigen extractieprompt per job
+        engine = Engine(max_concurrency=4, requests_per_minute=60_000, tokens_per_minute=10_000_000)
+        with patch.object(AsyncQuestionEngine, "initialize_async_openai_client", side_effect=AssertionError):
+            results = engine.run_jobs(self.jobs)
+
+        self.assertTrue(all(result["error"] is None for result in results))
+        # Elke prompt faalt één keer: per job een retry bij de extractie en bij de vraag
+        self.assertEqual(fake.stats["calls"], 32)
+        self.assertEqual([[call["retries"] for call in result["job"]["llm_calls"]] for result in results], [[1, 1]] * 8)
+        statistics = GenerateQuestion.get_resilience_statistics()
+        self.assertEqual((statistics["calls"], statistics["retries"]), (16, 16))
+
+    def test_results_persisted_through_database_manager(self):
+        """
+        Test that every result and failure is passed to on_result, which stores it via DatabaseManager.
+        """
+        db_manager = DatabaseManager(db_path=os.path.join(self.temp_dir.name, "QuizQuestions.db"))
+        question_generator = QuestionGenerator(debug_mode=False)
+        self.jobs.append({"medicine_name": "kapot", "medicine_info": None, "category": "bijwerkingen"})
+        failures = []
+
+        def on_result(job, question, error):
+            if error:
+                failures.append(job["medicine_name"])
+                return
+            data = question_generator.process_question(job["medicine_name"], question, job["category"])
+            db_manager.save_quiz_question(
+                kenniscategorie=data["categorie"], introductie=data["introductie"], vraag=data["vraag"],
+                antwoordopties=data["antwoordopties"], juiste_antwoord=data["antwoord"], uitleg=data["uitleg"]
+            )
+
+        with patch.object(AsyncQuestionEngine, "build_extraction_messages",
+                          side_effect=lambda info, category: [{"role": "user", "content": info + category}]):
+            Engine(client=FakeAsyncClient(latency=0.01), on_result=on_result).run_jobs(self.jobs)
+
+        self.assertEqual(failures, ["kapot"])
+        conn = sqlite3.connect(db_manager.db_path)
+        rows = conn.execute('''
+            SELECT kenniscategorie, antwoordoptie_4 FROM generated_quiz_questions
+        ''').fetchall()
+        conn.close()
+        self.assertEqual(rows, [("bijwerkingen", "D")] * 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
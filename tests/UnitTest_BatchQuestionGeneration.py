@@ -0,0 +1,119 @@
+import sys
+import os
+
+# Add the project root and src directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import unittest
+import json
+import sqlite3
+import tempfile
+from unittest.mock import patch
+import BuildQuestionDatabase
+import GetMedicineInfo
+from BatchQuestionGeneration import (
+    MODEL, BatchQuestionGenerator, LocalBatchBackend, local_responder, response_format_param
+)
+from LLMBackend import estimate_cost
+from OutputModels import Extraction
+
+
+class TestBatchQuestionGeneration(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        GetMedicineInfo.set_cache_path(os.path.join(self.temp_dir.name, "MedicineInformation.db"))
+        self.backend = LocalBatchBackend(os.path.join(self.temp_dir.name, "backend"), polls_until_complete=3)
+        self.jobs = [
+            {"medicine_name": "metoprolol", "medicine_info": "Metoprolol vertraagt de hartslag.", "category": "werkingsmechanisme"},
+            {"medicine_name": "pantoprazol", "medicine_info": "Pantoprazol remt de aanmaak van maagzuur.", "category": "indicaties"},
+        ]
+
+    def tearDown(self):
+        GetMedicineInfo.get_cache().close()
+        GetMedicineInfo._cache = None
+        self.temp_dir.cleanup()
+
+    def generator(self) -> BatchQuestionGenerator:
+        return BatchQuestionGenerator(self.backend, os.path.join(self.temp_dir.name, "werk"), poll_interval=0)
+
+    def test_batch_file_format(self):
+        """
+        Test that each line of the batch file is a complete chat completions request with a strict schema.
+        """
+        self.generator().generate(self.jobs)
+        with open(os.path.join(self.temp_dir.name, "werk", "vragen.jsonl"), "r", encoding="utf-8") as f:
+            lines = [json.loads(line) for line in f]
+        self.assertEqual([line["custom_id"] for line in lines], ["vraag-0", "vraag-1"])
+        self.assertEqual(lines[0]["url"], "/v1/chat/completions")
+        self.assertEqual(lines[0]["body"]["response_format"]["json_schema"]["name"], "Response")
+        self.assertTrue(lines[0]["body"]["response_format"]["json_schema"]["strict"])
+
+    def test_response_format_without_private_sdk_module(self):
+        """
+        Test that a missing private SDK helper gives a clear error instead of an ImportError deep in the batch flow.
+        """
+        with patch.dict(sys.modules, {"openai.lib._parsing._completions": None}):
+            with self.assertRaisesRegex(RuntimeError, "openai>=1.40"):
+                response_format_param(Extraction)
+
+    def test_generate_with_cached_extraction_and_failures(self):
+        """
+        Test that cached extractions are not resubmitted and failed requests end up as job errors.
+        """
+        self.generator().generate(self.jobs[:1])
+
+        def responder(body):
+            if "pantoprazol" in json.dumps(body):
+                raise RuntimeError("server error")
+            return local_responder(body)
+
+        self.backend.responder = responder
+        results = self.generator().generate(self.jobs)
+        with open(os.path.join(self.temp_dir.name, "werk", "extracties.jsonl"), "r", encoding="utf-8") as f:
+            self.assertEqual([json.loads(line)["custom_id"] for line in f], ["extractie-1"])
+        self.assertIsNotNone(results[0]["question"])
+        self.assertIsNone(results[1]["question"])
+        self.assertIn("server error", str(results[1]["error"]))
+        # Alleen de ingediende requests tellen als call; het mislukte request zonder tokens
+        self.assertEqual([call["stap"] for call in self.jobs[0]["llm_calls"]], ["generatie"])
+        calls = [(call["stap"], call["prompt_tokens"] > 0) for call in self.jobs[1]["llm_calls"]]
+        self.assertEqual(calls, [("extractie", True), ("generatie", False)])
+
+    def test_pipeline_ingests_results(self):
+        """
+        Test that the pipeline stores batch results in generated_quiz_questions.
+        """
+        db_manager = BuildQuestionDatabase.DatabaseManager(db_path=os.path.join(self.temp_dir.name, "QuizQuestions.db"))
+        with patch.object(BuildQuestionDatabase, "DatabaseManager", return_value=db_manager), \
+                patch.object(BuildQuestionDatabase, "BATCH_DIR", os.path.join(self.temp_dir.name, "batches")):
+            # Direct klaar, zodat de pipeline niet hoeft te wachten
+            self.backend.polls_until_complete = 1
+            pipeline = BuildQuestionDatabase.QuizGenerationPipeline(debug_mode=False, batch_backend=self.backend)
+            medicine_info = {"C07AB": {"cluster_name": "Selectieve beta-blokkers", "medications": {
+                "metoprolol": {"info": {"url": "", "relevant_information": "Metoprolol vertraagt de hartslag."},
+                               "sections": None, "atc7": "C07AB02", "brand": ""}
+            }}}
+            questions = pipeline._generate_questions_batch(medicine_info)
+
+        self.assertEqual(len(questions), 1)
+        conn = sqlite3.connect(db_manager.db_path)
+        rows = conn.execute("SELECT quiz_question_uuid, antwoordoptie_1 FROM generated_quiz_questions").fetchall()
+        calls = conn.execute('''
+            SELECT quiz_question_uuid, stap, model, prompt_tokens, completion_tokens, latency_ms, kosten
+            FROM llm_calls ORDER BY id
+        ''').fetchall()
+        conn.close()
+        self.assertEqual(rows, [(questions[0]["metadata"]["quiz_question_uuid"], "Optie A")])
+        # Tokens uit de usage van de batch resultaten, kosten tegen de halve prijs
+        self.assertEqual([(uuid, stap, model) for uuid, stap, model, *_ in calls],
+                         [(rows[0][0], "extractie", MODEL), (rows[0][0], "generatie", MODEL)])
+        for _, _, _, prompt_tokens, completion_tokens, latency_ms, kosten in calls:
+            self.assertEqual((completion_tokens, latency_ms), (100, None))
+            self.assertGreater(prompt_tokens, 0)
+            self.assertAlmostEqual(kosten, estimate_cost(MODEL, prompt_tokens, 0, completion_tokens) / 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,338 @@
+import sys
+import os
+
+# Add the project root and src directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import unittest
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch
+import BuildQuestionDatabase
+import GenerateQuestion
+import GetMedicineInfo
+from BuildQuestionDatabase import DatabaseManager
+from LLMBackend import FakeLLMBackend
+
+
+class TestDatabaseManager(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+        self.db_manager = DatabaseManager(db_path=os.path.join(self.temp_dir.name, "QuizQuestions.db"))
+        self.addCleanup(self.db_manager.close)
+
+    def count(self, table: str) -> int:
+        conn = sqlite3.connect(self.db_manager.db_path)
+        count = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        conn.close()
+        return count
+
+    def save_question(self) -> str:
+        return self.db_manager.save_quiz_question(
+            kenniscategorie="bijwerkingen", introductie="Introductie", vraag="Vraag",
+            antwoordopties=["A", "B", "C", "D"], juiste_antwoord="A", uitleg="Uitleg"
+        )
+
+    def test_one_connection_in_wal_mode(self):
+        """
+        Test that a thread reuses one connection, in WAL mode with synchronous=NORMAL.
+        """
+        conn = self.db_manager._connect()
+        self.save_question()
+        self.db_manager.log_process("info", "metoprolol", "", "Regel")
+        self.assertIs(self.db_manager._connect(), conn)
+        self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)
+        self.assertEqual((self.count("generated_quiz_questions"), self.count("process_logs")), (1, 1))
+
+    def test_transaction_groups_writes(self):
+        """
+        Test that the writes in one transaction block are committed together, or not at all.
+        """
+        with self.db_manager.transaction():
+            quiz_question_uuid = self.save_question()
+            self.db_manager.save_llm_calls(quiz_question_uuid, [{
+                "stap": "generatie", "model": "gpt-4o-mini", "kenniscategorie": None, "prompt_tokens": 10,
+                "completion_tokens": 5, "cached_tokens": 0, "latency_ms": 1.0, "retries": 0, "kosten": None,
+                "timestamp": "2024-01-01T00:00:00"
+            }])
+            self.assertEqual(self.count("generated_quiz_questions"), 0)  # Nog niet vastgelegd
+        self.assertEqual((self.count("generated_quiz_questions"), self.count("llm_calls")), (1, 1))
+
+        with self.assertRaises(ValueError):
+            with self.db_manager.transaction():
+                self.save_question()
+                raise ValueError("fout bij opslaan")
+        self.assertEqual((self.count("generated_quiz_questions"), self.count("llm_calls")), (1, 1))
+
+    def test_foreign_keys_hold_when_enforced(self):
+        """
+        Test that questions and LLM calls, with and without a question, can be saved with foreign_keys=ON.
+        """
+        conn = self.db_manager._connect()
+        conn.execute("PRAGMA foreign_keys = ON")
+        call = {
+            "stap": "generatie", "model": "gpt-4o-mini", "kenniscategorie": None, "prompt_tokens": 10,
+            "completion_tokens": 5, "cached_tokens": 0, "latency_ms": 1.0, "retries": 0, "kosten": None,
+            "timestamp": "2024-01-01T00:00:00"
+        }
+        with self.db_manager.transaction():
+            quiz_question_uuid = self.save_question()
+            self.db_manager.save_llm_calls(quiz_question_uuid, [call])
+        self.db_manager.save_llm_calls(None, [call])
+        self.assertEqual(conn.execute("PRAGMA foreign_key_check").fetchall(), [])
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.db_manager.save_llm_calls("onbekende-vraag", [call])
+        self.assertEqual(self.count("llm_calls"), 2)
+
+    def test_existing_database_gets_new_columns(self):
+        """
+        Test that an existing generated_quiz_questions table without kenniscategorie gets the column.
+        """
+        db_path = os.path.join(self.temp_dir.name, "Oud.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE generated_quiz_questions (id INTEGER PRIMARY KEY, quiz_question_uuid TEXT, "
+                     "information_id INTEGER, introductie TEXT, vraag TEXT, antwoordoptie_1 TEXT, "
+                     "antwoordoptie_2 TEXT, antwoordoptie_3 TEXT, antwoordoptie_4 TEXT, juiste_antwoord TEXT, "
+                     "uitleg TEXT, llm_raw_output TEXT, timestamp_gegenereerd TEXT)")
+        conn.close()
+        db_manager = DatabaseManager(db_path=db_path)
+        self.addCleanup(db_manager.close)
+        db_manager.save_quiz_question(kenniscategorie="bijwerkingen", vraag="Vraag")
+        rows = db_manager._connect().execute("SELECT kenniscategorie FROM generated_quiz_questions").fetchall()
+        self.assertEqual(rows, [("bijwerkingen",)])
+
+    def test_threads_use_own_connections(self):
+        """
+        Test that several threads can write at the same time without losing rows.
+        """
+        def worker():
+            for _ in range(20):
+                self.save_question()
+            self.db_manager.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.count("generated_quiz_questions"), 80)
+
+
+class TestSelectionUuids(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.db_manager = DatabaseManager(db_path=os.path.join(temp_dir.name, "QuizQuestions.db"))
+        self.addCleanup(self.db_manager.close)
+        self.selection = {"selected_clusters": [{
+            "atc5_code": "C07AB", "naam": "Selectieve beta-blokkers", "gewicht": 1.0,
+            "geneesmiddelen": [{"atc7": "C07AB02", "naam": "metoprolol", "gewicht": 1.0}]
+        }]}
+
+    def test_information_uses_uuid_of_this_selection(self):
+        """
+        Test that the information is linked to the UUID of this run's selection, without looking it up.
+        """
+        with patch.object(BuildQuestionDatabase, "DatabaseManager", return_value=self.db_manager):
+            pipeline = BuildQuestionDatabase.QuizGenerationPipeline(debug_mode=False, batch_mode=True)
+        self.db_manager.save_selected_medications(self.selection)  # Eerdere run met hetzelfde medicijn
+        selection_uuids = self.db_manager.save_selected_medications(self.selection)
+        self.assertEqual(list(selection_uuids), [("C07AB02", "metoprolol")])
+
+        info = {"url": "https://www.apotheek.nl/medicijnen/metoprolol", "relevant_information": "Metoprolol."}
+        with patch.object(BuildQuestionDatabase, "get_medicine_info", return_value=info), \
+                patch.object(BuildQuestionDatabase, "load_sections_from_cache", return_value=None), \
+                patch.object(self.db_manager, "_connect", wraps=self.db_manager._connect) as connect:
+            pipeline._get_medicine_information(self.selection, selection_uuids)
+        # Alleen de insert in medicine_information, geen SELECT op selected_medications
+        self.assertEqual(connect.call_count, 1)
+        linked = self.db_manager._connect().execute("SELECT quiz_question_uuid FROM medicine_information").fetchall()
+        self.assertEqual(linked, [(selection_uuids[("C07AB02", "metoprolol")],)])
+
+
+class TestStreamingPipeline(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.db_manager = DatabaseManager(db_path=os.path.join(temp_dir.name, "QuizQuestions.db"))
+        self.addCleanup(self.db_manager.close)
+        GenerateQuestion.set_llm_backend(FakeLLMBackend(latency=0.01))
+        self.addCleanup(GenerateQuestion.set_llm_backend, None)
+        self.selection = {"selected_clusters": [{
+            "atc5_code": "C07AB", "naam": "Selectieve beta-blokkers", "gewicht": 1.0,
+            "geneesmiddelen": [{"atc7": f"C07AB{index:02d}", "naam": f"medicijn{index}", "gewicht": 1.0}
+                               for index in range(6)]
+        }]}
+
+    @staticmethod
+    def get_info(medicine_name, *args, **kwargs):
+        if medicine_name == "medicijn5":
+            return "Geen informatie beschikbaar"
+        return {"url": f"https://example.org/{medicine_name}", "relevant_information": f"{medicine_name} informatie."}
+
+    def run_pipeline(self, get_info=None, extraction_cache=False, **kwargs):
+        with patch.object(BuildQuestionDatabase, "DatabaseManager", return_value=self.db_manager):
+            pipeline = BuildQuestionDatabase.QuizGenerationPipeline(debug_mode=False, batch_mode=True, **kwargs)
+        pipeline.medication_selector.select_medications = lambda atc_cluster=None: self.selection
+        with patch.object(BuildQuestionDatabase, "get_medicine_info", side_effect=get_info or self.get_info), \
+                patch.object(BuildQuestionDatabase, "load_sections_from_cache", return_value=None), \
+                patch.object(GenerateQuestion, "USE_EXTRACTION_CACHE", extraction_cache):
+            questions = pipeline.generate_quiz()
+        return pipeline, questions
+
+    def test_each_medicine_streams_through_all_stages(self):
+        """
+        Test that each medicine is fetched, extracted, generated and saved, with stage statistics per step.
+        """
+        pipeline, questions = self.run_pipeline(stage_workers={"ophalen": 2, "extractie": 2, "generatie": 3})
+        self.assertEqual(sorted(q["metadata"]["medicine_name"] for q in questions),
+                         [f"medicijn{index}" for index in range(5)])
+
+        conn = self.db_manager._connect()
+        rows = conn.execute("SELECT quiz_question_uuid, kenniscategorie FROM generated_quiz_questions").fetchall()
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(all(category for _, category in rows))  # De gekozen categorie wordt opgeslagen
+        # Eén informatierij per medicijn, gekoppeld aan de selectie; elke vraag verwijst naar die van zijn medicijn
+        linked = conn.execute('''
+            SELECT COUNT(*) FROM generated_quiz_questions q
+            JOIN medicine_information i ON i.id = q.information_id
+            JOIN selected_medications s ON s.uuid = i.quiz_question_uuid
+            WHERE i.bron_url = 'https://example.org/' || s.medicine_name
+        ''').fetchone()[0]
+        information_rows = conn.execute("SELECT COUNT(*) FROM medicine_information").fetchone()[0]
+        self.assertEqual((information_rows, linked), (5, 5))
+        calls = conn.execute("SELECT quiz_question_uuid, stap FROM llm_calls ORDER BY id").fetchall()
+        self.assertEqual(sorted(stap for _, stap in calls), ["extractie"] * 5 + ["generatie"] * 5)
+        self.assertEqual({uuid for uuid, _ in calls}, {uuid for uuid, _ in rows})
+
+        stages = pipeline.question_generator.stats_manager.stats["stages"]
+        self.assertEqual(list(stages), ["selectie", "ophalen", "extractie", "generatie", "opslaan"])
+        self.assertEqual((stages["selectie"]["out"], stages["ophalen"]["out"], stages["opslaan"]["out"]), (6, 5, 5))
+        self.assertEqual(stages["generatie"]["workers"], 3)
+        self.assertEqual(len(pipeline.question_generator.stats_manager.stats["failed_medications"]), 1)
+
+    def test_second_run_uses_extraction_cache(self):
+        """
+        Test that a second run over the same cached pages makes no extraction calls, although each fetch has a new date.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        GetMedicineInfo.set_cache_path(os.path.join(temp_dir.name, "MedicineInformation.db"))
+        self.addCleanup(setattr, GetMedicineInfo, "_cache", None)
+        self.addCleanup(lambda: GetMedicineInfo.get_cache().close())
+
+        def get_page(medicine_name, *args, **kwargs):
+            # Paginatekst zoals uit de cache; de pipeline maakt er elke run een dict met de huidige datum van
+            return f"{medicine_name} informatie." if medicine_name != "medicijn5" else "Geen informatie beschikbaar"
+
+        conn = self.db_manager._connect()
+        extraction_calls = []
+        for _ in range(2):
+            # Dezelfde kenniscategorie in beide runs, anders is het een andere extractie
+            with patch.object(BuildQuestionDatabase, "get_random_knowledge_category", return_value="bijwerkingen"):
+                _, questions = self.run_pipeline(get_info=get_page, extraction_cache=True)
+            self.assertEqual(len(questions), 5)
+            extraction_calls.append(conn.execute("SELECT COUNT(*) FROM llm_calls WHERE stap = 'extractie'").fetchone()[0])
+        self.assertEqual(extraction_calls, [5, 5])
+        self.assertEqual(GetMedicineInfo.get_cache().count_extractions(), 5)
+
+    def test_extraction_error_skips_only_that_medicine(self):
+        """
+        Test that an error in one stage is logged for that medicine while the others are saved.
+        """
+        prepare = BuildQuestionDatabase.prepare_relevant_info
+
+        def failing_prepare(medicine_name, *args, **kwargs):
+            if medicine_name == "medicijn2":
+                raise RuntimeError("extractie mislukt")
+            return prepare(medicine_name, *args, **kwargs)
+
+        with patch.object(BuildQuestionDatabase, "prepare_relevant_info", side_effect=failing_prepare):
+            pipeline, questions = self.run_pipeline()
+        self.assertEqual(len(questions), 4)
+        logs = self.db_manager._connect().execute(
+            "SELECT medicine, message FROM process_logs WHERE event_type = 'error'").fetchall()
+        self.assertEqual(logs, [("medicijn2", "Fout bij genereren vraag: extractie mislukt")])
+        self.assertEqual(pipeline.question_generator.stats_manager.stats["stages"]["extractie"]["errors"], 1)
+
+    def test_failed_save_keeps_llm_calls(self):
+        """
+        Test that when saving a medicine's question fails, its question is rolled back but its LLM calls are kept.
+        """
+        save_question = BuildQuestionDatabase.QuizGenerationPipeline._save_question
+
+        def failing_save(pipeline, atc5, cluster_info, med_name, *args):
+            result = save_question(pipeline, atc5, cluster_info, med_name, *args)
+            if med_name == "medicijn2":
+                raise sqlite3.OperationalError("database is locked")
+            return result
+
+        for streaming in (True, False):
+            with self.subTest(streaming=streaming):
+                conn = self.db_manager._connect()
+                conn.execute("DELETE FROM llm_calls")
+                conn.execute("DELETE FROM generated_quiz_questions")
+                conn.commit()
+                with patch.object(BuildQuestionDatabase.QuizGenerationPipeline, "_save_question", autospec=True,
+                                  side_effect=failing_save):
+                    _, questions = self.run_pipeline(streaming=streaming)
+                self.assertEqual(len(questions), 4)
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM generated_quiz_questions").fetchone()[0], 4)
+                calls = conn.execute("SELECT stap FROM llm_calls WHERE quiz_question_uuid IS NULL").fetchall()
+                self.assertEqual(sorted(calls), [("extractie",), ("generatie",)])
+                self.assertEqual(conn.execute("SELECT COUNT(*) FROM llm_calls").fetchone()[0], 10)
+
+
+class TestQueryPlans(unittest.TestCase):
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.db_manager = DatabaseManager(db_path=os.path.join(temp_dir.name, "QuizQuestions.db"))
+        self.addCleanup(self.db_manager.close)
+
+    def plan(self, query: str) -> str:
+        rows = self.db_manager._connect().execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        return "\n".join(row[-1] for row in rows)
+
+    def test_lookups_use_indexes(self):
+        """
+        Test that lookups on quiz_question_uuid, atc7_code and information_id use an index instead of a table scan.
+        """
+        queries = [
+            "SELECT uuid FROM selected_medications WHERE medicine_name = 'metoprolol' AND atc7_code = 'C07AB02'",
+            "SELECT * FROM selected_medications WHERE atc7_code = 'C07AB02'",
+            "SELECT * FROM medicine_information WHERE quiz_question_uuid = 'x'",
+            "SELECT * FROM generated_quiz_questions WHERE quiz_question_uuid = 'x'",
+            "SELECT * FROM generated_quiz_questions WHERE information_id = 1",
+            "SELECT * FROM llm_calls WHERE quiz_question_uuid = 'x'",
+            "SELECT * FROM evaluations WHERE quiz_question_uuid = 'x'",
+        ]
+        for query in queries:
+            with self.subTest(query=query):
+                plan = self.plan(query)
+                self.assertIn("USING", plan)
+                self.assertNotIn("SCAN", plan)
+
+    def test_joins_use_indexes(self):
+        """
+        Test that joining information to its questions and their LLM calls uses an index for every table.
+        """
+        plan = self.plan('''
+            SELECT q.vraag, i.relevante_informatie, c.kosten
+            FROM medicine_information i
+            JOIN generated_quiz_questions q ON q.information_id = i.id
+            JOIN llm_calls c ON c.quiz_question_uuid = q.quiz_question_uuid
+            WHERE i.quiz_question_uuid = 'x'
+        ''')
+        self.assertNotIn("SCAN", plan)
+        self.assertIn("idx_generated_quiz_questions_information", plan)
+        self.assertIn("idx_llm_calls_uuid", plan)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,366 @@
+import sys
+import os
+
+# Add the project root and src directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import unittest
+import sqlite3
+import tempfile
+import threading
+from unittest.mock import patch, MagicMock
+import BuildQuestionDatabase
+import GenerateQuestion
+import GetMedicineInfo
+from OutputModels import Extraction, FusedResponse, Response, LeanResponse, LeanFlagsResponse
+from GenerateQuestion import group_sections, select_sections
+from LLMBackend import OpenAIBackend, FakeLLMBackend, collect_llm_calls
+
+
+class TestSelectSections(unittest.TestCase):
+    def setUp(self):
+        """
+        Sections as parsed from an apotheek.nl page.
+        """
+        self.sections = [
+            ("Belangrijk om te weten over metoprolol", "Metoprolol maakt uw hartslag langzamer."),
+            ("Wat doet metoprolol en waarbij gebruik ik het?", "Metoprolol is een bètablokker."),
+            ("Hoge bloeddruk", "Verschijnselen: meestal geen."),
+            ("Wat zijn mogelijke bijwerkingen?", "Vermoeidheid."),
+            ("Uitleg frequenties", "Regelmatig: bij meer dan 30 op de 100 mensen."),
+            ("Kan ik met dit medicijn autorijden, alcohol drinken en alles eten of drinken?", "Autorijden: pas op."),
+            ("Mag ik zomaar met dit medicijn stoppen?", "Stop niet zomaar."),
+        ]
+
+    def test_group_sections(self):
+        """
+        Test that sub headings are grouped under the main heading above them.
+        """
+        groups = group_sections(self.sections)
+        self.assertEqual([heading for heading, _ in groups], [
+            "Belangrijk om te weten over metoprolol",
+            "Wat doet metoprolol en waarbij gebruik ik het?",
+            "Wat zijn mogelijke bijwerkingen?",
+            "Kan ik met dit medicijn autorijden, alcohol drinken en alles eten of drinken?",
+            "Mag ik zomaar met dit medicijn stoppen?",
+        ])
+        self.assertEqual(len(groups[1][1]), 2)
+
+    def test_select_sections_for_category(self):
+        """
+        Test that only the sections of the category (including sub sections) are returned.
+        """
+        self.assertEqual(
+            select_sections(self.sections, "bijwerkingen"),
+            "Wat zijn mogelijke bijwerkingen?\n\nVermoeidheid.\n\n"
+            "Uitleg frequenties\n\nRegelmatig: bij meer dan 30 op de 100 mensen."
+        )
+        self.assertIn("Hoge bloeddruk", select_sections(self.sections, "indicaties"))
+        self.assertEqual(select_sections(self.sections, "stoppen met gebruik"),
+                         "Mag ik zomaar met dit medicijn stoppen?\n\nStop niet zomaar.")
+
+    def test_select_sections_without_mapping(self):
+        """
+        Test that categories without a mapping, or without matching sections, return None.
+        """
+        self.assertIsNone(select_sections(self.sections, "monitoring"))
+        self.assertIsNone(select_sections(self.sections, "dosering"))
+
+    def test_extract_by_rules(self):
+        """
+        Test that directly mapped categories use the sections, and other or too long sections need the LLM.
+        """
+        extraction = GenerateQuestion.extract_by_rules(self.sections, "bijwerkingen")
+        self.assertEqual(extraction.relevant_information, select_sections(self.sections, "bijwerkingen"))
+        self.assertIsNone(GenerateQuestion.extract_by_rules(self.sections, "werkingsmechanisme"))
+        populations = "bijzondere populaties (bijv. ouderen, obesen, kinderen, zwangeren, borstvoeding)"
+        self.assertIsNone(GenerateQuestion.extract_by_rules(self.sections, populations))  # Geen passende sectie
+        with patch.object(GenerateQuestion, "RULE_BASED_MAX_CHARS", 10):
+            self.assertIsNone(GenerateQuestion.extract_by_rules(self.sections, "bijwerkingen"))
+
+    def test_rule_based_extraction_skips_llm(self):
+        """
+        Test that a question for a directly mapped category makes only the generation call.
+        """
+        backend = FakeLLMBackend()
+        with patch.object(GenerateQuestion, "get_llm_backend", return_value=backend), \
+                patch.object(GenerateQuestion, "get_random_knowledge_category", return_value="rijvaardigheid"), \
+                patch.object(GenerateQuestion, "USE_EXTRACTION_CACHE", False), \
+                collect_llm_calls() as calls:
+            GenerateQuestion.generate_quiz_question("metoprolol", "Volledige tekst", sections=self.sections)
+        self.assertEqual([call["stap"] for call in calls], ["generatie"])
+
+
+class TestOpenAIClient(unittest.TestCase):
+    def tearDown(self):
+        GenerateQuestion._client = None
+
+    def test_client_is_shared_between_threads(self):
+        """
+        Test that concurrent callers get one client, built once, and that closing it builds a new one.
+        """
+        with patch.object(GenerateQuestion, "initialize_openai_client", side_effect=lambda: MagicMock()) as initialize:
+            clients = []
+            threads = [threading.Thread(target=lambda: clients.append(GenerateQuestion.get_openai_client()))
+                       for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(initialize.call_count, 1)
+            self.assertTrue(all(client is clients[0] for client in clients))
+
+            GenerateQuestion.close_openai_client()
+            clients[0].client.close.assert_called_once()
+            self.assertIsNot(GenerateQuestion.get_openai_client(), clients[0])
+
+    def test_client_settings(self):
+        """
+        Test that the client uses the configured timeouts and pool size.
+        """
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "test"}):
+            client = GenerateQuestion.initialize_openai_client()
+        http_client = client.client._client
+        self.assertEqual(http_client.timeout.read, GenerateQuestion.OPENAI_TIMEOUT)
+        self.assertEqual(http_client.timeout.connect, GenerateQuestion.OPENAI_CONNECT_TIMEOUT)
+        self.assertEqual(http_client._transport._pool._max_connections, GenerateQuestion.OPENAI_MAX_CONNECTIONS)
+        client.client.close()
+
+
+class TestExtractionCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        GetMedicineInfo.set_cache_path(os.path.join(self.temp_dir.name, "MedicineInformation.db"))
+        self.client = MagicMock()
+        self.client.beta.chat.completions.parse.return_value.choices[0].message.parsed = Extraction(
+            relevant_information="Vermoeidheid."
+        )
+        self.backend = OpenAIBackend(self.client)
+
+    def tearDown(self):
+        GetMedicineInfo.get_cache().close()
+        GetMedicineInfo._cache = None
+        self.temp_dir.cleanup()
+
+    def test_repeated_extraction_skips_llm(self):
+        """
+        Test that the same text and category are extracted once, and again after the prompt version changes.
+        """
+        for _ in range(2):
+            result = GenerateQuestion.extract_relevant_info(self.backend, "Info", "bijwerkingen", "metoprolol")
+            self.assertEqual(result.relevant_information, "Vermoeidheid.")
+        self.assertEqual(self.client.beta.chat.completions.parse.call_count, 1)
+
+        GenerateQuestion.extract_relevant_info(self.backend, "Info", "dosering", "metoprolol")
+        GenerateQuestion.extract_relevant_info(self.backend, "Andere info", "bijwerkingen", "metoprolol")
+        with patch.object(GenerateQuestion.QuizPrompts, "EXTRACTION_PROMPT_VERSION", 2):
+            GenerateQuestion.extract_relevant_info(self.backend, "Info", "bijwerkingen", "metoprolol")
+        self.assertEqual(self.client.beta.chat.completions.parse.call_count, 4)
+
+    def test_key_ignores_fetch_date(self):
+        """
+        Test that the information dict of two fetches of the same page gives the same key, whatever its date.
+        """
+        first = {"url": "", "date": "2024-01-01T00:00:00", "relevant_information": "Info"}
+        second = dict(first, date="2024-01-02T00:00:00")
+        self.assertEqual(GenerateQuestion.extraction_cache_key(first, "bijwerkingen"),
+                         GenerateQuestion.extraction_cache_key(second, "bijwerkingen"))
+        self.assertEqual(GenerateQuestion.extraction_cache_key(first, "bijwerkingen"),
+                         GenerateQuestion.extraction_cache_key("Info", "bijwerkingen"))
+        self.assertNotEqual(GenerateQuestion.extraction_cache_key(dict(first, relevant_information="Ander"), "bijwerkingen"),
+                            GenerateQuestion.extraction_cache_key(first, "bijwerkingen"))
+
+    def test_without_medicine_name_not_cached(self):
+        """
+        Test that extractions without a medicine name (no way to invalidate them) are not stored.
+        """
+        GenerateQuestion.extract_relevant_info(self.backend, "Info", "bijwerkingen")
+        self.assertEqual(GetMedicineInfo.get_cache().count_extractions(), 0)
+
+
+class TestFusedMode(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.beta.chat.completions.parse.return_value.choices[0].message.parsed = MagicMock(
+            relevant_information="Vermoeidheid."
+        )
+        patcher = patch.object(GenerateQuestion, "get_openai_client", return_value=self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch.object(GenerateQuestion, "USE_EXTRACTION_CACHE", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fused_makes_one_call(self):
+        """
+        Test that fused mode sends the category sections in a single FusedResponse call.
+        """
+        sections = [("Wat zijn mogelijke bijwerkingen?", "Vermoeidheid."), ("Mag ik zomaar stoppen?", "Nee.")]
+        with patch.object(GenerateQuestion, "get_random_knowledge_category", return_value="bijwerkingen"):
+            GenerateQuestion.generate_quiz_question("metoprolol", "Volledige tekst", sections=sections, fused=True)
+        parse = self.client.beta.chat.completions.parse
+        self.assertEqual(parse.call_count, 1)
+        self.assertIs(parse.call_args.kwargs["response_format"], FusedResponse)
+        prompt = "".join(message["content"] for message in parse.call_args.kwargs["messages"])
+        self.assertIn("Vermoeidheid.", prompt)
+        self.assertNotIn("Nee.", prompt)
+
+    def test_two_step_is_default(self):
+        """
+        Test that without fused mode extraction and generation are separate calls.
+        """
+        GenerateQuestion.generate_quiz_question("metoprolol", "Volledige tekst")
+        self.assertEqual(self.client.beta.chat.completions.parse.call_count, 2)
+
+
+class TestPromptCaching(unittest.TestCase):
+    def test_static_prefix_is_identical(self):
+        """
+        Test that questions for different medicines share the same leading system messages.
+        """
+        prefix = GenerateQuestion.static_prefix_messages()
+        for messages in (
+            GenerateQuestion.build_question_messages("metoprolol", "bijwerkingen", "Vermoeidheid."),
+            GenerateQuestion.build_question_messages("pantoprazol", "dosering", "Eén keer per dag."),
+            GenerateQuestion.build_fused_messages("omeprazol", "gebruik", "Voor het ontbijt innemen."),
+        ):
+            self.assertEqual(messages[:len(prefix)], prefix)
+            variable = "".join(message["content"] for message in messages[len(prefix):])
+            self.assertNotIn(variable, "".join(message["content"] for message in prefix))
+
+    def test_usage_statistics(self):
+        """
+        Test that cached prompt tokens are counted per call, extraction calls apart from the prefixed calls,
+        and responses without usage are ignored.
+        """
+        def response(prompt_tokens, cached_tokens):
+            details = MagicMock(cached_tokens=cached_tokens)
+            return MagicMock(usage=MagicMock(prompt_tokens=prompt_tokens, prompt_tokens_details=details))
+
+        start = GenerateQuestion.get_usage_statistics()
+        GenerateQuestion.record_usage(response(2000, 0), "generatie")
+        GenerateQuestion.record_usage(response(2000, 1536), "generatie")
+        GenerateQuestion.record_usage(response(1500, 0), "extractie")
+        GenerateQuestion.record_usage(MagicMock(), "generatie")
+        end = GenerateQuestion.get_usage_statistics()
+        self.assertEqual({key: end[key] - start[key] for key in end},
+                         {"calls": 2, "prompt_tokens": 4000, "cached_tokens": 1536, "cache_hits": 1,
+                          "unprefixed_calls": 1, "unprefixed_prompt_tokens": 1500, "unprefixed_cached_tokens": 0})
+
+        # De hit rate van de run gaat alleen over de calls met de vaste prefix
+        stats_manager = BuildQuestionDatabase.StatisticsManager()
+        stats_manager.set_prompt_cache_statistics(start, end)
+        self.assertAlmostEqual(stats_manager.stats["prompt_cache"]["hit_rate"], 1536 / 4000)
+
+
+class TestMultiQuestion(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeLLMBackend()
+        GenerateQuestion.set_llm_backend(self.backend)
+        self.addCleanup(GenerateQuestion.set_llm_backend, None)
+
+    def test_one_call_for_several_categories(self):
+        """
+        Test that several questions for different categories come from one call with the static prefix once.
+        """
+        with collect_llm_calls() as calls:
+            questions = GenerateQuestion.generate_quiz_questions("metoprolol", "Volledige tekst", num_questions=3)
+        self.assertEqual(len(calls), 1)
+        categories = [category for category, _ in questions]
+        self.assertEqual(len(set(categories)), 3)
+        self.assertTrue(all(category in GenerateQuestion.KNOWLEDGE_CATEGORIES for category in categories))
+
+    def test_variants_use_category_sections(self):
+        """
+        Test that variants for one category get only the sections of that category.
+        """
+        sections = [("Wat zijn mogelijke bijwerkingen?", "Vermoeidheid."), ("Mag ik zomaar stoppen?", "Nee.")]
+        with patch.object(self.backend, "parse", wraps=self.backend.parse) as parse:
+            questions = GenerateQuestion.generate_quiz_questions(
+                "metoprolol", "Volledige tekst", categories=["bijwerkingen"] * 2, sections=sections
+            )
+        self.assertEqual([category for category, _ in questions], ["bijwerkingen", "bijwerkingen"])
+        prompt = "".join(message["content"] for message in parse.call_args.kwargs["messages"])
+        self.assertIn("Vermoeidheid.", prompt)
+        self.assertNotIn("Volledige tekst", prompt)
+
+    def test_pipeline_stores_separate_rows(self):
+        """
+        Test that each question of a multi-question call is validated and stored as its own row.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        db_manager = BuildQuestionDatabase.DatabaseManager(db_path=os.path.join(temp_dir.name, "QuizQuestions.db"))
+        with patch.object(BuildQuestionDatabase, "DatabaseManager", return_value=db_manager):
+            pipeline = BuildQuestionDatabase.QuizGenerationPipeline(debug_mode=False, questions_per_call=3)
+            medicine_info = {"C07AB": {"cluster_name": "Selectieve beta-blokkers", "medications": {
+                "metoprolol": {"info": {"url": "", "relevant_information": "Metoprolol vertraagt de hartslag."},
+                               "sections": None, "atc7": "C07AB02", "brand": ""}
+            }}}
+            questions = pipeline._generate_questions(medicine_info)
+
+        self.assertEqual(len(questions), 3)
+        conn = sqlite3.connect(db_manager.db_path)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM generated_quiz_questions").fetchone()[0], 3)
+        calls = conn.execute("SELECT quiz_question_uuid, kenniscategorie, kosten FROM llm_calls").fetchall()
+        conn.close()
+        self.assertEqual({row[0] for row in calls}, {question["metadata"]["quiz_question_uuid"] for question in questions})
+        self.assertEqual([row[1] for row in calls], [question["question"]["categorie"] for question in questions])
+        self.assertAlmostEqual(calls[0][2] * 3, sum(row[2] for row in calls))
+
+
+
+class TestLeanSchema(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeLLMBackend()
+        GenerateQuestion.set_llm_backend(self.backend)
+        self.addCleanup(GenerateQuestion.set_llm_backend, None)
+        patcher = patch.object(GenerateQuestion, "USE_EXTRACTION_CACHE", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def generate(self, **kwargs):
+        with patch.object(self.backend, "parse", wraps=self.backend.parse) as parse:
+            question = GenerateQuestion.generate_quiz_question("metoprolol", "Metoprolol vertraagt de hartslag.", **kwargs)
+        return question, parse.call_args.kwargs["response_format"]
+
+    def test_schema_selects_response_format(self):
+        """
+        Test that the question call uses the selected schema, with OUTPUT_SCHEMA as default.
+        """
+        question, response_format = self.generate(schema="lean")
+        self.assertIs(response_format, LeanResponse)
+        self.assertIsInstance(question, LeanResponse.FinalResolution)
+        self.assertIs(self.generate()[1], Response)
+        with patch.object(GenerateQuestion, "OUTPUT_SCHEMA", "lean_flags"):
+            self.assertIs(self.generate()[1], LeanFlagsResponse)
+        with self.assertRaises(RuntimeError):
+            self.generate(schema="onbekend")
+
+    def test_lean_questions_pass_validation(self):
+        """
+        Test that lean questions are validated like full ones, keeping only the verification flags.
+        """
+        generator = BuildQuestionDatabase.QuestionGenerator(debug_mode=False)
+        lean = generator.process_question("metoprolol", self.generate(schema="lean")[0])
+        self.assertIn("metoprolol", lean["vraag"])
+        self.assertNotIn("verificatie", lean)
+        flagged = generator.process_question("metoprolol", self.generate(schema="lean_flags")[0])
+        self.assertEqual(flagged["verificatie"], {"accurate": True, "clear": True, "fair": True})
+        self.assertNotIn("verificatie", generator.process_question("metoprolol", self.generate(schema="full")[0]))
+
+    def test_failed_flags_reject_question(self):
+        """
+        Test that a question whose own verification flags report a problem is rejected.
+        """
+        question = self.generate(schema="lean_flags")[0]
+        question.verificatie.accurate = False
+        generator = BuildQuestionDatabase.QuestionGenerator(debug_mode=False)
+        self.assertIsNone(generator.process_question("metoprolol", question))
+        self.assertIn("Zelfcontrole niet geslaagd", generator.stats_manager.stats["errors"][0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,226 @@
+import sys
+import os
+
+# Add the project root and src directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import unittest
+import hashlib
+import json
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+import GetMedicineInfo
+
+PAGES_DIR = os.path.join(project_root, "data", "test_data", "pages")
+
+
+class StubApotheekHandler(BaseHTTPRequestHandler):
+    """Serves the saved pages in data/test_data/pages as /medicijnen/<name>, with ETag revalidation."""
+    requests_seen = []
+
+    def do_GET(self):
+        self.requests_seen.append((self.path, self.headers.get("If-None-Match")))
+        name = self.path.rstrip("/").split("/")[-1]
+        page_path = os.path.join(PAGES_DIR, f"{name}.html")
+        if not os.path.exists(page_path):
+            self.send_response(404)
+            self.end_headers()
+            return
+        with open(page_path, "rb") as f:
+            body = f.read()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", "Mon, 12 May 2025 16:10:08 GMT")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestGetMedicineInfo(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubApotheekHandler)
+        cls.server_thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.server_thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}/medicijnen/"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        GetMedicineInfo.set_cache_path(os.path.join(self.temp_dir.name, "MedicineInformation.db"))
+        patcher = patch.multiple(
+            GetMedicineInfo,
+            BASE_URL=self.base_url,
+            _rate_limiter=GetMedicineInfo.HostRateLimiter(max_concurrent=4, min_interval=0)
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        GetMedicineInfo.get_cache().close()
+        GetMedicineInfo._cache = None
+        self.temp_dir.cleanup()
+
+    def test_fetch_and_cache(self):
+        """
+        Test that a page is fetched from the base URL, parsed and cached.
+        """
+        info = GetMedicineInfo.get_medicine_info("metoprolol", "Selectieve beta-blokkers")
+        self.assertTrue(info.startswith("Belangrijk om te weten over metoprolol"))
+        self.assertEqual(GetMedicineInfo.load_from_cache("metoprolol")["url"], f"{self.base_url}metoprolol")
+        sections = GetMedicineInfo.load_sections_from_cache("metoprolol")
+        self.assertEqual(sections[0][0], "Belangrijk om te weten over metoprolol")
+        self.assertEqual(GetMedicineInfo.sections_to_text(sections), info)
+
+    def test_expired_entry_is_revalidated(self):
+        """
+        Test that an expired entry is revalidated with If-None-Match and only its date is bumped on a 304.
+        """
+        GetMedicineInfo.get_medicine_info("metoprolol", "Selectieve beta-blokkers")
+        entry = GetMedicineInfo.load_from_cache("metoprolol")
+        self.assertIsNotNone(entry["etag"])
+        self.assertEqual(entry["last_modified"], "Mon, 12 May 2025 16:10:08 GMT")
+        GetMedicineInfo.get_cache().touch("metoprolol", "2020-01-01 00:00:00")
+        GetMedicineInfo._memory_cache.clear()
+
+        StubApotheekHandler.requests_seen.clear()
+        with patch.object(GetMedicineInfo, "parse_medicine_sections", side_effect=AssertionError("pagina opnieuw geparsed")):
+            info = GetMedicineInfo.get_medicine_info("metoprolol", "Selectieve beta-blokkers")
+        self.assertEqual(info, entry["info"])
+        self.assertEqual(StubApotheekHandler.requests_seen, [("/medicijnen/metoprolol", entry["etag"])])
+        self.assertNotEqual(GetMedicineInfo.load_from_cache("metoprolol")["date"], "2020-01-01 00:00:00")
+
+    def test_stale_while_revalidate(self):
+        """
+        Test that a stale entry is returned immediately and refreshed in the background.
+        """
+        GetMedicineInfo.save_to_cache("pantoprazol", f"{self.base_url}pantoprazol", "Verouderde informatie", "Protonpompremmers")
+        stale_date = (GetMedicineInfo.datetime.now() - GetMedicineInfo.timedelta(days=GetMedicineInfo.CACHE_EXPIRATION_DAYS + 1))
+        GetMedicineInfo.get_cache().touch("pantoprazol", stale_date.strftime("%Y-%m-%d %H:%M:%S"))
+        GetMedicineInfo._memory_cache.clear()
+
+        info = GetMedicineInfo.get_medicine_info("pantoprazol", "Protonpompremmers", stale_while_revalidate=True)
+        self.assertEqual(info, "Verouderde informatie")
+        GetMedicineInfo.wait_for_background_refreshes(timeout=10)
+        refreshed = GetMedicineInfo.get_medicine_info("pantoprazol", "Protonpompremmers", stale_while_revalidate=True)
+        self.assertTrue(refreshed.startswith("Belangrijk om te weten over pantoprazol"))
+
+    def test_stale_while_revalidate_staleness_bound(self):
+        """
+        Test that an entry older than MAX_STALENESS_DAYS is refreshed before returning.
+        """
+        GetMedicineInfo.save_to_cache("pantoprazol", f"{self.base_url}pantoprazol", "Verouderde informatie", "Protonpompremmers")
+        GetMedicineInfo.get_cache().touch("pantoprazol", "2020-01-01 00:00:00")
+        GetMedicineInfo._memory_cache.clear()
+
+        info = GetMedicineInfo.get_medicine_info("pantoprazol", "Protonpompremmers", stale_while_revalidate=True)
+        self.assertTrue(info.startswith("Belangrijk om te weten over pantoprazol"))
+
+    def test_non_interactive_skips_unknown_medicine(self):
+        """
+        Test that an unknown medicine is skipped without asking for a URL.
+        """
+        with patch("builtins.input", side_effect=AssertionError("input() aangeroepen")):
+            info = GetMedicineInfo.get_medicine_info("onbekend", "geen", interactive=False)
+        self.assertEqual(info, "Geen informatie beschikbaar")
+
+    def test_non_interactive_queues_and_resolves_url(self):
+        """
+        Test that a skipped medicine is queued with its attempted URLs and leaves the queue once resolved.
+        """
+        GetMedicineInfo.get_medicine_info("metoprololsuccinaat", "Selectieve beta-blokkers", "Selokeen", interactive=False)
+        pending = GetMedicineInfo.get_cache().pending_resolutions()
+        self.assertEqual([item["medicine_name"] for item in pending], ["metoprololsuccinaat"])
+        self.assertEqual(pending[0]["attempted_urls"], [f"{self.base_url}metoprololsuccinaat"])
+        self.assertEqual(pending[0]["brand_name"], "Selokeen")
+
+        info = GetMedicineInfo.resolve_from_url("metoprololsuccinaat", f"{self.base_url}metoprolol", "Selectieve beta-blokkers")
+        self.assertTrue(info.startswith("Belangrijk om te weten over metoprolol"))
+        self.assertEqual(GetMedicineInfo.get_cache().pending_resolutions(), [])
+        self.assertEqual(GetMedicineInfo.load_from_cache("metoprololsuccinaat")["info"], info)
+
+    def test_get_medicine_info_many(self):
+        """
+        Test that the bulk API returns a result for every medicine.
+        """
+        medicines = [
+            ("metoprolol", "Selectieve beta-blokkers", None),
+            ("pantoprazol", "Protonpompremmers", None),
+            ("omeprazol", "Protonpompremmers", None),
+            ("onbekend", "geen", None),
+        ]
+        results = dict(GetMedicineInfo.get_medicine_info_many(medicines, max_workers=4))
+        self.assertEqual(set(results), {name for name, _, _ in medicines})
+        self.assertTrue(results["pantoprazol"].startswith("Belangrijk om te weten over pantoprazol"))
+        self.assertEqual(results["onbekend"], "Geen informatie beschikbaar")
+
+    def test_rate_limiter_spacing(self):
+        """
+        Test that requests to the same host are spaced by min_interval.
+        """
+        limiter = GetMedicineInfo.HostRateLimiter(max_concurrent=2, min_interval=0.05)
+        start_times = []
+        for _ in range(3):
+            with limiter.limit("https://www.apotheek.nl/medicijnen/a"):
+                start_times.append(GetMedicineInfo.time.monotonic())
+        self.assertGreaterEqual(start_times[2] - start_times[0], 0.09)
+
+
+class TestParseMedicinePage(unittest.TestCase):
+    def test_saved_pages_match_cached_info(self):
+        """
+        Test that the saved pages parse to exactly the text stored in the JSON cache.
+        """
+        with open(os.path.join(project_root, "data", "MedicineInformation.json"), "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        for name in ["metoprolol", "pantoprazol", "omeprazol"]:
+            with open(os.path.join(PAGES_DIR, f"{name}.html"), "r", encoding="utf-8") as f:
+                self.assertEqual(GetMedicineInfo.parse_medicine_page(f.read()), cached[name]["info"])
+
+    def test_nested_and_multi_class_items(self):
+        """
+        Test nested list items, extra classes and list items without a heading.
+        """
+        html = """<html><body><h2>Kop buiten lijst</h2><ul>
+        <li class="listItemContent_container__25F5W extra"><h2>Wat doet <b>metoprolol</b>?</h2>
+        <div class="listItemContent_content__w3Hqp"><p>Tekst &amp; meer</p><ul>
+        <li class="listItemContent_container__25F5W"><h2>Hoge bloeddruk</h2>
+        <div class="listItemContent_content__w3Hqp">Verschijnselen <br>hoofdpijn</div></li>
+        </ul></div></li>
+        <li class="listItemContent_container__25F5W"><div class="listItemContent_content__w3Hqp">Zonder kop</div></li>
+        <li class="other"><h2>Niet</h2></li>
+        </ul></body></html>"""
+        self.assertEqual(
+            GetMedicineInfo.parse_medicine_page(html),
+            "Wat doetmetoprolol?\n\nTekst & meer Hoge bloeddruk Verschijnselen hoofdpijn\n\n"
+            "Hoge bloeddruk\n\nVerschijnselen hoofdpijn\n\nZonder kop"
+        )
+
+    def test_page_without_information(self):
+        """
+        Test that a page without medicine information raises a ValueError.
+        """
+        with self.assertRaises(ValueError):
+            GetMedicineInfo.parse_medicine_page("<html><body><li>Geen informatie</li></body></html>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,407 @@
+import sys
+import os
+
+# Add the project root and src directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import unittest
+import asyncio
+import contextlib
+import io
+import sqlite3
+import tempfile
+import time
+from unittest.mock import patch
+import httpx
+import openai
+import BuildQuestionDatabase
+import GenerateQuestion
+from EvaluateQuestion import QuestionEvaluator
+from LLMBackend import (FakeLLMBackend, FakeLLMError, collect_llm_calls, call_llm, call_llm_async, estimate_cost,
+                        share_llm_calls)
+from OutputModels import Response, Extraction, FusedResponse
+from tools.ReportLLMCalls import per_question, report
+from ResilientBackend import (
+    CircuitBreaker, CircuitOpenError, Resilience, ResilientBackend, classify_error, retry_after_seconds
+)
+
+
+class TestFakeLLMBackend(unittest.TestCase):
+    messages = [{"role": "user", "content": "De vraag moet gaan over metoprolol"}]
+
+    def test_valid_objects_for_each_format(self):
+        """
+        Test that the fake returns parsed objects of the requested format, with usage.
+        """
+        backend = FakeLLMBackend()
+        for response_format in (Extraction, Response, FusedResponse, Response.FinalResolution):
+            response = backend.parse("gpt-4o-mini", self.messages, response_format, 0.6)
+            self.assertIsInstance(response.choices[0].message.parsed, response_format)
+            self.assertGreater(response.usage.total_tokens, 0)
+        question = backend.parse("gpt-4o-mini", self.messages, Response, 0.6).choices[0].message.parsed
+        self.assertIn(question.final_resolution.antwoord, question.final_resolution.antwoordopties)
+
+    def test_deterministic(self):
+        """
+        Test that the same prompt always gives the same answer and the same failures.
+        """
+        prompts = [[{"role": "user", "content": f"Vraag {i}"}] for i in range(200)]
+
+        def outcomes(backend):
+            results = []
+            for messages in prompts:
+                try:
+                    results.append(backend.parse("gpt-4o-mini", messages, Response, 0.6)
+                                   .choices[0].message.parsed.final_resolution.antwoord)
+                except FakeLLMError:
+                    results.append(None)
+            return results
+
+        first = outcomes(FakeLLMBackend(failure_rate=0.25))
+        self.assertEqual(first, outcomes(FakeLLMBackend(failure_rate=0.25)))
+        self.assertTrue(30 < first.count(None) < 70)
+        self.assertNotIn(None, outcomes(FakeLLMBackend()))
+
+    def test_latency(self):
+        """
+        Test that every call takes at least the configured latency.
+        """
+        backend = FakeLLMBackend(latency=0.02)
+        start = time.perf_counter()
+        backend.parse("gpt-4o-mini", self.messages, Extraction, 0.3)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.02)
+
+
+class TestPluggableBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = FakeLLMBackend()
+        GenerateQuestion.set_llm_backend(self.backend)
+        self.addCleanup(GenerateQuestion.set_llm_backend, None)
+        patcher = patch.object(GenerateQuestion, "USE_EXTRACTION_CACHE", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_generate_quiz_question_uses_backend(self):
+        """
+        Test that question generation goes through the configured backend instead of OpenAI.
+        """
+        with patch.object(GenerateQuestion, "get_openai_client", side_effect=AssertionError("OpenAI client gebruikt")):
+            question = GenerateQuestion.generate_quiz_question("metoprolol", "Metoprolol vertraagt de hartslag.")
+            GenerateQuestion.generate_quiz_question("metoprolol", "Metoprolol vertraagt de hartslag.", fused=True)
+        self.assertIsInstance(question, Response.FinalResolution)
+        self.assertIn("metoprolol", question.vraag)
+        self.assertEqual(self.backend.stats["calls"], 3)
+
+    def test_evaluator_uses_backend(self):
+        """
+        Test that the evaluator adjusts a question through the same backend and keeps the verification.
+        """
+        question = self.backend.parse("gpt-4o-mini", [{"role": "user", "content": "Vraag"}], Response, 0.6)
+        question = question.choices[0].message.parsed
+        adjusted = QuestionEvaluator().adjust_question(question, "Maak de vraag korter", "Info")
+        self.assertIn("Maak de vraag korter", adjusted.final_resolution.vraag)
+        self.assertEqual(adjusted.final_resolution.verificatie, question.final_resolution.verificatie)
+        self.assertEqual(self.backend.stats["calls"], 2)
+
+
+class TestCallAccounting(unittest.TestCase):
+    def test_estimate_cost(self):
+        """
+        Test that cached prompt tokens are charged at the cached price and unknown models have no cost.
+        """
+        self.assertAlmostEqual(estimate_cost("gpt-4o-mini", 2_000_000, 1_000_000, 1_000_000), 0.15 + 0.075 + 0.60)
+        self.assertIsNone(estimate_cost("onbekend-model", 100, 0, 100))
+
+    def test_collect_calls(self):
+        """
+        Test that calls are collected per block, with stage, category, tokens and latency.
+        """
+        backend = FakeLLMBackend(latency=0.01)
+        messages = [{"role": "user", "content": "Vraag over metoprolol"}]
+        call_llm(backend, "extractie", "gpt-4o-mini", messages, Extraction, 0.3)  # Buiten een blok: niet verzameld
+        with collect_llm_calls() as outer:
+            call_llm(backend, "extractie", "gpt-4o-mini", messages, Extraction, 0.3, category="bijwerkingen")
+            with collect_llm_calls() as inner:
+                call_llm(backend, "generatie", "gpt-4o-mini", messages, Response, 0.6)
+        self.assertEqual([call["stap"] for call in outer], ["extractie"])
+        self.assertEqual([call["stap"] for call in inner], ["generatie"])
+        self.assertEqual(outer[0]["kenniscategorie"], "bijwerkingen")
+        self.assertGreater(outer[0]["prompt_tokens"], 0)
+        self.assertGreaterEqual(outer[0]["latency_ms"], 10)
+        self.assertGreater(outer[0]["kosten"], 0)
+
+    def test_shared_calls_keep_integer_tokens(self):
+        """
+        Test that shared calls keep integer tokens that sum to the call, with the remainder on the first question.
+        """
+        call = {"stap": "generatie", "kenniscategorie": None, "prompt_tokens": 100, "completion_tokens": 31,
+                "cached_tokens": None, "latency_ms": 250, "kosten": 0.003}
+        shares = [share_llm_calls([call], 3, "bijwerkingen", index)[0] for index in range(3)]
+        self.assertEqual([share["prompt_tokens"] for share in shares], [34, 33, 33])
+        self.assertEqual([share["completion_tokens"] for share in shares], [11, 10, 10])
+        self.assertTrue(all(isinstance(share["prompt_tokens"], int) for share in shares))
+        self.assertIsNone(shares[0]["cached_tokens"])
+        self.assertAlmostEqual(sum(share["kosten"] for share in shares), 0.003)
+        self.assertEqual([share["latency_ms"] for share in shares], [250] * 3)
+        self.assertEqual(shares[1]["kenniscategorie"], "bijwerkingen")
+
+    def test_calls_persisted_with_question(self):
+        """
+        Test that the pipeline stores the calls of each question in llm_calls, linked to quiz_question_uuid.
+        """
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        GenerateQuestion.set_llm_backend(FakeLLMBackend())
+        self.addCleanup(GenerateQuestion.set_llm_backend, None)
+        db_manager = BuildQuestionDatabase.DatabaseManager(db_path=os.path.join(temp_dir.name, "QuizQuestions.db"))
+        with patch.object(BuildQuestionDatabase, "DatabaseManager", return_value=db_manager), \
+                patch.object(GenerateQuestion, "USE_EXTRACTION_CACHE", False):
+            pipeline = BuildQuestionDatabase.QuizGenerationPipeline(debug_mode=False)
+            medicine_info = {"C07AB": {"cluster_name": "Selectieve beta-blokkers", "medications": {
+                "metoprolol": {"info": {"url": "", "relevant_information": "Metoprolol vertraagt de hartslag."},
+                               "sections": None, "atc7": "C07AB02", "brand": ""}
+            }}}
+            questions = pipeline._generate_questions(medicine_info)
+
+        conn = sqlite3.connect(db_manager.db_path)
+        rows = conn.execute("SELECT quiz_question_uuid, stap, model, retries FROM llm_calls ORDER BY id").fetchall()
+        conn.close()
+        quiz_question_uuid = questions[0]["metadata"]["quiz_question_uuid"]
+        self.assertEqual(rows, [(quiz_question_uuid, "extractie", "gpt-4o-mini", 0),
+                                (quiz_question_uuid, "generatie", "gpt-4o-mini", 0)])
+
+
+class TestResilience(unittest.TestCase):
+    messages = [{"role": "user", "content": "Vraag over metoprolol"}]
+
+    def setUp(self):
+        # Nepklok: sleep wacht niet, maar zet de klok vooruit
+        self.now = 0.0
+        self.sleeps = []
+        self.breaker = CircuitBreaker(clock=lambda: self.now, sleep=self.sleep, async_sleep=self.async_sleep)
+        self.resilience = Resilience(sleep=self.sleep, breaker=self.breaker, seed=0, async_sleep=self.async_sleep)
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds: float):
+        self.sleep(seconds)
+
+    def api_error(self, error_class, status: int, headers: dict = None, body: dict = None):
+        response = httpx.Response(status, headers=headers or {}, request=httpx.Request("POST", "https://api.openai.com"))
+        return error_class("fout", response=response, body=body)
+
+    def test_classify_error(self):
+        """
+        Test that rate limits, transient errors and errors that a retry cannot fix are told apart.
+        """
+        request = httpx.Request("POST", "https://api.openai.com")
+        self.assertEqual(classify_error(self.api_error(openai.RateLimitError, 429)), "rate_limit")
+        self.assertEqual(classify_error(self.api_error(openai.InternalServerError, 503)), "transient")
+        self.assertEqual(classify_error(openai.APITimeoutError(request)), "transient")
+        self.assertEqual(classify_error(self.api_error(openai.BadRequestError, 400)), "fatal")
+        self.assertEqual(classify_error(self.api_error(openai.AuthenticationError, 401)), "fatal")
+        self.assertEqual(classify_error(FakeLLMError("fout")), "transient")
+        self.assertEqual(classify_error(ValueError("ongeldige output")), "fatal")
+        quota = self.api_error(openai.RateLimitError, 429, body={"code": "insufficient_quota"})
+        self.assertEqual(classify_error(quota), "fatal")
+
+    def test_retry_after_headers(self):
+        """
+        Test that the wait time is read from retry-after-ms, retry-after and x-ratelimit-reset-* headers.
+        """
+        def seconds(headers):
+            return retry_after_seconds(self.api_error(openai.RateLimitError, 429, headers))
+        self.assertEqual(seconds({"retry-after-ms": "1500", "retry-after": "9"}), 1.5)
+        self.assertEqual(seconds({"retry-after": "2"}), 2.0)
+        self.assertEqual(seconds({"x-ratelimit-reset-requests": "20ms", "x-ratelimit-reset-tokens": "6m0s"}), 360.0)
+        self.assertIsNone(seconds({}))
+
+    def test_transient_failure_is_retried(self):
+        """
+        Test that a transient failure is retried with backoff and the retries end up in the call record.
+        """
+        backend = ResilientBackend(FakeLLMBackend(failure_rate=1.0, failures_per_prompt=2), self.resilience)
+        with collect_llm_calls() as calls:
+            response = call_llm(backend, "generatie", "gpt-4o-mini", self.messages, Response, 0.6)
+        self.assertIsInstance(response.choices[0].message.parsed, Response)
+        self.assertEqual(calls[0]["retries"], 2)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(all(0 <= delay <= 2 ** attempt for attempt, delay in enumerate(self.sleeps)))
+        self.assertEqual(self.resilience.get_statistics()["transient_errors"], 2)
+
+    def test_async_transient_failure_is_retried(self):
+        """
+        Test that call_llm_async goes through the same retries and counters, with the retries in the call record.
+        """
+        async def call():
+            with collect_llm_calls() as calls:
+                await call_llm_async(backend, "generatie", "gpt-4o-mini", self.messages, Response, 0.6)
+            return calls
+
+        backend = ResilientBackend(FakeLLMBackend(failure_rate=1.0, failures_per_prompt=2), self.resilience)
+        calls = asyncio.run(call())
+        self.assertEqual(calls[0]["retries"], 2)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertEqual((self.resilience.get_statistics()["calls"], self.resilience.get_statistics()["retries"]), (1, 2))
+
+    def test_fatal_error_is_not_retried(self):
+        """
+        Test that an error that a retry cannot fix is raised after one attempt.
+        """
+        fake = FakeLLMBackend(failure_rate=1.0, error_status=400)
+        with self.assertRaises(FakeLLMError):
+            ResilientBackend(fake, self.resilience).parse("gpt-4o-mini", self.messages, Response, 0.6)
+        self.assertEqual(fake.stats["calls"], 1)
+        self.assertEqual(self.sleeps, [])
+
+    def test_rate_limit_honours_retry_after(self):
+        """
+        Test that after a rate limit the call waits at least as long as the retry-after header.
+        """
+        fake = FakeLLMBackend(failure_rate=1.0, failures_per_prompt=1, error_status=429, retry_after=7)
+        ResilientBackend(fake, self.resilience).parse("gpt-4o-mini", self.messages, Response, 0.6)
+        self.assertEqual(len(self.sleeps), 1)
+        self.assertGreaterEqual(self.sleeps[0], 7)
+        self.assertEqual(self.resilience.get_statistics()["rate_limited"], 1)
+
+    def test_gives_up_after_max_retries(self):
+        """
+        Test that a call that keeps failing is given up after max_retries retries.
+        """
+        fake = FakeLLMBackend(failure_rate=1.0)
+        self.breaker.failure_threshold = 100
+        resilience = Resilience(max_retries=3, sleep=self.sleep, breaker=self.breaker)
+        with self.assertRaises(FakeLLMError):
+            ResilientBackend(fake, resilience).parse("gpt-4o-mini", self.messages, Response, 0.6)
+        self.assertEqual(fake.stats["calls"], 4)
+        self.assertEqual(resilience.get_statistics()["gave_up"], 1)
+
+    def test_circuit_breaker_pauses_calls(self):
+        """
+        Test that the open breaker makes calls wait, lets one trial call through and then closes again.
+        """
+        breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30, max_wait_seconds=100,
+                                 clock=lambda: self.now, sleep=self.sleep)
+        breaker.record_failure()
+        breaker.before_call()
+        self.assertEqual(self.now, 0.0)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        breaker.before_call()  # Wacht tot de reset en wordt de proefcall
+        self.assertEqual((self.now, breaker.state), (30.0, "half_open"))
+        breaker.record_failure()  # Proefcall mislukt: weer open
+        breaker.before_call()
+        self.assertEqual(self.now, 60.0)
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.stats["circuit_opened"], 2)
+
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.max_wait_seconds = 10
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_rate_limited_probe_does_not_block_breaker(self):
+        """
+        Test that a half-open probe that gets a 429, or is interrupted, does not leave the breaker half open.
+        """
+        self.breaker.failure_threshold = 2
+        self.breaker.max_wait_seconds = 100
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+
+        # De proefcall krijgt een 429 met retry-after; zijn retry wordt de nieuwe proef en lukt
+        fake = FakeLLMBackend(failure_rate=1.0, failures_per_prompt=1, error_status=429, retry_after=5)
+        ResilientBackend(fake, self.resilience).parse("gpt-4o-mini", self.messages, Response, 0.6)
+        self.assertEqual(self.breaker.state, "closed")
+        healthy = [{"role": "user", "content": "Vraag over pantoprazol"}]
+        ResilientBackend(FakeLLMBackend(), self.resilience).parse("gpt-4o-mini", healthy, Response, 0.6)
+
+        # Een proefcall die wordt onderbroken geeft zijn plaats vrij
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.resilience.call(interrupted)
+        self.assertEqual(self.breaker.state, "open")
+        ResilientBackend(FakeLLMBackend(), self.resilience).parse("gpt-4o-mini", healthy, Response, 0.6)
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_hedged_request_cuts_tail_latency(self):
+        """
+        Test that a slow call is sent a second time after hedge_after and the faster answer is used.
+        """
+        fake = FakeLLMBackend(tail_rate=1.0, tail_latency=1.0)
+        resilience = Resilience(hedge_after=0.05)
+        self.addCleanup(resilience.close)
+        start = time.perf_counter()
+        response = ResilientBackend(fake, resilience).parse("gpt-4o-mini", self.messages, Response, 0.6)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertIsInstance(response.choices[0].message.parsed, Response)
+        self.assertEqual(resilience.get_statistics()["hedges_won"], 1)
+
+    def test_async_hedged_request_cuts_tail_latency(self):
+        """
+        Test that hedging also works from the event loop, where the slow call is cancelled.
+        """
+        fake = FakeLLMBackend(tail_rate=1.0, tail_latency=1.0)
+        resilience = Resilience(hedge_after=0.05)
+        start = time.perf_counter()
+        response = asyncio.run(ResilientBackend(fake, resilience).parse_async("gpt-4o-mini", self.messages, Response, 0.6))
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertIsInstance(response.choices[0].message.parsed, Response)
+        self.assertEqual(resilience.get_statistics()["hedges_won"], 1)
+
+    def test_question_survives_transient_failures(self):
+        """
+        Test that generate_quiz_question goes through the resilience layer, so a transient failure no longer drops the question.
+        """
+        GenerateQuestion.set_llm_backend(FakeLLMBackend(failure_rate=1.0, failures_per_prompt=1))
+        GenerateQuestion.set_resilience(self.resilience)
+        self.addCleanup(GenerateQuestion.set_llm_backend, None)
+        self.addCleanup(GenerateQuestion.set_resilience, None)
+        with patch.object(GenerateQuestion, "USE_EXTRACTION_CACHE", False):
+            question = GenerateQuestion.generate_quiz_question("metoprolol", "Metoprolol vertraagt de hartslag.")
+        self.assertIsInstance(question, Response.FinalResolution)
+        self.assertEqual(GenerateQuestion.get_resilience_statistics()["retries"], 2)
+
+
+class TestReportLLMCalls(unittest.TestCase):
+    def call(self, quiz_question_uuid, latency_ms, kosten=0.001):
+        return {"quiz_question_uuid": quiz_question_uuid, "stap": "generatie", "model": "gpt-4o-mini",
+                "kenniscategorie": "bijwerkingen", "prompt_tokens": 100, "completion_tokens": 50, "cached_tokens": 0,
+                "latency_ms": latency_ms, "retries": 0, "kosten": kosten, "timestamp": "2024-01-01T00:00:00"}
+
+    def test_batch_calls_without_latency(self):
+        """
+        Test that calls without latency (batch API) are left out of the latency percentiles instead of crashing or counting as 0 ms.
+        """
+        calls = [self.call("a", 1000.0), self.call("a", 500.0), self.call("b", None), self.call(None, None)]
+        questions = per_question(calls)
+        self.assertEqual((questions["a"]["latency_ms"], questions["b"]["latency_ms"]), (1500.0, None))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            report(calls)
+        lines = output.getvalue().splitlines()
+        self.assertIn("p50     1500 ms", next(line for line in lines if line.startswith("alle vragen")))
+        self.assertIn("p50     1000 ms", next(line for line in lines if line.startswith("gpt-4o-mini")))
+
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            report([self.call("b", None)])
+        self.assertIn("p50         n/a", next(line for line in output.getvalue().splitlines()
+                                              if line.startswith("gpt-4o-mini")))
+
+
+if __name__ == "__main__":
+    unittest.main()
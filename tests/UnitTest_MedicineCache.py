@@ -0,0 +1,349 @@
+import sys
+import os
+
+# Add the project root and src directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import unittest
+import json
+import multiprocessing
+import tempfile
+from unittest.mock import patch
+from MedicineCache import MedicineCache, LRUCache, split_info_sections
+import GetMedicineInfo
+
+
+def write_medicines(db_path: str, worker: int, count: int):
+    """Write `count` distinct medicines from a separate process."""
+    cache = MedicineCache(db_path)
+    for i in range(count):
+        cache.put(f"medicijn_{worker}_{i}", f"https://www.apotheek.nl/medicijnen/medicijn_{worker}_{i}",
+                  f"Informatie over medicijn {worker}_{i}", "stresstest")
+        cache.enqueue_resolution(f"onbekend_{i}", None, "stresstest", [f"https://www.apotheek.nl/{worker}/{i}"])
+    cache.close()
+
+
+class TestMedicineCache(unittest.TestCase):
+    def setUp(self):
+        """
+        Create a temporary directory with a small legacy JSON cache.
+        """
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "MedicineInformation.db")
+        self.json_path = os.path.join(self.temp_dir.name, "MedicineInformation.json")
+        self.legacy_cache = {
+            "metoprolol": {
+                "url": "https://www.apotheek.nl/medicijnen/metoprolol",
+                "date": "2025-05-12 16:10:08",
+                "info": "Belangrijk om te weten over metoprolol\n\nMetoprolol maakt uw hartslag langzamer.",
+                "atc_cluster": "Selectieve beta-blokkers"
+            },
+            "pantoprazol": {
+                "url": "https://www.apotheek.nl/medicijnen/pantoprazol",
+                "date": "2025-05-13 10:00:00",
+                "info": "Belangrijk om te weten over pantoprazol\n\nPantoprazol vermindert de aanmaak van maagzuur.",
+                "atc_cluster": "Protonpompremmers"
+            }
+        }
+        with open(self.json_path, "w", encoding="utf-8") as f:
+            json.dump(self.legacy_cache, f)
+
+    def tearDown(self):
+        GetMedicineInfo._cache = None
+        self.temp_dir.cleanup()
+
+    def test_migrate_from_json(self):
+        """
+        Test that the legacy JSON cache is migrated on first use.
+        """
+        cache = MedicineCache(self.db_path, self.json_path)
+        self.assertEqual(cache.count(), 2)
+        entry = cache.get("metoprolol")
+        for key, value in self.legacy_cache["metoprolol"].items():
+            self.assertEqual(entry[key], value)
+        self.assertIsNone(entry["etag"])
+        cache.close()
+
+    def test_migration_runs_once(self):
+        """
+        Test that entries removed from the JSON file after migration are not migrated again.
+        """
+        MedicineCache(self.db_path, self.json_path).close()
+        with open(self.json_path, "w", encoding="utf-8") as f:
+            json.dump({"aol": dict(self.legacy_cache["metoprolol"])}, f)
+        cache = MedicineCache(self.db_path, self.json_path)
+        self.assertIsNone(cache.get("aol"))
+        cache.close()
+
+    def test_put_and_get(self):
+        """
+        Test storing and overwriting an entry.
+        """
+        cache = MedicineCache(self.db_path)
+        self.assertIsNone(cache.get("omeprazol"))
+        entry = cache.put("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol", "Oud", "Protonpompremmers")
+        self.assertEqual(cache.get("omeprazol"), entry)
+        self.assertEqual(cache.count_pages(), 1)
+        cache.put("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol", "Nieuw", "Protonpompremmers")
+        self.assertEqual(cache.get("omeprazol")["info"], "Nieuw")
+        self.assertEqual(cache.count(), 1)
+        cache.close()
+
+    def test_upgrade_from_version_1(self):
+        """
+        Test that a version 1 database (without HTTP validators) is upgraded in place.
+        """
+        import sqlite3
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE medicine_cache (medicine_name TEXT PRIMARY KEY, url TEXT NOT NULL, "
+                     "date TEXT NOT NULL, atc_cluster TEXT, info TEXT NOT NULL)")
+        conn.execute("INSERT INTO medicine_cache VALUES ('aol', 'https://www.apotheek.nl/medicijnen/aol', "
+                     "'2025-05-12 16:10:08', 'geen', 'Info')")
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+        cache = MedicineCache(self.db_path, self.json_path)
+        self.assertIsNone(cache.get("metoprolol"))
+        self.assertIsNone(cache.get("aol")["etag"])
+        cache.put("aol", "https://www.apotheek.nl/medicijnen/aol", "Info", "geen", etag='"abc"')
+        self.assertEqual(cache.get("aol")["etag"], '"abc"')
+        cache.close()
+
+    def test_aliases_share_one_page(self):
+        """
+        Test that names pointing to the same page store the page once and are refreshed together.
+        """
+        cache = MedicineCache(self.db_path)
+        url = "https://www.apotheek.nl/medicijnen/paracetamol?product=paracetamol"
+        cache.put("paracetamol", url, "Versie 1", "Analgetica")
+        cache.put("lisil", url, "Versie 1", "Analgetica")
+        self.assertEqual(cache.count(), 2)
+        self.assertEqual(cache.count_pages(), 1)
+        self.assertEqual(cache.aliases("lisil"), ["lisil", "paracetamol"])
+
+        cache.put("paracetamol", url, "Versie 2", "Analgetica")
+        self.assertEqual(cache.get("lisil")["info"], "Versie 2")
+        self.assertEqual(cache.count_pages(), 1)
+
+        cache.touch("lisil", "2026-01-01 00:00:00")
+        self.assertEqual(cache.get("paracetamol")["date"], "2026-01-01 00:00:00")
+
+        loaded = cache.load_all()
+        self.assertIs(loaded["lisil"]["info"], loaded["paracetamol"]["info"])
+        cache.close()
+
+    def test_alias_moves_to_other_page(self):
+        """
+        Test that a page without aliases is removed when its only name moves to another URL.
+        """
+        cache = MedicineCache(self.db_path)
+        cache.put("aol", "https://www.apotheek.nl/medicijnen/aol", "Oud", "geen")
+        cache.put("aol", "https://www.apotheek.nl/medicijnen/colestyramine", "Nieuw", "geen")
+        self.assertEqual(cache.count_pages(), 1)
+        self.assertEqual(cache.get("aol")["info"], "Nieuw")
+        cache.close()
+
+    def test_sections(self):
+        """
+        Test that sections are stored per page and reconstructed for entries saved without sections.
+        """
+        cache = MedicineCache(self.db_path, self.json_path)
+        self.assertEqual(cache.get_sections("metoprolol"), [
+            ("Belangrijk om te weten over metoprolol", "Metoprolol maakt uw hartslag langzamer.")
+        ])
+        sections = [("Wat zijn mogelijke bijwerkingen?", "Hoofdpijn."), (None, "Zonder kop")]
+        cache.put("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol",
+                  "Wat zijn mogelijke bijwerkingen?\n\nHoofdpijn.\n\nZonder kop", "Protonpompremmers",
+                  sections=sections)
+        self.assertEqual(cache.get_sections("omeprazol"), sections)
+        self.assertEqual(cache.get_sections("onbekend"), [])
+        cache.close()
+
+    def test_split_info_sections(self):
+        """
+        Test the reconstruction of sections from the joined text.
+        """
+        self.assertEqual(split_info_sections("Kop\n\nInhoud\n\nKop 2\n\nInhoud 2"),
+                         [("Kop", "Inhoud"), ("Kop 2", "Inhoud 2")])
+        self.assertEqual(split_info_sections("Alleen tekst"), [(None, "Alleen tekst")])
+
+    def test_touch(self):
+        """
+        Test that touch only updates the date of an entry.
+        """
+        cache = MedicineCache(self.db_path, self.json_path)
+        self.assertEqual(cache.touch("metoprolol", "2026-01-01 00:00:00"), "2026-01-01 00:00:00")
+        entry = cache.get("metoprolol")
+        self.assertEqual(entry["date"], "2026-01-01 00:00:00")
+        self.assertEqual(entry["info"], self.legacy_cache["metoprolol"]["info"])
+        self.assertIsNone(cache.touch("onbekend"))
+        cache.close()
+
+    def test_url_resolution_queue(self):
+        """
+        Test that queued medicines merge their attempted URLs and leave the queue once resolved.
+        """
+        cache = MedicineCache(self.db_path, self.json_path)
+        cache.enqueue_resolution("onbekend", None, "geen", ["https://www.apotheek.nl/medicijnen/onbekend"])
+        cache.enqueue_resolution("onbekend", "Merk", "geen", [
+            "https://www.apotheek.nl/medicijnen/onbekend", "https://www.apotheek.nl/medicijnen/merk"
+        ])
+        pending = cache.pending_resolutions()
+        self.assertEqual(len(pending), 1)
+        self.assertEqual(pending[0]["brand_name"], "Merk")
+        self.assertEqual(pending[0]["attempted_urls"], [
+            "https://www.apotheek.nl/medicijnen/onbekend", "https://www.apotheek.nl/medicijnen/merk"
+        ])
+        cache.mark_resolved("onbekend", "https://www.apotheek.nl/medicijnen/onbekend-middel")
+        self.assertEqual(cache.pending_resolutions(), [])
+        cache.close()
+
+    def test_extractions_invalidated_on_new_page_text(self):
+        """
+        Test that extractions survive a re-save of the same text and are removed when the page text changes.
+        """
+        cache = MedicineCache(self.db_path)
+        url = "https://www.apotheek.nl/medicijnen/paracetamol?product=paracetamol"
+        cache.put("paracetamol", url, "Versie 1", "Analgetica")
+        cache.put("lisil", url, "Versie 1", "Analgetica")
+        cache.put_extraction("sleutel", "paracetamol", "bijwerkingen", 1, "gpt-4o-mini", "Misselijkheid")
+        cache.put("lisil", url, "Versie 1", "Analgetica")
+        self.assertEqual(cache.get_extraction("sleutel"), "Misselijkheid")
+        cache.put("lisil", url, "Versie 2", "Analgetica")
+        self.assertIsNone(cache.get_extraction("sleutel"))
+        self.assertEqual(cache.count_extractions(), 0)
+        cache.close()
+
+    def test_concurrent_processes(self):
+        """
+        Test that concurrent writer processes lose no entries.
+        """
+        workers, per_worker = 4, 25
+        processes = [
+            multiprocessing.Process(target=write_medicines, args=(self.db_path, worker, per_worker))
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=60)
+            self.assertEqual(process.exitcode, 0)
+
+        cache = MedicineCache(self.db_path, self.json_path)
+        self.assertEqual(cache.count(), workers * per_worker)
+        # Elk proces voegt zijn eigen geprobeerde URL toe aan dezelfde wachtrij entries
+        for item in cache.pending_resolutions():
+            self.assertEqual(len(item["attempted_urls"]), workers)
+        cache.close()
+
+    def test_load_and_save_api(self):
+        """
+        Test that load_from_cache and save_to_cache use the SQLite cache.
+        """
+        GetMedicineInfo.set_cache_path(self.db_path, self.json_path)
+        self.assertEqual(GetMedicineInfo.load_from_cache("pantoprazol")["url"], self.legacy_cache["pantoprazol"]["url"])
+        GetMedicineInfo.save_to_cache("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol", "Info", "Protonpompremmers")
+        self.assertEqual(GetMedicineInfo.load_from_cache("omeprazol")["info"], "Info")
+        GetMedicineInfo.get_cache().close()
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_size_bound(self):
+        """
+        Test that the least recently used entry is evicted when the cache is full.
+        """
+        lru = LRUCache(max_size=2, ttl_seconds=60)
+        lru.put("a", 1)
+        lru.put("b", 2)
+        lru.get("a")
+        lru.put("c", 3)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual(lru.get("a"), 1)
+        self.assertEqual(lru.get_statistics()["evictions"], 1)
+
+    def test_ttl(self):
+        """
+        Test that entries older than the TTL are not returned.
+        """
+        lru = LRUCache(max_size=2, ttl_seconds=10)
+        with patch("MedicineCache.time.monotonic", return_value=100.0):
+            lru.put("a", 1)
+        with patch("MedicineCache.time.monotonic", return_value=111.0):
+            self.assertIsNone(lru.get("a"))
+        stats = lru.get_statistics()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (0, 1, 1))
+
+    def test_source_change_clears_cache(self):
+        """
+        Test that a changed mtime of the backing file invalidates all entries.
+        """
+        lru = LRUCache()
+        lru.check_source(1.0)
+        lru.put("a", 1)
+        lru.check_source(1.0)
+        self.assertEqual(lru.get("a"), 1)
+        lru.check_source(2.0)
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(lru.get_statistics()["invalidations"], 1)
+
+
+class TestMemoryCacheLayer(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.temp_dir.name, "MedicineInformation.db")
+        GetMedicineInfo.set_cache_path(self.db_path)
+
+    def tearDown(self):
+        GetMedicineInfo.get_cache().close()
+        GetMedicineInfo._cache = None
+        self.temp_dir.cleanup()
+
+    def test_repeated_lookup_hits_memory(self):
+        """
+        Test that a second lookup is served from memory.
+        """
+        GetMedicineInfo.save_to_cache("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol", "Info", "Protonpompremmers")
+        start = GetMedicineInfo.get_cache_statistics()
+        GetMedicineInfo.load_from_cache("omeprazol")
+        with patch.object(MedicineCache, "get", side_effect=AssertionError("database geraadpleegd")):
+            self.assertEqual(GetMedicineInfo.load_from_cache("omeprazol")["info"], "Info")
+        end = GetMedicineInfo.get_cache_statistics()
+        self.assertEqual(end["hits"] - start["hits"], 1)
+
+    def test_save_invalidates_memory(self):
+        """
+        Test that save_to_cache replaces the entry held in memory.
+        """
+        GetMedicineInfo.save_to_cache("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol", "Oud", "Protonpompremmers")
+        GetMedicineInfo.load_from_cache("omeprazol")
+        GetMedicineInfo.save_to_cache("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol", "Nieuw", "Protonpompremmers")
+        self.assertEqual(GetMedicineInfo.load_from_cache("omeprazol")["info"], "Nieuw")
+
+    def test_save_invalidates_aliases_in_memory(self):
+        """
+        Test that refreshing one name also refreshes the other names of the same page held in memory.
+        """
+        url = "https://www.apotheek.nl/medicijnen/paracetamol?product=paracetamol"
+        GetMedicineInfo.save_to_cache("paracetamol", url, "Oud", "Analgetica")
+        GetMedicineInfo.save_to_cache("lisil", url, "Oud", "Analgetica")
+        GetMedicineInfo.load_from_cache("lisil")
+        GetMedicineInfo.save_to_cache("paracetamol", url, "Nieuw", "Analgetica")
+        self.assertEqual(GetMedicineInfo.load_from_cache("lisil")["info"], "Nieuw")
+
+    def test_external_write_invalidates_memory(self):
+        """
+        Test that a write by another process (a different connection) is picked up via the file mtime.
+        """
+        GetMedicineInfo.save_to_cache("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol", "Oud", "Protonpompremmers")
+        GetMedicineInfo.load_from_cache("omeprazol")
+        other = MedicineCache(self.db_path)
+        other.put("omeprazol", "https://www.apotheek.nl/medicijnen/omeprazol", "Extern", "Protonpompremmers")
+        other.close()
+        os.utime(self.db_path, (0, GetMedicineInfo.get_cache().mtime() + 1))
+        self.assertEqual(GetMedicineInfo.load_from_cache("omeprazol")["info"], "Extern")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import sys
+import os
+
+# Add the project root and src directory to the Python path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, project_root)
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import unittest
+import threading
+import time
+from StagedPipeline import Stage, StagedPipeline
+
+
+class TestStagedPipeline(unittest.TestCase):
+    def test_items_flow_through_all_stages(self):
+        """
+        Test that every stage may drop, pass or split items, and that the counters per stage match.
+        """
+        pipeline = StagedPipeline([
+            Stage("filter", lambda item: [item] if item % 2 else [], workers=2),
+            Stage("splits", lambda item: [item, item * 10], workers=3),
+            Stage("kwadraat", lambda item: [item * item]),
+        ])
+        results = pipeline.run(range(10))
+        self.assertEqual(sorted(results), sorted(x * x for i in (1, 3, 5, 7, 9) for x in (i, i * 10)))
+
+        stats = pipeline.get_statistics()
+        self.assertEqual(list(stats), ["bron", "filter", "splits", "kwadraat"])
+        self.assertEqual((stats["bron"]["out"], stats["filter"]["items"], stats["filter"]["out"]), (10, 10, 5))
+        self.assertEqual((stats["splits"]["items"], stats["splits"]["out"], stats["kwadraat"]["items"]), (5, 10, 10))
+
+    def test_stages_overlap(self):
+        """
+        Test that two stages work on different items at the same time instead of one after the other.
+        """
+        # Beide stappen moeten tegelijk bij de barrière zijn: generatie met item 0 terwijl ophalen item 1 doet
+        barrier = threading.Barrier(2, timeout=5)
+        errors = []
+
+        def fetch(item):
+            if item == 1:
+                barrier.wait()
+            return [item]
+
+        def generate(item):
+            if item == 0:
+                barrier.wait()
+            return [item]
+
+        pipeline = StagedPipeline([Stage("ophalen", fetch), Stage("generatie", generate)],
+                                  on_error=lambda stage, item, error: errors.append((stage, item)))
+        results = pipeline.run(range(4))
+        self.assertEqual(errors, [])  # Na elkaar zou de barrière verlopen
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+
+    def test_bounded_queue_applies_backpressure(self):
+        """
+        Test that a fast stage waits for a slow one when the queue in between is full.
+        """
+        lock = threading.Lock()
+        counts = {"started": 0, "done": 0, "max_ahead": 0}
+
+        def fast(item):
+            with lock:
+                counts["started"] += 1
+                counts["max_ahead"] = max(counts["max_ahead"], counts["started"] - counts["done"])
+            return [item]
+
+        def slow(item):
+            time.sleep(0.01)
+            with lock:
+                counts["done"] += 1
+            return [item]
+
+        pipeline = StagedPipeline([
+            Stage("snel", fast, queue_size=2),
+            Stage("traag", slow, queue_size=2),
+        ])
+        pipeline.run(range(20))
+
+        # Hoogstens het item in de trage stap, 2 in de wachtrij en het item in de snelle stap; zonder grens 20
+        self.assertLessEqual(counts["max_ahead"], 4)
+        self.assertLessEqual(pipeline.get_statistics()["traag"]["queue_max"], 2)
+
+    def test_error_drops_item_only(self):
+        """
+        Test that an error drops only that item, is passed to on_error and is counted for the stage.
+        """
+        errors = []
+
+        def fail_on_three(item):
+            if item == 3:
+                raise ValueError("fout bij item 3")
+            return [item]
+
+        pipeline = StagedPipeline([Stage("stap", fail_on_three, workers=2), Stage("einde", lambda item: [item])],
+                                  on_error=lambda stage, item, error: errors.append((stage, item, str(error))))
+        results = pipeline.run(range(6))
+
+        self.assertEqual(sorted(results), [0, 1, 2, 4, 5])
+        self.assertEqual(errors, [("stap", 3, "fout bij item 3")])
+        self.assertEqual(pipeline.get_statistics()["stap"]["errors"], 1)
+
+    def test_worker_exit_called_in_each_worker(self):
+        """
+        Test that on_worker_exit runs once in every worker thread, also when on_error itself fails.
+        """
+        exited = []
+
+        def on_error(stage, item, error):
+            raise RuntimeError("melden mislukt")
+
+        pipeline = StagedPipeline([Stage("a", lambda item: 1 / 0, workers=3), Stage("b", lambda item: [item], workers=2)],
+                                  on_error=on_error, on_worker_exit=lambda: exited.append(threading.current_thread().name))
+        self.assertEqual(pipeline.run(range(5)), [])
+        self.assertEqual(len(exited), 5)
+        self.assertEqual(len(set(exited)), 5)
+
+    def test_error_in_source_stops_workers(self):
+        """
+        Test that an error in the source is raised after the workers have finished the items they got.
+        """
+        processed = []
+
+        def source():
+            yield 1
+            yield 2
+            raise RuntimeError("selectie mislukt")
+
+        pipeline = StagedPipeline([Stage("stap", lambda item: processed.append(item))])
+        with self.assertRaises(RuntimeError):
+            pipeline.run(source())
+        self.assertEqual(processed, [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import sys
+import os
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import GenerateQuestion
+import BenchmarkOpenAIClient
+from BenchmarkOpenAIClient import FakeOpenAIHandler
+from AsyncQuestionEngine import AsyncQuestionEngine
+
+"""
+Benchmark van de AsyncQuestionEngine tegen een lokale stand-in voor de OpenAI API.
+
+Meet het aantal vragen per seconde bij oplopende concurrency, met een vaste latency per request en
+een rate limit in requests per minuut. Verwacht: bijna lineaire schaling tot de rate limit, daarna
+een plateau op de rate limit (twee requests per vraag).
+
+Gebruik: python tools/BenchmarkAsyncEngine.py [aantal vragen]
+"""
+
+NUM_QUESTIONS = 200
+LATENCY_SECONDS = 0.05
+REQUESTS_PER_MINUTE = 6000
+TOKENS_PER_MINUTE = 10_000_000  # Niet beperkend in deze benchmark
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+
+
+def run(concurrency: int, num_questions: int) -> tuple:
+    """Geef (vragen per seconde, requests per minuut, mislukte jobs) terug."""
+    jobs = [
+        {"medicine_name": f"medicijn_{i}", "medicine_info": "Metoprolol vertraagt de hartslag.", "category": "bijwerkingen"}
+        for i in range(num_questions)
+    ]
+    engine = AsyncQuestionEngine(max_concurrency=concurrency, requests_per_minute=REQUESTS_PER_MINUTE,
+                                 tokens_per_minute=TOKENS_PER_MINUTE)
+    start = time.perf_counter()
+    results = engine.run_jobs(jobs)
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for result in results if result["error"])
+    return num_questions / elapsed, engine.stats["requests"] / elapsed * 60, failed
+
+
+if __name__ == "__main__":
+    num_questions = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_QUESTIONS
+    BenchmarkOpenAIClient.CONNECT_SECONDS = 0
+    BenchmarkOpenAIClient.LATENCY_SECONDS = LATENCY_SECONDS
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    server.request_queue_size = 128
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    GenerateQuestion.USE_EXTRACTION_CACHE = False
+
+    ceiling = REQUESTS_PER_MINUTE / 60 / 2
+    print(f"\n{num_questions} vragen, {LATENCY_SECONDS * 1000:.0f} ms per request, "
+          f"rate limit {REQUESTS_PER_MINUTE} requests/min (max {ceiling:.1f} vragen/s)")
+    print("-" * 70)
+    baseline = None
+    for concurrency in CONCURRENCY_LEVELS:
+        rate, requests_per_minute, failed = run(concurrency, num_questions)
+        baseline = baseline or rate
+        print(f"concurrency {concurrency:>3}   {rate:6.1f} vragen/s   x{rate / baseline:5.1f}   "
+              f"{requests_per_minute:6.0f} requests/min   mislukt: {failed}")
+    server.shutdown()
@@ -0,0 +1,110 @@
+import sys
+import os
+import json
+import sqlite3
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from BuildQuestionDatabase import DatabaseManager, SCHEMA_PATH
+
+"""
+Benchmark van het opslaan van quizvragen en logregels in QuizQuestions.db.
+
+Vergelijkt de oude werkwijze (per schrijfactie een nieuwe verbinding, commit en close, zonder WAL)
+met DatabaseManager (één verbinding per thread, WAL, synchronous=NORMAL). Per vraag worden de
+vraag en twee LLM calls opgeslagen: in de oude werkwijze twee transacties, bij DatabaseManager
+één (zoals _save_question). Daarnaast het aantal logregels per seconde.
+
+Gebruik: python tools/BenchmarkDatabaseManager.py [aantal vragen]
+"""
+
+NUM_QUESTIONS = 10_000
+QUESTION = {
+    "introductie": "Een patiënt komt een herhaalrecept metoprolol ophalen.",
+    "vraag": "Wat is juist over het gebruik van metoprolol bij COPD?",
+    "antwoordopties": ["Optie A", "Optie B", "Optie C", "Optie D"],
+    "antwoord": "Optie A",
+    "uitleg": "Metoprolol is een cardioselectieve bètablokker.",
+}
+LLM_CALL = {"stap": "generatie", "model": "gpt-4o-mini", "kenniscategorie": "bijwerkingen", "prompt_tokens": 2000,
+            "completion_tokens": 600, "cached_tokens": 1536, "latency_ms": 6000.0, "retries": 0, "kosten": 0.0005,
+            "timestamp": datetime.now().isoformat()}
+
+
+# Oude implementatie: elke schrijfactie opent een eigen verbinding
+def old_save_question(db_path: str):
+    quiz_question_uuid = str(uuid.uuid4())
+    conn = sqlite3.connect(db_path)
+    conn.execute('''
+        INSERT INTO generated_quiz_questions (quiz_question_uuid, information_id, kenniscategorie, introductie, vraag,
+            antwoordoptie_1, antwoordoptie_2, antwoordoptie_3, antwoordoptie_4, juiste_antwoord, uitleg,
+            llm_raw_output, timestamp_gegenereerd) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (quiz_question_uuid, 1, "bijwerkingen", QUESTION["introductie"], QUESTION["vraag"], *QUESTION["antwoordopties"],
+          QUESTION["antwoord"], QUESTION["uitleg"], json.dumps(QUESTION), datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+    conn = sqlite3.connect(db_path)
+    conn.executemany('''
+        INSERT INTO llm_calls (quiz_question_uuid, stap, model, kenniscategorie, prompt_tokens, completion_tokens,
+            cached_tokens, latency_ms, retries, kosten, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [(quiz_question_uuid, *LLM_CALL.values())] * 2)
+    conn.commit()
+    conn.close()
+
+
+def old_log_process(db_path: str, message: str):
+    conn = sqlite3.connect(db_path)
+    conn.execute("INSERT INTO process_logs (event_type, medicine, category, message, timestamp) VALUES (?, ?, ?, ?, ?)",
+                 ("info", "metoprolol", "", message, datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+
+
+def new_save_question(db_manager: DatabaseManager):
+    with db_manager.transaction():
+        quiz_question_uuid = db_manager.save_quiz_question(
+            information_id=1, kenniscategorie="bijwerkingen", introductie=QUESTION["introductie"], vraag=QUESTION["vraag"],
+            antwoordopties=list(QUESTION["antwoordopties"]), juiste_antwoord=QUESTION["antwoord"],
+            uitleg=QUESTION["uitleg"], llm_quiz_raw_output=json.dumps(QUESTION)
+        )
+        db_manager.save_llm_calls(quiz_question_uuid, [LLM_CALL, LLM_CALL])
+
+
+def per_second(func, count: int) -> float:
+    start = time.perf_counter()
+    for index in range(count):
+        func(index)
+    return count / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    num_questions = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_QUESTIONS
+    with tempfile.TemporaryDirectory() as work_dir:
+        old_path = os.path.join(work_dir, "old.db")
+        conn = sqlite3.connect(old_path)
+        with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
+            conn.executescript(f.read())
+        conn.close()
+        db_manager = DatabaseManager(db_path=os.path.join(work_dir, "new.db"))
+
+        print(f"\n{num_questions} vragen (vraag en 2 LLM calls) en {num_questions} logregels")
+        print("-" * 80)
+        results = {
+            "verbinding per schrijfactie": (
+                per_second(lambda index: old_save_question(old_path), num_questions),
+                per_second(lambda index: old_log_process(old_path, f"Regel {index}"), num_questions)
+            ),
+            "DatabaseManager": (
+                per_second(lambda index: new_save_question(db_manager), num_questions),
+                per_second(lambda index: db_manager.log_process("info", "metoprolol", "", f"Regel {index}"),
+                           num_questions)
+            ),
+        }
+        for label, (questions, logs) in results.items():
+            print(f"{label:<30} {questions:9.0f} vragen/s   {logs:9.0f} logregels/s")
+        db_manager.close()
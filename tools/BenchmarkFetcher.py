@@ -0,0 +1,106 @@
+import sys
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+import requests
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import GetMedicineInfo
+
+"""
+Benchmark van het ophalen van medicijnpagina's: serieel (get_medicine_info per medicijn)
+versus gelijktijdig (get_medicine_info_many).
+
+De oude werkwijze (per pagina een losse requests.get, dus elke keer een nieuwe verbinding) is de
+basislijn; "serieel" gebruikt de gedeelde sessie en meet dus alleen het hergebruik van verbindingen.
+
+Een lokale stub server serveert de opgeslagen pagina's uit data/test_data/pages, met een
+kunstmatige vertraging per request om de latency van apotheek.nl na te bootsen.
+"""
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "test_data", "pages")
+NUM_MEDICINES = 40
+LATENCY_SECONDS = 0.1
+WORKER_COUNTS = [1, 4, 8]
+
+
+def load_pages() -> list:
+    pages = []
+    for filename in sorted(os.listdir(PAGES_DIR)):
+        with open(os.path.join(PAGES_DIR, filename), "rb") as f:
+            pages.append(f.read())
+    return pages
+
+
+class LatencyHandler(BaseHTTPRequestHandler):
+    """Serveert voor elk pad /medicijnen/medicijn_<n> een opgeslagen pagina, na LATENCY_SECONDS."""
+    pages = load_pages()
+    protocol_version = "HTTP/1.1"  # keep-alive, zodat verbindingen hergebruikt kunnen worden
+    # Headers en body gaan in twee writes; met Nagle wacht de body op de (vertraagde) ACK van de client
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        time.sleep(LATENCY_SECONDS)
+        number = int(self.path.rsplit("_", 1)[-1])
+        body = self.pages[number % len(self.pages)]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(label: str, fetch, temp_dir: str) -> float:
+    """Haal NUM_MEDICINES pagina's op met een lege cache en geef het aantal pagina's per seconde terug."""
+    GetMedicineInfo.set_cache_path(os.path.join(temp_dir, f"{label}.db"))
+    medicines = [(f"medicijn_{i}", "benchmark", None) for i in range(NUM_MEDICINES)]
+    start = time.perf_counter()
+    fetch(medicines)
+    elapsed = time.perf_counter() - start
+    return NUM_MEDICINES / elapsed
+
+
+def fetch_serial(medicines):
+    for name, cluster, brand in medicines:
+        GetMedicineInfo.get_medicine_info(name, cluster, brand, interactive=False)
+
+
+def fetch_serial_new_connection(medicines):
+    # requests.get maakt per aanroep een eigen sessie, en dus een nieuwe verbinding
+    with patch.object(GetMedicineInfo, "get_session", return_value=requests):
+        fetch_serial(medicines)
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), LatencyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    GetMedicineInfo.BASE_URL = f"http://127.0.0.1:{server.server_address[1]}/medicijnen/"
+
+    print(f"\n{NUM_MEDICINES} pagina's, {LATENCY_SECONDS * 1000:.0f} ms latency per request")
+    print("-" * 56)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        # Zonder rate limiting, zodat alleen het verschil in gelijktijdigheid wordt gemeten
+        GetMedicineInfo._rate_limiter = GetMedicineInfo.HostRateLimiter(max(WORKER_COUNTS), min_interval=0)
+        rate = run("serieel_nieuw", fetch_serial_new_connection, temp_dir)
+        print(f"{'serieel (requests.get)':<26} {rate:8.1f} pagina's/s")
+        print(f"{'serieel (gedeelde sessie)':<26} {run('serieel', fetch_serial, temp_dir):8.1f} pagina's/s")
+        for workers in WORKER_COUNTS:
+            rate = run(f"bulk_{workers}", lambda meds: list(GetMedicineInfo.get_medicine_info_many(meds, workers)), temp_dir)
+            print(f"{f'bulk ({workers} workers)':<26} {rate:8.1f} pagina's/s")
+
+        # Met de standaard rate limiting (beleefd tempo richting apotheek.nl)
+        GetMedicineInfo._rate_limiter = GetMedicineInfo.HostRateLimiter()
+        rate = run("bulk_beleefd", lambda meds: list(GetMedicineInfo.get_medicine_info_many(meds)), temp_dir)
+        print(f"{'bulk (standaard)':<26} {rate:8.1f} pagina's/s  "
+              f"(max {GetMedicineInfo.MAX_CONNECTIONS_PER_HOST} verbindingen, "
+              f"{GetMedicineInfo.MIN_REQUEST_INTERVAL}s tussen requests)")
+    server.shutdown()
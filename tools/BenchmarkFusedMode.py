@@ -0,0 +1,113 @@
+import sys
+import os
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer
+from unittest.mock import patch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import GenerateQuestion
+import BenchmarkOpenAIClient
+from BenchmarkOpenAIClient import FakeOpenAIHandler
+from BuildQuestionDatabase import QuestionGenerator
+from MedicineCache import split_info_sections
+
+"""
+Vergelijking van de twee-staps generatie (extractie, dan quizvraag) met de fused mode (één call).
+
+Voor een vaste set medicijnen en (met een vaste seed) dezelfde kenniscategorieën wordt per modus
+gemeten: latency per vraag, tokens per vraag en het percentage vragen dat niet door de validatie van
+QuestionGenerator komt. Standaard tegen een lokale stand-in voor de OpenAI API (vaste latency, tokens
+geschat op vier tekens per token); met --live tegen de echte API (kost tokens, vereist OPENAI_API_KEY).
+
+Gebruik: python tools/BenchmarkFusedMode.py [--live] [vragen per medicijn]
+"""
+
+MEDICINES = ["metoprolol", "pantoprazol", "omeprazol", "amlodipine", "metformine", "simvastatine",
+             "apixaban", "tramadol", "salbutamol", "lisinopril"]
+QUESTIONS_PER_MEDICINE = 2
+SEED = 42
+LATENCY_SECONDS = 0.2
+CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "MedicineInformation.json")
+
+
+class RecordingClient:
+    """Geeft calls door aan de echte client en houdt tokengebruik en aantal calls bij."""
+    def __init__(self, client):
+        self.client = client
+        self.calls = 0
+        self.tokens = 0
+        self.beta = self
+        self.chat = self
+        self.completions = self
+
+    def parse(self, **kwargs):
+        response = self.client.beta.chat.completions.parse(**kwargs)
+        self.calls += 1
+        if response.usage:
+            self.tokens += response.usage.total_tokens
+        return response
+
+
+def run(fused: bool, medicines: dict, questions_per_medicine: int) -> dict:
+    random.seed(SEED)  # Dezelfde categorieën voor beide modi
+    client = RecordingClient(GenerateQuestion.get_openai_client())
+    validator = QuestionGenerator(debug_mode=False)
+    latencies, failures = [], 0
+    with patch.object(GenerateQuestion, "get_openai_client", return_value=client):
+        for name, entry in medicines.items():
+            for _ in range(questions_per_medicine):
+                start = time.perf_counter()
+                try:
+                    question = GenerateQuestion.generate_quiz_question(
+                        name, entry["info"], sections=split_info_sections(entry["info"]), fused=fused
+                    )
+                except RuntimeError:
+                    question = None
+                latencies.append((time.perf_counter() - start) * 1000)
+                if validator.process_question(name, question) is None:
+                    failures += 1
+    count = len(latencies)
+    return {
+        "latency": sum(latencies) / count,
+        "p95": sorted(latencies)[min(count - 1, int(count * 0.95))],
+        "calls": client.calls / count,
+        "tokens": client.tokens / count,
+        "failures": failures / count * 100
+    }
+
+
+if __name__ == "__main__":
+    live = "--live" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--live"]
+    questions_per_medicine = int(args[0]) if args else QUESTIONS_PER_MEDICINE
+    with open(CACHE_FILE, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    medicines = {name: cache[name] for name in MEDICINES if name in cache}
+
+    server = None
+    if not live:
+        BenchmarkOpenAIClient.CONNECT_SECONDS = 0
+        BenchmarkOpenAIClient.LATENCY_SECONDS = LATENCY_SECONDS
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["OPENAI_API_KEY"] = "benchmark"
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    # Zonder extractiecache, zodat de twee-staps modus altijd beide calls doet
+    GenerateQuestion.USE_EXTRACTION_CACHE = False
+
+    target = "OpenAI API" if live else f"stand-in ({LATENCY_SECONDS * 1000:.0f} ms per request)"
+    print(f"\n{len(medicines)} medicijnen x {questions_per_medicine} vragen, {target}")
+    print("-" * 90)
+    for label, fused in [("twee stappen", False), ("fused", True)]:
+        result = run(fused, medicines, questions_per_medicine)
+        print(f"{label:<14} gem {result['latency']:7.0f} ms   p95 {result['p95']:7.0f} ms   "
+              f"{result['calls']:.1f} calls/vraag   {result['tokens']:7.0f} tokens/vraag   "
+              f"validatie mislukt: {result['failures']:.0f}%")
+    GenerateQuestion.close_openai_client()
+    if server:
+        server.shutdown()
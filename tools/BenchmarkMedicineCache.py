@@ -0,0 +1,137 @@
+import sys
+import os
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from MedicineCache import MedicineCache
+
+"""
+Benchmark van de medicatie-informatie cache: oude JSON cache versus de SQLite cache.
+
+Meet de gemiddelde tijd per lookup en per insert bij een cache van 500 en 5.000 entries.
+De entries zijn kopieën van de echte cache (elk met een eigen URL), zodat de grootte per entry realistisch is.
+
+Meet daarnaast voor de echte cache het effect van het eenmalig opslaan van pagina's die door
+meerdere medicijnnamen worden gebruikt: aantal pagina's, bestandsgrootte en geheugen van een geladen cache.
+"""
+
+SOURCE_CACHE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "MedicineInformation.json")
+CACHE_SIZES = [500, 5000]
+NUM_LOOKUPS = 200
+NUM_INSERTS = 50
+NUM_JSON_OPERATIONS = 5  # De JSON cache is traag; meet minder operaties
+
+
+def build_entries(size: int) -> dict:
+    """Maak `size` cache entries op basis van de bestaande cache."""
+    with open(SOURCE_CACHE, 'r', encoding='utf-8') as f:
+        source = list(json.load(f).values())
+    entries = {}
+    for i in range(size):
+        entry = dict(source[i % len(source)])
+        entry["url"] = f"{entry['url']}#{i}"
+        entries[f"medicijn_{i}"] = entry
+    return entries
+
+
+# Oude implementatie: het hele bestand inlezen en herschrijven
+def json_load(path: str, medicine_name: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get(medicine_name)
+
+def json_save(path: str, medicine_name: str, entry: dict):
+    with open(path, 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    cache[medicine_name] = entry
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+
+
+def time_per_call(func, args_list) -> float:
+    """Gemiddelde tijd per aanroep in milliseconden."""
+    start = time.perf_counter()
+    for args in args_list:
+        func(*args)
+    return (time.perf_counter() - start) / len(args_list) * 1000
+
+
+def benchmark(size: int, temp_dir: str) -> dict:
+    entries = build_entries(size)
+    names = list(entries)
+    new_entry = dict(entries[names[0]], date=datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+
+    json_path = os.path.join(temp_dir, f"cache_{size}.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False, indent=2)
+
+    db_path = os.path.join(temp_dir, f"cache_{size}.db")
+    start = time.perf_counter()
+    cache = MedicineCache(db_path, json_path)
+    migration_s = time.perf_counter() - start
+
+    lookups = [(random.choice(names),) for _ in range(NUM_LOOKUPS)]
+    results = {
+        "migratie (s)": migration_s,
+        "json lookup (ms)": time_per_call(lambda n: json_load(json_path, n), lookups[:NUM_JSON_OPERATIONS]),
+        "json insert (ms)": time_per_call(
+            lambda n: json_save(json_path, n, new_entry),
+            [(f"nieuw_{i}",) for i in range(NUM_JSON_OPERATIONS)]
+        ),
+        "sqlite lookup (ms)": time_per_call(cache.get, lookups),
+        "sqlite insert (ms)": time_per_call(
+            lambda n: cache.put(n, new_entry["url"], new_entry["info"], new_entry.get("atc_cluster")),
+            [(f"nieuw_{i}",) for i in range(NUM_INSERTS)]
+        ),
+    }
+    cache.close()
+    return results
+
+
+def traced_peak_mb(func) -> float:
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def benchmark_deduplication(temp_dir: str) -> dict:
+    db_path = os.path.join(temp_dir, "dedup.db")
+    cache = MedicineCache(db_path, SOURCE_CACHE)
+
+    def load_json():
+        with open(SOURCE_CACHE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    results = {
+        "medicijnnamen": cache.count(),
+        "unieke pagina's": cache.count_pages(),
+        "json bestand (MB)": os.path.getsize(SOURCE_CACHE) / 1024 / 1024,
+        "sqlite bestand (MB)": os.path.getsize(db_path) / 1024 / 1024,
+        "json geladen (MB)": traced_peak_mb(load_json),
+        "sqlite geladen (MB)": traced_peak_mb(cache.load_all),
+    }
+    cache.close()
+    return results
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as temp_dir:
+        print("\nDeduplicatie van de huidige cache")
+        print("-" * 40)
+        for name, value in benchmark_deduplication(temp_dir).items():
+            print(f"{name:<22} {value:10.3f}")
+
+        for size in CACHE_SIZES:
+            results = benchmark(size, temp_dir)
+            print(f"\nCache met {size} entries")
+            print("-" * 40)
+            for name, value in results.items():
+                print(f"{name:<22} {value:10.3f}")
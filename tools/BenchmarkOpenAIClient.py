@@ -0,0 +1,158 @@
+import sys
+import os
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import GenerateQuestion
+
+"""
+Benchmark van de latency per quizvraag, met en zonder hergebruik van de OpenAI client.
+
+Een lokale stand-in server beantwoordt /v1/chat/completions met vaste antwoorden voor de extractie
+(Extraction), de quizvraag (Response) en beide tegelijk (FusedResponse); het tokengebruik wordt
+geschat op vier tekens per token. Net als bij OpenAI telt een begin van de prompt van minstens
+1024 tokens dat al eerder is gezien als cached_tokens (in stappen van 128). Per nieuwe verbinding wacht de server CONNECT_SECONDS, om de
+TCP/TLS handshake met api.openai.com na te bootsen; elk request kost daarnaast LATENCY_SECONDS, plus
+SECONDS_PER_COMPLETION_TOKEN per token van het antwoord. De lean schema's (LeanResponse,
+LeanFlagsResponse) krijgen dezelfde vraag zonder stappen en zelfcontrole in vrije tekst.
+
+Gebruik: python tools/BenchmarkOpenAIClient.py [aantal vragen]
+"""
+
+NUM_QUESTIONS = 20
+CONNECT_SECONDS = 0.05
+LATENCY_SECONDS = 0.02
+SECONDS_PER_COMPLETION_TOKEN = 0.0  # Het genereren van de output; ~0.01 s per token bij gpt-4o-mini
+CACHE_MIN_TOKENS = 1024
+CACHE_INCREMENT_TOKENS = 128
+
+EXTRACTION = {"relevant_information": "Metoprolol vertraagt de hartslag."}
+QUESTION = {
+    "steps": [{"description": "Informatie gelezen", "action": "Vraag opgesteld", "result": "Vraag"}],
+    "final_resolution": {
+        "introductie": "Een patiënt gebruikt metoprolol.",
+        "vraag": "Wat doet metoprolol?",
+        "antwoordopties": ["Hartslag vertragen", "Maagzuur remmen", "Pijn stillen", "Bloed verdunnen"],
+        "antwoord": "Hartslag vertragen",
+        "uitleg": "Metoprolol is een bètablokker.",
+        "verificatie": {"check_accuracy": "ok", "check_clarity": "ok", "check_fairness": "ok", "improvements": []}
+    }
+}
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Stand-in voor de chat completions API; kiest het antwoord op basis van de naam van het response_format."""
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # Anders vertraagt delayed ACK elk antwoord op een hergebruikte verbinding
+    connections = 0
+    seen_prefixes = set()
+
+    @classmethod
+    def cached_tokens(cls, messages: list) -> int:
+        """Tokens van de langste reeks eerste berichten die al in een eerder request stond."""
+        cached = 0
+        for end in range(1, len(messages) + 1):
+            prefix = json.dumps(messages[:end], ensure_ascii=False)
+            if prefix in cls.seen_prefixes:
+                cached = len(prefix) // 4
+            cls.seen_prefixes.add(prefix)
+        if cached < CACHE_MIN_TOKENS:
+            return 0
+        return cached - cached % CACHE_INCREMENT_TOKENS
+
+    def setup(self):
+        super().setup()
+        type(self).connections += 1
+        time.sleep(CONNECT_SECONDS)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        schema_name = body.get("response_format", {}).get("json_schema", {}).get("name")
+        if schema_name == "Extraction":
+            content = EXTRACTION
+        elif schema_name == "FusedResponse":
+            content = dict(EXTRACTION, **QUESTION)
+        elif schema_name in ("LeanResponse", "LeanFlagsResponse"):
+            lean = {key: value for key, value in QUESTION["final_resolution"].items() if key != "verificatie"}
+            if schema_name == "LeanFlagsResponse":
+                lean["verificatie"] = {"accurate": True, "clear": True, "fair": True}
+            content = {"final_resolution": lean}
+        else:
+            content = QUESTION
+        prompt_tokens = len(json.dumps(body["messages"], ensure_ascii=False)) // 4
+        completion_tokens = len(json.dumps(content, ensure_ascii=False)) // 4
+        time.sleep(LATENCY_SECONDS + completion_tokens * SECONDS_PER_COMPLETION_TOKEN)
+        payload = json.dumps({
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": json.dumps(content)}
+            }],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_tokens_details": {"cached_tokens": self.cached_tokens(body["messages"])}}
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run(num_questions: int) -> list:
+    """Genereer num_questions vragen en geef de latency per vraag in ms terug."""
+    latencies = []
+    for _ in range(num_questions):
+        start = time.perf_counter()
+        GenerateQuestion.generate_quiz_question("metoprolol", "Metoprolol vertraagt de hartslag.")
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: list, connections: int):
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<22} gem {sum(latencies) / len(latencies):7.1f} ms   p50 {p50:7.1f} ms   "
+          f"p95 {p95:7.1f} ms   verbindingen: {connections}")
+
+
+if __name__ == "__main__":
+    num_questions = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_QUESTIONS
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # Zonder extractiecache, zodat elke vraag beide requests doet
+    GenerateQuestion.USE_EXTRACTION_CACHE = False
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    print(f"\n{num_questions} vragen (2 requests per vraag), {CONNECT_SECONDS * 1000:.0f} ms per nieuwe verbinding, "
+          f"{LATENCY_SECONDS * 1000:.0f} ms per request")
+    print("-" * 90)
+    # Zonder hergebruik: een nieuwe client (en connection pool) per vraag, zoals voorheen
+    with patch.object(GenerateQuestion, "get_openai_client", GenerateQuestion.initialize_openai_client):
+        FakeOpenAIHandler.connections = 0
+        report("nieuwe client per vraag", run(num_questions), FakeOpenAIHandler.connections)
+
+    FakeOpenAIHandler.connections = 0
+    usage_start = GenerateQuestion.get_usage_statistics()
+    report("gedeelde client", run(num_questions), FakeOpenAIHandler.connections)
+    usage = {key: value - usage_start[key] for key, value in GenerateQuestion.get_usage_statistics().items()}
+    print(f"{'prompt cache':<22} {usage['cached_tokens']} van {usage['prompt_tokens']} prompt tokens "
+          f"({usage['cached_tokens'] / usage['prompt_tokens']:.0%}), "
+          f"{usage['cache_hits']} van {usage['calls']} calls met cache hit")
+    GenerateQuestion.close_openai_client()
+    server.shutdown()
@@ -0,0 +1,151 @@
+import sys
+import os
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import GenerateQuestion
+import BenchmarkOpenAIClient
+from BenchmarkOpenAIClient import FakeOpenAIHandler
+from BuildQuestionDatabase import QuestionGenerator
+from LLMBackend import collect_llm_calls
+from MedicineCache import split_info_sections
+
+"""
+Vergelijking van het volledige output schema (Response: stappen en zelfcontrole in vrije tekst) met de
+lean schema's (LeanResponse, LeanFlagsResponse) voor de quizvraag.
+
+Voor een vaste set medicijnen en (met een vaste seed) dezelfde kenniscategorieën wordt per schema
+gemeten: completion tokens, latency en kosten van de generatie call, de latency per vraag en het
+percentage vragen dat niet door de validatie van QuestionGenerator komt. Standaard tegen een lokale
+stand-in voor de OpenAI API, die een antwoord van gangbare lengte geeft en per completion token
+wacht; met --live tegen de echte API (kost tokens, vereist OPENAI_API_KEY). Alleen --live zegt iets
+over de validatie: de stand-in geeft altijd een geldige vraag.
+
+Gebruik: python tools/BenchmarkOutputSchema.py [--live] [vragen per medicijn]
+"""
+
+MEDICINES = ["metoprolol", "pantoprazol", "omeprazol", "amlodipine", "metformine", "simvastatine",
+             "apixaban", "tramadol", "salbutamol", "lisinopril"]
+QUESTIONS_PER_MEDICINE = 2
+SEED = 42
+LATENCY_SECONDS = 0.2
+SECONDS_PER_COMPLETION_TOKEN = 0.01
+CACHE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "MedicineInformation.json")
+
+# Antwoord van de stand-in in het volledige schema, met stappen en zelfcontrole van gangbare lengte
+FULL_QUESTION = {
+    "steps": [
+        {"description": "De informatie over metoprolol bij astma en COPD gelezen.",
+         "action": "Het kernprincipe bepaald: cardioselectiviteit en het risico op bronchospasme.",
+         "result": "Onderwerp: voorschrijven van metoprolol bij een patiënt met COPD."},
+        {"description": "Het juiste antwoord geformuleerd op basis van de broninformatie.",
+         "action": "Het antwoord gebaseerd op de voorzichtigheid bij een lage startdosis.",
+         "result": "Juiste antwoord: voorschrijven met een lage startdosis onder controle."},
+        {"description": "Foute antwoordopties gemaakt met veelvoorkomende misvattingen.",
+         "action": "Een cruciaal detail veranderd en een absolute contra-indicatie gesuggereerd.",
+         "result": "Drie plausibele foute antwoorden van dezelfde lengte en structuur."},
+        {"description": "De introductie geschreven zonder het antwoord te verraden.",
+         "action": "Een praktijksituatie aan de balie gekozen.",
+         "result": "Introductie over een patiënt met een nieuw recept en COPD in de medicatiehistorie."},
+    ],
+    "final_resolution": {
+        "introductie": "Een patiënt met COPD in de medicatiehistorie komt een eerste recept voor metoprolol ophalen.",
+        "vraag": "Wat is juist over het gebruik van metoprolol bij deze patiënt?",
+        "antwoordopties": [
+            "Metoprolol kan worden voorgeschreven, startend met een lage dosis onder controle",
+            "Metoprolol is gecontra-indiceerd bij elke patiënt met COPD of astma",
+            "Metoprolol kan alleen worden voorgeschreven als de COPD eerst volledig onder controle is",
+            "Metoprolol kan worden voorgeschreven, mits de patiënt stopt met zijn luchtwegverwijders",
+        ],
+        "antwoord": "Metoprolol kan worden voorgeschreven, startend met een lage dosis onder controle",
+        "uitleg": "Metoprolol is een cardioselectieve bètablokker (werkt vooral op het hart). Bij COPD is het "
+                  "risico op benauwdheid (bronchospasme) klein, maar start met een lage dosis en let op klachten.",
+        "verificatie": {
+            "check_accuracy": "De informatie over cardioselectiviteit en de lage startdosis komt overeen met de "
+                              "broninformatie; de foute opties bevatten absolute uitspraken die niet kloppen.",
+            "check_clarity": "De vraag is eenduidig en de antwoordopties zijn even lang, met dezelfde "
+                             "grammaticale structuur, zodat het juiste antwoord niet opvalt.",
+            "check_fairness": "De vraag test praktijkkennis die een ervaren apothekersassistent nodig heeft "
+                              "aan de balie, zonder strikvragen of onnodig detail.",
+            "improvements": ["Introductie ingekort zodat deze het antwoord niet verraadt",
+                             "Een foute optie herschreven zodat deze even lang is als het juiste antwoord"],
+        },
+    },
+}
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(schema: str, medicines: dict, questions_per_medicine: int) -> dict:
+    random.seed(SEED)  # Dezelfde categorieën voor elk schema
+    validator = QuestionGenerator(debug_mode=False)
+    latencies, generation_calls, failures = [], [], 0
+    for name, entry in medicines.items():
+        for _ in range(questions_per_medicine):
+            start = time.perf_counter()
+            with collect_llm_calls() as calls:
+                try:
+                    question = GenerateQuestion.generate_quiz_question(
+                        name, entry["info"], sections=split_info_sections(entry["info"]), schema=schema
+                    )
+                except RuntimeError:
+                    question = None
+            latencies.append((time.perf_counter() - start) * 1000)
+            generation_calls += [call for call in calls if call["stap"] == "generatie"]
+            if validator.process_question(name, question) is None:
+                failures += 1
+    count = len(latencies)
+    generation_latencies = [call["latency_ms"] for call in generation_calls] or [0.0]
+    return {
+        "completion_tokens": sum(call["completion_tokens"] for call in generation_calls) / max(1, len(generation_calls)),
+        "generation_latency": sum(generation_latencies) / len(generation_latencies),
+        "generation_p95": percentile(generation_latencies, 0.95),
+        "cost": sum(call["kosten"] or 0 for call in generation_calls) / max(1, len(generation_calls)),
+        "latency": sum(latencies) / count,
+        "failures": failures / count * 100
+    }
+
+
+if __name__ == "__main__":
+    live = "--live" in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != "--live"]
+    questions_per_medicine = int(args[0]) if args else QUESTIONS_PER_MEDICINE
+    with open(CACHE_FILE, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    medicines = {name: cache[name] for name in MEDICINES if name in cache}
+
+    server = None
+    if not live:
+        BenchmarkOpenAIClient.CONNECT_SECONDS = 0
+        BenchmarkOpenAIClient.LATENCY_SECONDS = LATENCY_SECONDS
+        BenchmarkOpenAIClient.SECONDS_PER_COMPLETION_TOKEN = SECONDS_PER_COMPLETION_TOKEN
+        BenchmarkOpenAIClient.QUESTION = FULL_QUESTION
+        server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAIHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        os.environ["OPENAI_API_KEY"] = "benchmark"
+        os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    # Zonder extractiecache, zodat elk schema dezelfde extractie calls doet
+    GenerateQuestion.USE_EXTRACTION_CACHE = False
+
+    target = "OpenAI API" if live else (f"stand-in ({LATENCY_SECONDS * 1000:.0f} ms per request + "
+                                        f"{SECONDS_PER_COMPLETION_TOKEN * 1000:.0f} ms per completion token)")
+    print(f"\n{len(medicines)} medicijnen x {questions_per_medicine} vragen, {target}")
+    print("-" * 130)
+    for schema in GenerateQuestion.OUTPUT_SCHEMAS:
+        result = run(schema, medicines, questions_per_medicine)
+        print(f"{schema:<11} generatie: {result['completion_tokens']:5.0f} completion tokens   "
+              f"gem {result['generation_latency']:6.0f} ms   p95 {result['generation_p95']:6.0f} ms   "
+              f"${result['cost']:.5f}   |   per vraag gem {result['latency']:6.0f} ms   "
+              f"validatie mislukt: {result['failures']:.0f}%")
+    GenerateQuestion.close_openai_client()
+    if server:
+        server.shutdown()
@@ -0,0 +1,88 @@
+import sys
+import os
+import time
+import tracemalloc
+from bs4 import BeautifulSoup
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from GetMedicineInfo import parse_medicine_page, LIST_ITEM_CLASS, CONTENT_CLASS
+
+"""
+Micro-benchmark van parse_medicine_page over een corpus van opgeslagen apotheek.nl pagina's.
+
+Vergelijkt de oude implementatie (volledige BeautifulSoup boom) met de huidige implementatie
+(alleen de <li> elementen met medicijninformatie) op ms per pagina en piekgeheugen, en controleert
+dat de output identiek is.
+
+Gebruik: python tools/BenchmarkParser.py [map met .html bestanden]
+"""
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "test_data", "pages")
+REPEATS = 20
+
+
+def parse_medicine_page_full(html: str) -> str:
+    """Oude implementatie: bouwt de volledige boom van de pagina."""
+    soup = BeautifulSoup(html, "html.parser")
+    list_items = soup.find_all("li", class_=LIST_ITEM_CLASS)
+
+    if not list_items:
+        raise ValueError("De pagina bevat niet de juiste informatiestructuur.")
+
+    medicine_info = []
+    for item in list_items:
+        title = item.find("h2")
+        if title:
+            medicine_info.append(title.get_text(strip=True))
+        content = item.find("div", class_=CONTENT_CLASS)
+        if content:
+            medicine_info.append(content.get_text(separator=" ", strip=True))
+
+    return "\n\n".join(medicine_info)
+
+
+def load_corpus(corpus_dir: str) -> list:
+    pages = []
+    for filename in sorted(os.listdir(corpus_dir)):
+        if filename.endswith(".html"):
+            with open(os.path.join(corpus_dir, filename), "r", encoding="utf-8") as f:
+                pages.append(f.read())
+    return pages
+
+
+def measure(parse, pages: list) -> tuple:
+    """Geef (ms per pagina, gemiddeld piekgeheugen per pagina in MB) terug."""
+    parse(pages[0])  # Opwarmen, zodat eenmalige allocaties niet worden meegeteld
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for html in pages:
+            parse(html)
+    ms_per_page = (time.perf_counter() - start) / (REPEATS * len(pages)) * 1000
+
+    peaks = []
+    tracemalloc.start()
+    for html in pages:
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        parse(html)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    tracemalloc.stop()
+    return ms_per_page, sum(peaks) / len(peaks) / 1024 / 1024
+
+
+if __name__ == "__main__":
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_CORPUS
+    pages = load_corpus(corpus_dir)
+    if not pages:
+        print(f"Geen .html bestanden gevonden in {corpus_dir}")
+        sys.exit(1)
+
+    mismatches = sum(parse_medicine_page_full(html) != parse_medicine_page(html) for html in pages)
+    print(f"\n{len(pages)} pagina's uit {corpus_dir}, {REPEATS} herhalingen")
+    print(f"Afwijkende output: {mismatches}")
+    print("-" * 50)
+    for label, parse in [("volledige boom", parse_medicine_page_full), ("alleen <li>", parse_medicine_page)]:
+        ms_per_page, peak_mb = measure(parse, pages)
+        print(f"{label:<16} {ms_per_page:8.2f} ms/pagina   piek {peak_mb:6.2f} MB")
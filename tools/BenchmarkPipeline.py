@@ -0,0 +1,131 @@
+import sys
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+from unittest.mock import patch
+
+# Add the src directory to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import BuildQuestionDatabase
+import GenerateQuestion
+import GetMedicineInfo
+from LLMBackend import FakeLLMBackend
+from ResilientBackend import Resilience
+
+"""
+Benchmark van de hele QuizGenerationPipeline met de FakeLLMBackend, zonder OpenAI calls.
+
+Meet onze eigen overhead: selectie, opslaan van de selectie, informatie uit de cache, extractiecache,
+LLM (de nep-latency), validatie en opslaan van de vragen. De medicijnen zijn synthetisch (clusters van
+CLUSTER_SIZE medicijnen); hun pagina's staan vooraf in een tijdelijke cache, zodat er geen netwerk
+nodig is. Per aantal medicijnen worden de vragen per seconde en de tijd per stap getoond. De stappen
+lopen hier na elkaar (streaming=False), zodat de tijd per stap optelt; de streaming pipeline meet
+tools/BenchmarkStreamingPipeline.py.
+
+De mislukte calls zijn tijdelijke fouten die bij de eerste retry slagen; de backoff is kort gehouden,
+zodat de tijd naar onze eigen overhead blijft gaan.
+
+Gebruik: python tools/BenchmarkPipeline.py [latency per LLM call in ms] [deel mislukte calls]
+"""
+
+NUM_MEDICINES = [1, 100, 1000]
+CLUSTER_SIZE = 10
+LATENCY_SECONDS = 0.0  # Alleen onze eigen overhead
+FAILURE_RATE = 0.02
+PAGE_PATH = os.path.join(project_root, "data", "test_data", "pages", "metoprolol.html")
+
+
+def timed(timings: dict, stage: str, func):
+    """Wrap func zodat de tijd per aanroep bij timings[stage] wordt opgeteld."""
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[stage] += time.perf_counter() - start
+    return wrapper
+
+
+def build_selection(num_medicines: int) -> dict:
+    """Synthetische selectie in het formaat van select_medication."""
+    clusters = []
+    for index in range(num_medicines):
+        if index % CLUSTER_SIZE == 0:
+            clusters.append({"atc5_code": f"X{len(clusters):04d}", "naam": f"Cluster {len(clusters)}",
+                             "gewicht": 1.0, "geneesmiddelen": []})
+        clusters[-1]["geneesmiddelen"].append({"atc7": f"X{index:06d}", "naam": f"medicijn{index}", "gewicht": 1.0})
+    return {"selected_clusters": clusters}
+
+
+def fill_cache(selection: dict, sections: list):
+    """Zet voor elk medicijn een pagina in de cache, zodat de pipeline niets hoeft op te halen."""
+    info = GetMedicineInfo.sections_to_text(sections)
+    for cluster in selection["selected_clusters"]:
+        for med in cluster["geneesmiddelen"]:
+            GetMedicineInfo.save_to_cache(med["naam"], f"https://example.org/{med['naam']}", info,
+                                          cluster["naam"], sections=sections)
+
+
+def run(num_medicines: int, backend: FakeLLMBackend, sections: list, work_dir: str) -> tuple:
+    """Geef (aantal vragen, totale tijd, tijd per stap) terug voor één run van de pipeline."""
+    GetMedicineInfo.set_cache_path(os.path.join(work_dir, f"MedicineInformation_{num_medicines}.db"))
+    selection = build_selection(num_medicines)
+    fill_cache(selection, sections)
+    db_manager = BuildQuestionDatabase.DatabaseManager(db_path=os.path.join(work_dir, f"QuizQuestions_{num_medicines}.db"))
+    with patch.object(BuildQuestionDatabase, "DatabaseManager", return_value=db_manager):
+        pipeline = BuildQuestionDatabase.QuizGenerationPipeline(debug_mode=False, batch_mode=True, streaming=False)
+
+    timings = defaultdict(float)
+    pipeline.medication_selector.select_medications = timed(timings, "selectie", lambda atc_cluster=None: selection)
+    pipeline.db_manager.save_selected_medications = timed(timings, "selectie opslaan",
+                                                          pipeline.db_manager.save_selected_medications)
+    pipeline._get_medicine_information = timed(timings, "informatie (cache)", pipeline._get_medicine_information)
+    pipeline._generate_questions = timed(timings, "vragen totaal", pipeline._generate_questions)
+    pipeline._save_question = timed(timings, "vragen opslaan", pipeline._save_question)
+    backend.parse = timed(timings, "LLM", backend.parse)
+    with patch.object(GenerateQuestion, "load_cached_extraction",
+                      timed(timings, "extractiecache", GenerateQuestion.load_cached_extraction)), \
+            patch.object(GenerateQuestion, "save_extraction",
+                         timed(timings, "extractiecache", GenerateQuestion.save_extraction)):
+        start = time.perf_counter()
+        questions = pipeline.generate_quiz()
+        elapsed = time.perf_counter() - start
+    del backend.parse
+
+    # Wat binnen de generatie overblijft is parsing, validatie en statistieken
+    timings["validatie en overig"] = (timings.pop("vragen totaal") - timings["LLM"] - timings["extractiecache"]
+                                      - timings["vragen opslaan"])
+    GetMedicineInfo.get_cache().close()
+    GetMedicineInfo._cache = None
+    GetMedicineInfo._memory_cache.clear()
+    return len(questions), elapsed, timings
+
+
+if __name__ == "__main__":
+    latency = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else LATENCY_SECONDS
+    failure_rate = float(sys.argv[2]) if len(sys.argv) > 2 else FAILURE_RATE
+    random.seed(0)  # Vaste kenniscategorieën, zodat runs vergelijkbaar zijn
+    with open(PAGE_PATH, "r", encoding="utf-8") as f:
+        sections = GetMedicineInfo.parse_medicine_sections(f.read())
+
+    print(f"\nFakeLLMBackend: {latency * 1000:.0f} ms per call, {failure_rate:.0%} mislukte calls")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for num_medicines in NUM_MEDICINES:
+            backend = FakeLLMBackend(latency=latency, failure_rate=failure_rate, failures_per_prompt=1)
+            GenerateQuestion.set_llm_backend(backend)
+            GenerateQuestion.set_resilience(Resilience(backoff_base_seconds=0.001))
+            num_questions, elapsed, timings = run(num_medicines, backend, sections, work_dir)
+            print("-" * 70)
+            print(f"{num_medicines} medicijnen: {num_questions} vragen in {elapsed:.2f} s "
+                  f"({num_questions / elapsed:.1f} vragen/s), {backend.stats['calls']} LLM calls, "
+                  f"{backend.stats['failures']} mislukt, "
+                  f"{GenerateQuestion.get_resilience_statistics()['gave_up']} opgegeven na retries")
+            for stage, seconds in timings.items():
+                print(f"  {stage:<22} {seconds * 1000:9.1f} ms   {seconds * 1000 / num_medicines:7.2f} ms/medicijn   "
+                      f"{seconds / elapsed:5.1%}")
+    GenerateQuestion.set_llm_backend(None)
+    GenerateQuestion.set_resilience(None)
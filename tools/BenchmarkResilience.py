@@ -0,0 +1,80 @@
+import sys
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from LLMBackend import FakeLLMBackend
+from OutputModels import Response
+from ResilientBackend import Resilience, ResilientBackend
+
+"""
+Wat leveren retries en hedging op, gemeten met de FakeLLMBackend?
+
+1. Een deel van de calls heeft een tijdelijke fout: hoeveel calls slagen zonder en met retries?
+2. Een deel van de calls is traag (de staart): wat doet hedging met p50/p95/p99 en hoeveel extra
+   calls kost dat?
+
+Gebruik: python tools/BenchmarkResilience.py [aantal calls]
+"""
+
+NUM_CALLS = 400
+THREADS = 8
+LATENCY_SECONDS = 0.05
+FAILURE_RATE = 0.05
+TAIL_RATE = 0.05
+TAIL_LATENCY_SECONDS = 1.0
+HEDGE_AFTER_SECONDS = 0.15  # Iets boven de normale latency
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run(backend, num_calls: int):
+    """Geef (latencies van de geslaagde calls, aantal mislukt) terug."""
+    def call(index):
+        messages = [{"role": "user", "content": f"Vraag {index}"}]
+        start = time.perf_counter()
+        try:
+            backend.parse("gpt-4o-mini", messages, Response, 0.6)
+        except Exception:
+            return None
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(call, range(num_calls)))
+    latencies = [result for result in results if result is not None]
+    return latencies, len(results) - len(latencies)
+
+
+def print_run(label, latencies, failed, fake):
+    print(f"{label:<28} {len(latencies):5d} geslaagd {failed:4d} mislukt   p50 {percentile(latencies, 0.5) * 1000:6.0f} ms   "
+          f"p95 {percentile(latencies, 0.95) * 1000:6.0f} ms   p99 {percentile(latencies, 0.99) * 1000:6.0f} ms   "
+          f"{fake.stats['calls']} calls naar het LLM")
+
+
+if __name__ == "__main__":
+    num_calls = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CALLS
+    print(f"\n{num_calls} calls, {THREADS} threads, {LATENCY_SECONDS * 1000:.0f} ms per call")
+
+    print(f"\n{FAILURE_RATE:.0%} tijdelijke fouten (eerste poging)")
+    print("-" * 120)
+    fake = FakeLLMBackend(latency=LATENCY_SECONDS, failure_rate=FAILURE_RATE, failures_per_prompt=1)
+    print_run("zonder retries", *run(fake, num_calls), fake)
+    fake = FakeLLMBackend(latency=LATENCY_SECONDS, failure_rate=FAILURE_RATE, failures_per_prompt=1)
+    print_run("met retries", *run(ResilientBackend(fake, Resilience(backoff_base_seconds=0.1)), num_calls), fake)
+
+    print(f"\n{TAIL_RATE:.0%} trage calls (+{TAIL_LATENCY_SECONDS * 1000:.0f} ms)")
+    print("-" * 120)
+    fake = FakeLLMBackend(latency=LATENCY_SECONDS, tail_rate=TAIL_RATE, tail_latency=TAIL_LATENCY_SECONDS)
+    print_run("zonder hedging", *run(fake, num_calls), fake)
+    fake = FakeLLMBackend(latency=LATENCY_SECONDS, tail_rate=TAIL_RATE, tail_latency=TAIL_LATENCY_SECONDS)
+    resilience = Resilience(hedge_after=HEDGE_AFTER_SECONDS)
+    print_run(f"hedging na {HEDGE_AFTER_SECONDS * 1000:.0f} ms", *run(ResilientBackend(fake, resilience), num_calls), fake)
+    stats = resilience.get_statistics()
+    print(f"{stats['hedges']} hedges, waarvan {stats['hedges_won']} sneller dan de eerste call")
+    resilience.close()
@@ -0,0 +1,84 @@
+import sys
+import os
+import random
+import tempfile
+import time
+from unittest.mock import patch
+
+# Add the src directory to the Python path
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(project_root, "src"))
+
+import BuildQuestionDatabase
+import GenerateQuestion
+import GetMedicineInfo
+from BenchmarkPipeline import PAGE_PATH, build_selection, fill_cache
+from LLMBackend import FakeLLMBackend
+
+"""
+Streaming pipeline tegenover de stappen na elkaar, met de FakeLLMBackend en een nep-ophaaltijd.
+
+Elk medicijn wordt opgehaald (FETCH_SECONDS, daarna uit een vooraf gevulde cache), geëxtraheerd en
+gegenereerd (LATENCY_SECONDS per LLM call) en opgeslagen. Vergeleken worden:
+- na elkaar: eerst alles ophalen, dan de vragen één voor één (streaming=False)
+- streaming met één worker per stap: alleen de overlap tussen de stappen
+- streaming met STAGE_WORKERS
+Per run de vragen per seconde en per stap de bezettingsgraad en wachtrijdiepte.
+
+Gebruik: python tools/BenchmarkStreamingPipeline.py [aantal medicijnen] [ophaaltijd in ms] [latency per LLM call in ms]
+"""
+
+NUM_MEDICINES = 100
+FETCH_SECONDS = 0.05
+LATENCY_SECONDS = 0.1
+ONE_WORKER = {"ophalen": 1, "extractie": 1, "generatie": 1, "opslaan": 1}
+
+
+def run(label: str, num_medicines: int, sections: list, work_dir: str, fetch_seconds: float, **pipeline_kwargs):
+    random.seed(0)  # Dezelfde kenniscategorieën in elke run
+    GetMedicineInfo.set_cache_path(os.path.join(work_dir, f"MedicineInformation_{label}.db"))
+    selection = build_selection(num_medicines)
+    fill_cache(selection, sections)
+    db_manager = BuildQuestionDatabase.DatabaseManager(db_path=os.path.join(work_dir, f"QuizQuestions_{label}.db"))
+    with patch.object(BuildQuestionDatabase, "DatabaseManager", return_value=db_manager):
+        pipeline = BuildQuestionDatabase.QuizGenerationPipeline(debug_mode=False, batch_mode=True, **pipeline_kwargs)
+    pipeline.medication_selector.select_medications = lambda atc_cluster=None: selection
+
+    get_medicine_info = BuildQuestionDatabase.get_medicine_info
+
+    def slow_fetch(*args, **kwargs):
+        time.sleep(fetch_seconds)  # Een pagina van apotheek.nl
+        return get_medicine_info(*args, **kwargs)
+
+    with patch.object(BuildQuestionDatabase, "get_medicine_info", slow_fetch), \
+            patch.object(GenerateQuestion, "USE_EXTRACTION_CACHE", False):
+        start = time.perf_counter()
+        questions = pipeline.generate_quiz()
+        elapsed = time.perf_counter() - start
+
+    print("-" * 100)
+    print(f"{label}: {len(questions)} vragen in {elapsed:.2f} s ({len(questions) / elapsed:.1f} vragen/s)")
+    for stage, stats in pipeline.question_generator.stats_manager.stats["stages"].items():
+        print(f"  {stage:<10} {stats['workers']:2d} workers   {stats['utilisation']:5.1%} bezet   "
+              f"wachtrij gem {stats['queue_avg']:5.1f} max {stats['queue_max']:3d}   "
+              f"{stats['blocked_seconds']:6.2f} s wachtend op volgende stap")
+    db_manager.close()
+    GetMedicineInfo.get_cache().close()
+    GetMedicineInfo._cache = None
+    GetMedicineInfo._memory_cache.clear()
+
+
+if __name__ == "__main__":
+    num_medicines = int(sys.argv[1]) if len(sys.argv) > 1 else NUM_MEDICINES
+    fetch_seconds = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else FETCH_SECONDS
+    latency = float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else LATENCY_SECONDS
+    with open(PAGE_PATH, "r", encoding="utf-8") as f:
+        sections = GetMedicineInfo.parse_medicine_sections(f.read())
+
+    print(f"\n{num_medicines} medicijnen, {fetch_seconds * 1000:.0f} ms ophalen, {latency * 1000:.0f} ms per LLM call")
+    GenerateQuestion.set_llm_backend(FakeLLMBackend(latency=latency))
+    with tempfile.TemporaryDirectory() as work_dir:
+        run("na elkaar", num_medicines, sections, work_dir, fetch_seconds, streaming=False)
+        run("streaming, 1 worker per stap", num_medicines, sections, work_dir, fetch_seconds, stage_workers=ONE_WORKER)
+        run("streaming, STAGE_WORKERS", num_medicines, sections, work_dir, fetch_seconds)
+    GenerateQuestion.set_llm_backend(None)
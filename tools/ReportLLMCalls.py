@@ -0,0 +1,114 @@
+import sys
+import os
+import sqlite3
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from BuildQuestionDatabase import DB_PATH
+
+"""
+Rapport van de LLM calls in de tabel llm_calls: waar gaan tijd en geld naartoe?
+
+Per quizvraag worden de calls (extractie, generatie, evaluatie) opgeteld. Het rapport toont de
+p50/p95 latency en de kosten per vraag, per kenniscategorie en per model. Calls zonder opgeslagen
+vraag (mislukt of afgekeurd) tellen mee in de totale kosten. Calls zonder latency (batch API) tellen
+niet mee in de latency; zonder enige latency staat er n/a.
+
+Gebruik: python tools/ReportLLMCalls.py [pad naar QuizQuestions.db]
+"""
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def format_latency(values: List[Optional[float]], fraction: float) -> str:
+    """Percentiel van de bekende latencies (None weggelaten), of n/a als er geen zijn."""
+    values = [value for value in values if value is not None]
+    return f"{percentile(values, fraction):8.0f} ms" if values else f"{'n/a':>11}"
+
+
+def load_calls(db_path: str) -> List[Dict[str, Any]]:
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = [dict(row) for row in conn.execute("SELECT * FROM llm_calls")]
+    conn.close()
+    return rows
+
+
+def per_question(calls: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Tel de calls per quiz_question_uuid op: latency, kosten, categorie en modellen."""
+    questions = defaultdict(lambda: {"latency_ms": None, "kosten": 0.0, "kenniscategorie": None, "models": set()})
+    for call in calls:
+        if call["quiz_question_uuid"] is None:
+            continue
+        question = questions[call["quiz_question_uuid"]]
+        if call["latency_ms"] is not None:
+            question["latency_ms"] = (question["latency_ms"] or 0.0) + call["latency_ms"]
+        question["kosten"] += call["kosten"] or 0
+        question["kenniscategorie"] = question["kenniscategorie"] or call["kenniscategorie"]
+        question["models"].add(call["model"])
+    return questions
+
+
+def print_group(label: str, questions: List[Dict[str, Any]]):
+    latencies = [question["latency_ms"] for question in questions]
+    costs = [question["kosten"] for question in questions]
+    print(f"{label:<40} {len(questions):6d}   p50 {format_latency(latencies, 0.5)}   "
+          f"p95 {format_latency(latencies, 0.95)}   gem ${sum(costs) / len(costs):.5f}   "
+          f"p95 ${percentile(costs, 0.95):.5f}")
+
+
+def report(calls: List[Dict[str, Any]]):
+    questions = per_question(calls)
+    total_cost = sum(call["kosten"] or 0 for call in calls)
+    failed = [call for call in calls if call["quiz_question_uuid"] is None]
+    print(f"\n{len(calls)} LLM calls, {len(questions)} vragen, totaal ${total_cost:.4f} "
+          f"(waarvan ${sum(call['kosten'] or 0 for call in failed):.4f} in {len(failed)} calls zonder vraag)")
+
+    if questions:
+        print("\nPer vraag" + " " * 33 + "vragen")
+        print("-" * 120)
+        print_group("alle vragen", list(questions.values()))
+
+        print("\nPer kenniscategorie")
+        print("-" * 120)
+        by_category = defaultdict(list)
+        for question in questions.values():
+            by_category[question["kenniscategorie"] or "onbekend"].append(question)
+        for category in sorted(by_category):
+            print_group(category[:40], by_category[category])
+
+    print("\nPer model" + " " * 34 + "calls")
+    print("-" * 120)
+    by_model = defaultdict(list)
+    for call in calls:
+        by_model[call["model"]].append(call)
+    for model in sorted(by_model):
+        model_calls = by_model[model]
+        latencies = [call["latency_ms"] for call in model_calls]
+        cost = sum(call["kosten"] or 0 for call in model_calls)
+        num_questions = sum(1 for question in questions.values() if model in question["models"])
+        tokens = sum(call["prompt_tokens"] + call["completion_tokens"] for call in model_calls)
+        cached = sum(call["cached_tokens"] for call in model_calls)
+        prompt_tokens = sum(call["prompt_tokens"] for call in model_calls)
+        print(f"{model:<40} {len(model_calls):6d}   p50 {format_latency(latencies, 0.5)}   "
+              f"p95 {format_latency(latencies, 0.95)}   totaal ${cost:.4f}   "
+              f"per vraag ${cost / num_questions if num_questions else 0:.5f}   {tokens} tokens "
+              f"({cached / prompt_tokens if prompt_tokens else 0:.0%} prompt cache)")
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_PATH
+    if not os.path.exists(db_path):
+        print(f"Database niet gevonden op: {db_path}")
+        sys.exit(1)
+    calls = load_calls(db_path)
+    if not calls:
+        print("Geen LLM calls gevonden in llm_calls")
+    else:
+        report(calls)
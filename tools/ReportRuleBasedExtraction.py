@@ -0,0 +1,51 @@
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from GetMedicineInfo import get_cache
+from GenerateQuestion import KNOWLEDGE_CATEGORIES, RULE_BASED_CATEGORIES, extract_by_rules
+
+"""
+Hoeveel LLM extracties slaat de regelgebaseerde extractie over op de huidige cache?
+
+Voor elke pagina in de cache en elke kenniscategorie wordt gekeken of extract_by_rules de secties
+direct kan gebruiken. Omdat categorieën met een gewicht worden gekozen, is het verwachte deel
+vermeden extractie calls het gewogen gemiddelde over de categorieën.
+
+Gebruik: python tools/ReportRuleBasedExtraction.py
+"""
+
+
+def count_rule_based(pages: dict) -> dict:
+    """Per categorie het aantal pagina's waarvoor geen LLM extractie nodig is."""
+    return {
+        category: sum(1 for sections in pages.values() if extract_by_rules(sections, category) is not None)
+        for category in KNOWLEDGE_CATEGORIES
+    }
+
+
+if __name__ == "__main__":
+    cache = get_cache()
+    # Aliassen delen een pagina; tel elke pagina één keer
+    names_per_page = {}
+    for name, entry in cache.load_all().items():
+        names_per_page.setdefault(entry["page_hash"], name)
+    pages = {name: cache.get_sections(name) for name in names_per_page.values()}
+    if not pages:
+        print("Geen pagina's in de cache")
+        sys.exit(0)
+
+    counts = count_rule_based(pages)
+    total_weight = sum(KNOWLEDGE_CATEGORIES.values())
+    print(f"\n{len(pages)} pagina's in de cache")
+    print("-" * 100)
+    for category, weight in KNOWLEDGE_CATEGORIES.items():
+        mapped = "regels" if category in RULE_BASED_CATEGORIES else "LLM"
+        print(f"{category[:50]:<52} {mapped:<7} gewicht {weight}   "
+              f"{counts[category]:5d} van {len(pages)} pagina's zonder LLM ({counts[category] / len(pages):4.0%})")
+    avoided = sum(weight * counts[category] / len(pages) for category, weight in KNOWLEDGE_CATEGORIES.items())
+    print("-" * 100)
+    print(f"Verwacht deel vermeden extractie calls: {avoided / total_weight:.0%} "
+          f"({sum(counts.values())} van {len(pages) * len(KNOWLEDGE_CATEGORIES)} combinaties pagina/categorie)")
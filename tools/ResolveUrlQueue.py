@@ -0,0 +1,54 @@
+import sys
+import os
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from GetMedicineInfo import get_cache, ask_for_alternative_url, resolve_from_url
+
+"""
+Werk de URL-wachtrij af: medicijnen waarvoor in batch mode geen werkende apotheek.nl URL is gevonden.
+
+Voor elk medicijn wordt gevraagd om handmatig een URL op te zoeken. Een werkende URL wordt opgehaald
+en in de cache opgeslagen, zodat de volgende run van BuildQuestionDatabase.py het medicijn wel kan gebruiken.
+
+Gebruik:
+    python tools/ResolveUrlQueue.py          # wachtrij afwerken
+    python tools/ResolveUrlQueue.py --lijst  # alleen de wachtrij tonen
+"""
+
+
+def print_queue(pending: list):
+    print(f"\n{len(pending)} medicijn(en) in de URL-wachtrij")
+    print("=" * 70)
+    for item in pending:
+        brand = f" ({item['brand_name']})" if item["brand_name"] else ""
+        print(f"\n{item['medicine_name']}{brand} uit ATC-cluster '{item['atc_cluster']}'")
+        print(f"  In de wachtrij sinds: {item['added_date']}")
+        for url in item["attempted_urls"]:
+            print(f"  Geprobeerd: {url}")
+
+
+def resolve_queue():
+    pending = get_cache().pending_resolutions()
+    print_queue(pending)
+    resolved = 0
+    for item in pending:
+        print("\n" + "-" * 70)
+        print(f"Medicijn: {item['medicine_name']}")
+        url = ask_for_alternative_url(item["medicine_name"], item["atc_cluster"], item["brand_name"])
+        if not url:
+            continue
+        if resolve_from_url(item["medicine_name"], url, item["atc_cluster"]):
+            resolved += 1
+            print(f"Informatie over '{item['medicine_name']}' opgeslagen in de cache.")
+        else:
+            print(f"De URL bevat niet de juiste informatie; '{item['medicine_name']}' blijft in de wachtrij.")
+    print(f"\n{resolved} van {len(pending)} medicijn(en) opgelost.")
+
+
+if __name__ == "__main__":
+    if "--lijst" in sys.argv:
+        print_queue(get_cache().pending_resolutions())
+    else:
+        resolve_queue()
@@ -0,0 +1,67 @@
+import sys
+import os
+import multiprocessing
+import tempfile
+import time
+
+# Add the src directory to the Python path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from MedicineCache import MedicineCache
+
+"""
+Stresstest van de medicatie-informatie cache met meerdere processen tegelijk.
+
+N processen schrijven elk hun eigen medicijnen naar dezelfde database (zoals meerdere
+BuildQuestionDatabase.py workers). Na afloop wordt gecontroleerd dat er geen entry verloren is
+gegaan, en wordt de doorvoer (writes per seconde over alle processen samen) getoond.
+
+Gebruik: python tools/StressTestMedicineCache.py [writes per proces]
+"""
+
+PROCESS_COUNTS = [1, 2, 4, 8]
+DEFAULT_WRITES_PER_PROCESS = 250
+
+
+def write_medicines(db_path: str, worker: int, count: int, start_event):
+    cache = MedicineCache(db_path)
+    start_event.wait()
+    for i in range(count):
+        name = f"medicijn_{worker}_{i}"
+        cache.put(name, f"https://www.apotheek.nl/medicijnen/{name}",
+                  f"Belangrijk om te weten over {name}\n\n" + "Informatie. " * 200, "stresstest")
+    cache.close()
+
+
+def run(process_count: int, writes_per_process: int, temp_dir: str) -> tuple:
+    """Geef (writes per seconde, aantal verloren entries) terug."""
+    db_path = os.path.join(temp_dir, f"stress_{process_count}.db")
+    MedicineCache(db_path).close()  # Schema vooraf aanmaken, zodat alleen het schrijven wordt gemeten
+    start_event = multiprocessing.Event()
+    processes = [
+        multiprocessing.Process(target=write_medicines, args=(db_path, worker, writes_per_process, start_event))
+        for worker in range(process_count)
+    ]
+    for process in processes:
+        process.start()
+    start = time.perf_counter()
+    start_event.set()
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    cache = MedicineCache(db_path)
+    expected = process_count * writes_per_process
+    lost = expected - cache.count()
+    cache.close()
+    return expected / elapsed, lost
+
+
+if __name__ == "__main__":
+    writes_per_process = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_WRITES_PER_PROCESS
+    print(f"\n{writes_per_process} writes per proces")
+    print("-" * 50)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for process_count in PROCESS_COUNTS:
+            rate, lost = run(process_count, writes_per_process, temp_dir)
+            print(f"{process_count} proces(sen)   {rate:8.0f} writes/s   verloren entries: {lost}")